@@ -0,0 +1,12 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
+
+application = get_asgi_application()
+
+# Load the AI models before (or, with AI_WARMUP=background, while) serving so the
+# first chat doesn't wait for them; see ai_agent/lifecycle.py
+from ai_agent.lifecycle import lifecycle  # noqa: E402
+
+lifecycle.start()
@@ -0,0 +1,114 @@
+"""
+Environment-driven database settings.
+
+DB_ENGINE selects the profile (sqlite, postgres or mysql). The remaining
+DB_* variables fill in the connection details:
+
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+    DB_CONN_MAX_AGE        seconds to keep connections open between requests
+    DB_POOL                'true' to use psycopg's connection pool (PostgreSQL, Django >= 5.1)
+    DB_POOL_MIN / DB_POOL_MAX
+    DB_SQLITE_WAL          'false' to keep SQLite's default rollback journal
+    DB_SQLITE_BUSY_TIMEOUT milliseconds a writer waits for the lock before failing
+"""
+import logging
+import os
+
+import django
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _sqlite(base_dir):
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME', os.path.join(base_dir, 'db.sqlite3')),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # sqlite3 module timeout (seconds); the busy_timeout pragma below is what actually applies
+            'timeout': int(os.getenv('DB_SQLITE_BUSY_TIMEOUT', 5000)) / 1000,
+        },
+    }
+    if django.VERSION >= (5, 1):
+        # Take the write lock at BEGIN so two writers never deadlock upgrading a read lock
+        config['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    return config
+
+
+def _postgres():
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME', 'llmedicare'),
+        'USER': os.getenv('DB_USER', 'llmedicare'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if _env_bool('DB_POOL', False) and django.VERSION >= (5, 1):
+        config['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX', 10)),
+        }
+        # Pooled connections are returned to the pool instead of being kept per thread
+        config['CONN_MAX_AGE'] = 0
+    return config
+
+
+def _mysql():
+    return {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.getenv('DB_NAME', 'llmedicare'),
+        'USER': os.getenv('DB_USER', 'llmedicare'),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'isolation_level': 'read committed',
+        },
+    }
+
+
+def database_config(base_dir):
+    """Return the DATABASES setting for the profile named by DB_ENGINE."""
+    engine = os.getenv('DB_ENGINE', 'sqlite').lower()
+    if engine in ('postgres', 'postgresql'):
+        default = _postgres()
+    elif engine == 'mysql':
+        default = _mysql()
+    else:
+        default = _sqlite(base_dir)
+    return {'default': default}
+
+
+def sqlite_pragmas():
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(os.getenv('DB_SQLITE_BUSY_TIMEOUT', 5000))}",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -20000",  # ~20 MB page cache per connection
+    ]
+    if _env_bool('DB_SQLITE_WAL', True):
+        # WAL lets readers proceed while one writer commits; NORMAL sync is safe with WAL
+        pragmas += ["PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"]
+    return pragmas
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created handler applying the SQLite pragmas to every new connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
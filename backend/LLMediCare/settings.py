@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .database import database_config
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -32,15 +34,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'corsheaders',
     'user_session',
     'ai_agent',
     'django_extensions',  # For using Django extensions like shell_plus
 ]
 
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware', 
-    'user_session.middleware.CORSMiddleware',  # Updated to use the new class name
+    # Answers preflight requests before anything else runs (see user_session/middleware.py)
+    'user_session.middleware.CORSMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,13 +70,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'LLMediCare.wsgi.application'
+ASGI_APPLICATION = 'LLMediCare.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
-}
+# SQLite by default; DB_ENGINE=postgres or mysql for production (see LLMediCare/database.py)
+DATABASES = database_config(BASE_DIR)
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Temporarily allow all origins for testing
@@ -87,6 +85,10 @@ CORS_ALLOW_CREDENTIALS = True
 #     "https://splendorous-melba-fc5384.netlify.app",  # Allow requests from Netlify
 # ]
 
+# Netlify branch deploys and previews of the frontend are matched by pattern
+# (see DEFAULT_ALLOWED_ORIGIN_REGEXES in user_session/middleware.py); replace them with
+# CORS_ALLOWED_ORIGIN_REGEXES = [r'^https://example\.com$']
+
 # Allow all headers and methods for testing
 CORS_ALLOW_HEADERS = ['*']
 CORS_ALLOW_METHODS = [
@@ -125,5 +127,103 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Real-time notification push
+# 'inprocess' works for a single worker; use 'redis' when running several workers
+NOTIFICATION_PUBSUB_BACKEND = os.getenv('NOTIFICATION_PUBSUB_BACKEND', 'inprocess')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+NOTIFICATION_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+NOTIFICATION_STREAM_MAX_SECONDS = 300  # clients reconnect after this long
+# Read notifications older than this many days are archived by compact_notifications
+NOTIFICATION_RETENTION_DAYS = {'default': 90, 'reminder': 30}
+
+# Blob storage for documents and profile pictures ('local' or 's3')
+BLOB_STORE_BACKEND = os.getenv('BLOB_STORE_BACKEND', 'local')
+BLOB_STORE_ROOT = os.getenv('BLOB_STORE_ROOT', os.path.join(BASE_DIR, 'blobstore'))
+BLOB_STORE_BUCKET = os.getenv('BLOB_STORE_BUCKET', '')
+BLOB_STORE_ENDPOINT_URL = os.getenv('BLOB_STORE_ENDPOINT_URL')  # For S3-compatible stores such as MinIO
+
+# Chunked document uploads (see user_session/uploads.py)
+DOCUMENT_UPLOAD_MAX_BYTES = int(os.getenv('DOCUMENT_UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+DOCUMENT_UPLOAD_CHUNK_BYTES = int(os.getenv('DOCUMENT_UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))
+DOCUMENT_UPLOAD_ALLOWED_TYPES = ['application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/tiff']
+
+# Patient dashboard: seconds each section stays cached, and whether sections are queried in parallel
+DASHBOARD_CACHE_SECONDS = 60
+DASHBOARD_PARALLEL = True
+
+# Cache shared by the user identity cache, the dashboard and cached responses. The in-memory
+# default is per process; set CACHE_BACKEND=redis to share it between workers.
+if os.getenv('CACHE_BACKEND', 'locmem') == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL', REDIS_URL),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+USER_IDENTITY_CACHE_ALIAS = 'default'
+USER_IDENTITY_CACHE_SECONDS = 300
+# Read-mostly API responses (doctor list, profiles, record lists); see user_session/caching.py
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_SECONDS = 300
+
+# AI stack (see ai_agent/loaders.py and ai_agent/lifecycle.py). AI_WARMUP is 'blocking'
+# (load before serving; gunicorn.conf.py sets it), 'background' or 'off' (load on first use).
+AI_WARMUP = os.getenv('AI_WARMUP', 'background').lower()
+SENTENCE_ENCODER_MODEL = os.getenv('SENTENCE_ENCODER_MODEL', 'all-MiniLM-L6-v2')
+# 'torch', or 'onnx' to serve the int8 ONNX export made by `manage.py export_onnx_encoder`
+# (CPU only, no torch at runtime; install requirements-onnx.txt)
+SENTENCE_ENCODER_BACKEND = os.getenv('SENTENCE_ENCODER_BACKEND', 'torch').lower()
+SENTENCE_ENCODER_ONNX_DIR = os.getenv(
+    'SENTENCE_ENCODER_ONNX_DIR', os.path.join(os.path.dirname(BASE_DIR), 'models', 'sentence-encoder-onnx'))
+SENTENCE_ENCODER_ONNX_INT8 = os.getenv('SENTENCE_ENCODER_ONNX_INT8', 'true').lower() == 'true'
+# Concurrent queries are embedded together: a batch closes after EMBEDDING_MAX_WAIT_MS
+# or at EMBEDDING_MAX_BATCH sentences (ai_agent/batching.py)
+EMBEDDING_MAX_BATCH = int(os.getenv('EMBEDDING_MAX_BATCH', 32))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv('EMBEDDING_MAX_WAIT_MS', 5))
+# Ceiling for `manage.py importtime_report`, which fails if the URLconf imports take longer
+STARTUP_IMPORT_BUDGET_MS = int(os.getenv('STARTUP_IMPORT_BUDGET_MS', 1500))
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/api')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'gemma:2b')  # Google's Gemma 2B
+# The warm-up generation may have to load the model from disk into Ollama
+OLLAMA_WARMUP_TIMEOUT = int(os.getenv('OLLAMA_WARMUP_TIMEOUT', 120))
+OLLAMA_TIMEOUT = int(os.getenv('OLLAMA_TIMEOUT', 120))  # One chat generation
+OLLAMA_PULL_TIMEOUT = int(os.getenv('OLLAMA_PULL_TIMEOUT', 1800))
+# Availability probes are shared per process (ai_agent/backend_health.py): cached for
+# OLLAMA_PROBE_TTL seconds, and after OLLAMA_FAILURE_THRESHOLD failed generations in a
+# row chats fail fast for OLLAMA_RETRY_AFTER seconds before one is let through to retry
+OLLAMA_PROBE_TIMEOUT = int(os.getenv('OLLAMA_PROBE_TIMEOUT', 2))
+OLLAMA_PROBE_TTL = int(os.getenv('OLLAMA_PROBE_TTL', 30))
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv('OLLAMA_FAILURE_THRESHOLD', 3))
+OLLAMA_RETRY_AFTER = int(os.getenv('OLLAMA_RETRY_AFTER', 30))
+# LLM scheduling (ai_agent/scheduler.py); work beyond LLM_MAX_QUEUE waiting requests gets a 429.
+# Every limit here is per process: under gunicorn each worker has its own scheduler, so the
+# backend sees up to GUNICORN_WORKERS * LLM_MAX_CONCURRENCY generations at once. Keep that
+# product within the backend's parallelism (OLLAMA_NUM_PARALLEL)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 1))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 16))
+LLM_MAX_QUEUED_PER_USER = int(os.getenv('LLM_MAX_QUEUED_PER_USER', 3))
+LLM_QUEUE_TIMEOUT = int(os.getenv('LLM_QUEUE_TIMEOUT', 60))
+# Longest a request waits for the next chunk of its (possibly shared) generation,
+# the first one included: queue wait plus one generation by default
+LLM_FOLLOW_TIMEOUT = int(os.getenv('LLM_FOLLOW_TIMEOUT', LLM_QUEUE_TIMEOUT + OLLAMA_TIMEOUT))
+# Text generation backend (ai_agent/llm_backends.py): ollama, llamacpp (a GGUF model
+# in-process, needs llama-cpp-python) or fake (deterministic stub for load tests)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'ollama').lower()
+LLAMACPP_MODEL_PATH = os.getenv(
+    'LLAMACPP_MODEL_PATH', os.path.join(os.path.dirname(BASE_DIR), 'models', 'llama-2-7b-chat.gguf'))
+LLAMACPP_CONTEXT = int(os.getenv('LLAMACPP_CONTEXT', 2048))
+LLAMACPP_THREADS = int(os.getenv('LLAMACPP_THREADS', 0)) or None  # None: llama.cpp's default
+# The fake backend waits LLM_FAKE_LATENCY_MS for the first token, then streams
+# LLM_FAKE_TOKENS words at LLM_FAKE_TOKENS_PER_SECOND
+LLM_FAKE_LATENCY_MS = float(os.getenv('LLM_FAKE_LATENCY_MS', 200))
+LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv('LLM_FAKE_TOKENS_PER_SECOND', 30))
+LLM_FAKE_TOKENS = int(os.getenv('LLM_FAKE_TOKENS', 120))
+
 # OpenAI API Key
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
 
 application = get_wsgi_application()
+
+# Load the AI models before (or, with AI_WARMUP=background, while) serving so the
+# first chat doesn't wait for them; see ai_agent/lifecycle.py
+from ai_agent.lifecycle import lifecycle  # noqa: E402
+
+lifecycle.start()
@@ -0,0 +1,147 @@
+"""
+Per-request overhead of the CORS middleware.
+
+Runs the same mix of requests (simple GETs and preflights, from the frontend's
+origins, Netlify deploy previews, unknown sites and same-origin) through the
+previous per-request implementation and the current precomputed middleware,
+with a view that does no work, so the timings are the middleware alone:
+
+    python -m TEST.bench_cors
+    python -m TEST.bench_cors --requests 50000
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+ORIGINS = [
+    'http://localhost:3000',
+    'https://splendorous-melba-fc5384.netlify.app',
+    'https://deploy-preview-42--splendorous-melba-fc5384.netlify.app',
+    'https://unknown.example.com',
+    '',
+]
+
+
+def legacy_middleware():
+    """The middleware as it was before precomputing (plus corsheaders in front of it)."""
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.utils.deprecation import MiddlewareMixin
+
+    logger = logging.getLogger('bench.legacy_cors')
+
+    class LegacyCORSMiddleware(MiddlewareMixin):
+        def process_request(self, request):
+            logger.debug(f"Request: {request.method} {request.path}")
+            logger.debug(f"Request Origin: {request.headers.get('Origin', 'None')}")
+            if request.method == 'OPTIONS':
+                response = HttpResponse()
+                self._add_cors_headers(response, request)
+                return response
+            return None
+
+        def process_response(self, request, response):
+            self._add_cors_headers(response, request)
+            logger.debug(f"Response status: {response.status_code}")
+            logger.debug(f"Response headers: {dict(response.headers)}")
+            return response
+
+        def _add_cors_headers(self, response, request):
+            origin = request.headers.get('Origin', '')
+            allowed_origins = getattr(settings, 'CORS_ALLOWED_ORIGINS', [
+                'http://localhost:3000',
+                'http://127.0.0.1:3000',
+                'http://127.0.0.1:8000',
+                'https://splendorous-melba-fc5384.netlify.app',
+                'https://devserver-main--splendorous-melba-fc5384.netlify.app',
+            ])
+            allow_all = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+            if 'netlify.app' in origin and origin not in allowed_origins:
+                allowed_origins.append(origin)
+            if origin in allowed_origins:
+                response['Access-Control-Allow-Origin'] = origin
+                response['Access-Control-Allow-Credentials'] = 'true'
+            elif allow_all or not origin:
+                response['Access-Control-Allow-Origin'] = '*'
+            allowed_methods = getattr(settings, 'CORS_ALLOW_METHODS', [
+                'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'
+            ])
+            allowed_headers = getattr(settings, 'CORS_ALLOW_HEADERS', [
+                'Content-Type', 'Authorization', 'X-Requested-With', 'Accept'
+            ])
+            response['Access-Control-Allow-Methods'] = ', '.join(allowed_methods)
+            if isinstance(allowed_headers, list):
+                response['Access-Control-Allow-Headers'] = ', '.join(allowed_headers)
+            else:
+                response['Access-Control-Allow-Headers'] = allowed_headers
+            response['Access-Control-Max-Age'] = '86400'
+
+    return LegacyCORSMiddleware
+
+
+def build_requests(count):
+    from django.test import RequestFactory
+
+    factory = RequestFactory()
+    templates = []
+    for origin in ORIGINS:
+        headers = {'HTTP_ORIGIN': origin} if origin else {}
+        templates.append(factory.get('/api/user/records/', **headers))
+        templates.append(factory.options('/api/user/records/', HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST', **headers))
+    return list(itertools.islice(itertools.cycle(templates), count))
+
+
+def time_chain(name, handler, requests, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for request in requests:
+            handler(request)
+        best = min(best, time.perf_counter() - started)
+    return name, best / len(requests) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    import django
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
+    django.setup()
+    # Debug logging on, as in development, so the legacy per-request log formatting is paid for
+    logging.getLogger('bench.legacy_cors').setLevel(logging.DEBUG)
+    logging.getLogger('bench.legacy_cors').addHandler(logging.NullHandler())
+    logging.getLogger('bench.legacy_cors').propagate = False
+
+    from django.http import HttpResponse
+    from user_session.middleware import CORSMiddleware
+
+    def view(request):
+        return HttpResponse('{}', content_type='application/json')
+
+    requests = build_requests(args.requests)
+    chains = [('no middleware', view), ('legacy', legacy_middleware()(view))]
+    try:
+        from corsheaders.middleware import CorsMiddleware
+        chains.append(('corsheaders + legacy', CorsMiddleware(legacy_middleware()(view))))
+    except ImportError:
+        pass
+    chains.append(('precomputed', CORSMiddleware(view)))
+
+    results = [time_chain(name, handler, requests, args.repeat) for name, handler in chains]
+    baseline = results[0][1]
+    print(f"{'middleware':<24}{'us/request':>12}{'overhead us':>14}")
+    for name, per_request in results:
+        print(f"{name:<24}{per_request:>12.2f}{per_request - baseline:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Write-throughput benchmark for the database profile under concurrent chat traffic.
+
+Each worker thread plays one patient: it appends messages to a chat session
+(like SessionViewSet.add_chat) and every few messages receives a notification.
+By default the script compares SQLite with the rollback journal against SQLite
+in WAL mode, each in a fresh database file. The configured database is never
+written to: SQLite profiles (including --profile current) use a temporary
+file, and other engines a scratch test_<DB_NAME> database that is dropped
+afterwards:
+
+    python -m TEST.bench_db_writes
+    python -m TEST.bench_db_writes --workers 16 --messages 200
+    DB_ENGINE=postgres DB_NAME=bench python -m TEST.bench_db_writes --profile current
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PROFILES = {
+    'sqlite-journal': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_WAL': 'false'},
+    'sqlite-wal': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_WAL': 'true'},
+    'current': {},
+}
+
+
+def run_workload(workers, messages, notify_every):
+    """Run inside a configured Django process; returns the measurements as a dict."""
+    import django
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, connections
+
+    scratch = connection.vendor != 'sqlite'
+    if scratch:
+        # Benchmark in test_<NAME> (created and migrated here), not the configured database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    else:
+        call_command('migrate', verbosity=0)
+    try:
+        return _measure(workers, messages, notify_every)
+    finally:
+        if scratch:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _measure(workers, messages, notify_every):
+    from django.db import connection, connections, OperationalError
+    from user_session.models import User, Session, Notification
+
+    users = [User.objects.create(name=f"Bench {i}", email=f"bench{i}-{time.time_ns()}@example.com")
+             for i in range(workers)]
+    connections.close_all()
+
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def patient(user):
+        session = Session.objects.create(user_email=user, session_chats=[])
+        barrier.wait()
+        local = []
+        for i in range(messages):
+            started = time.perf_counter()
+            try:
+                session.session_chats.append({'role': 'user', 'content': f"message {i}"})
+                session.save(update_fields=['session_chats'])
+                if i % notify_every == 0:
+                    Notification.objects.create(user=user, title="Reminder", message=f"Take dose {i}",
+                                                type='reminder')
+            except OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+        connections.close_all()
+
+    threads = [threading.Thread(target=patient, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    operations = workers * messages
+    return {
+        'vendor': connection.vendor,
+        'workers': workers,
+        'operations': operations,
+        'seconds': round(elapsed, 3),
+        'ops_per_second': round(operations / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        'lock_errors': len(errors),
+    }
+
+
+def run_profile(name, args):
+    """Run one profile in a child process so each gets its own settings and database file."""
+    env = dict(os.environ, **PROFILES[name])
+    tmpdir = None
+    if env.get('DB_ENGINE', 'sqlite').lower() == 'sqlite':
+        tmpdir = tempfile.TemporaryDirectory()
+        env['DB_NAME'] = os.path.join(tmpdir.name, 'bench.sqlite3')
+    command = [sys.executable, '-m', 'TEST.bench_db_writes', '--child',
+               '--workers', str(args.workers), '--messages', str(args.messages),
+               '--notify-every', str(args.notify_every)]
+    try:
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, check=True,
+                                capture_output=True, text=True).stdout
+    finally:
+        if tmpdir:
+            tmpdir.cleanup()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--notify-every', type=int, default=5)
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help='Profiles to run (default: sqlite-journal and sqlite-wal)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_workload(args.workers, args.messages, args.notify_every)))
+        return
+
+    print(f"{'profile':<16}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lock errors':>13}")
+    for name in args.profile or ['sqlite-journal', 'sqlite-wal']:
+        result = run_profile(name, args)
+        print(f"{name:<16}{result['ops_per_second']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}"
+              f"{result['lock_errors']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Embedding throughput of one-query-per-call encoding vs. the micro-batcher.
+
+N threads each encode their share of a fixed set of chat queries, the way
+concurrent requests do in EnhancedAIAgent, first straight through the
+SentenceTransformer and then through EmbeddingBatcher (ai_agent/batching.py).
+For every concurrency level it reports queries per second and per-call
+latency percentiles:
+
+    python -m TEST.bench_embeddings
+    python -m TEST.bench_embeddings --concurrency 1 8 32 --queries 512
+    python -m TEST.bench_embeddings --random-weights   # no model download
+
+--random-weights builds an untrained network with all-MiniLM-L6-v2's
+architecture and a synthetic vocabulary, so timings match the real model
+on machines without network access, but the embeddings mean nothing.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+QUERIES = [
+    "What are the common symptoms of the flu?",
+    "I have had a headache for three days, what should I do?",
+    "Can I take ibuprofen with my blood pressure medication?",
+    "How much water should I drink every day?",
+    "What does a high cholesterol result mean?",
+    "My child has a fever of 39 degrees, is that dangerous?",
+    "Which foods help lower blood sugar?",
+    "How long does a sprained ankle take to heal?",
+    "What are the side effects of metformin?",
+    "Is it normal to feel dizzy after standing up quickly?",
+    "How can I sleep better at night?",
+    "What should I eat before a blood test?",
+    "How do I know if a cut is infected?",
+    "What is a normal resting heart rate?",
+    "Can stress cause stomach pain?",
+    "When should I see a doctor about a cough?",
+]
+
+# all-MiniLM-L6-v2
+MINILM = dict(vocab_size=30522, hidden_size=384, num_hidden_layers=6, num_attention_heads=12,
+              intermediate_size=1536, max_position_embeddings=512)
+
+
+def build_random_minilm(path):
+    """Save an untrained MiniLM-L6-sized SentenceTransformer under path and return it."""
+    import string
+
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = sorted({word.strip('?,.').lower() for query in QUERIES for word in query.split()})
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + list(string.ascii_lowercase + string.digits + string.punctuation)
+    vocab += [f'##{char}' for char in string.ascii_lowercase + string.digits] + words
+    vocab += [f'[unused{i}]' for i in range(MINILM['vocab_size'] - len(vocab))]
+    with open(os.path.join(path, 'vocab.txt'), 'w') as f:
+        f.write('\n'.join(vocab))
+    BertTokenizerFast(os.path.join(path, 'vocab.txt')).save_pretrained(path)
+    BertModel(BertConfig(**MINILM)).save_pretrained(path)
+
+    transformer = models.Transformer(path, max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode='mean')
+    return SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device='cpu')
+
+
+def load_encoder(args, workdir):
+    if args.random_weights:
+        return build_random_minilm(workdir)
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(args.model, device='cpu')
+
+
+def run(encode, concurrency, total):
+    """Encode `total` queries from `concurrency` threads; return (queries/s, latencies in ms)."""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = total // concurrency
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(offset):
+        mine = []
+        barrier.wait()
+        for i in range(per_thread):
+            started = time.perf_counter()
+            encode(QUERIES[(offset + i) % len(QUERIES)])
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return per_thread * concurrency / elapsed, latencies
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--random-weights', action='store_true', help='Untrained MiniLM-sized model (offline)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=256, help='Queries per concurrency level')
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    import torch
+    from ai_agent.batching import EmbeddingBatcher
+
+    with tempfile.TemporaryDirectory() as workdir:
+        encoder = load_encoder(args, workdir)
+        batcher = EmbeddingBatcher(encoder, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+        encoder.encode(QUERIES)  # warm-up
+        print(f"torch threads: {torch.get_num_threads()}, CPUs: {os.cpu_count()}, "
+              f"window: {args.max_wait_ms}ms / {args.max_batch} sentences")
+        print(f"{'concurrency':>11} {'mode':>8} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+        for concurrency in args.concurrency:
+            direct, direct_ms = run(encoder.encode, concurrency, args.queries)
+            batches_before = batcher.batches
+            batched, batched_ms = run(batcher.encode, concurrency, args.queries)
+            mean_batch = (args.queries // concurrency * concurrency) / max(1, batcher.batches - batches_before)
+            for mode, throughput, latencies, speedup in (
+                    ('direct', direct, direct_ms, ''),
+                    ('batched', batched, batched_ms, f"{batched / direct:.2f}x")):
+                print(f"{concurrency:>11} {mode:>8} {throughput:>10.1f} {percentile(latencies, 50):>8.1f} "
+                      f"{percentile(latencies, 95):>8.1f} {speedup:>8}")
+            print(f"{'':>11} {'':>8} mean batch {mean_batch:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Memory and latency of the sentence encoder backends on CPU.
+
+Exports the model to ONNX (fp32 and dynamic int8, ai_agent/onnx_encoder.py),
+then loads each backend in a fresh process and measures its resident memory
+after loading, load time, single-query latency and batch throughput, plus
+how closely its embeddings match the PyTorch model's:
+
+    python -m TEST.bench_onnx_encoder
+    python -m TEST.bench_onnx_encoder --random-weights   # no model download
+
+--random-weights uses an untrained network with all-MiniLM-L6-v2's
+architecture (see bench_embeddings.py): same cost, meaningless embeddings.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKENDS = ('torch', 'onnx-fp32', 'onnx-int8')
+
+
+def rss_mb():
+    """Resident set size of this process in MB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(backend, model, onnx_dir):
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model, device='cpu')
+    from ai_agent.onnx_encoder import OnnxSentenceEncoder
+
+    return OnnxSentenceEncoder(onnx_dir, quantized=backend == 'onnx-int8')
+
+
+def worker(args):
+    """Measure one backend in this (fresh) process and print the results as JSON."""
+    from TEST.bench_embeddings import QUERIES
+
+    before = rss_mb()
+    started = time.perf_counter()
+    encoder = load(args.worker, args.model, args.onnx_dir)
+    load_s = time.perf_counter() - started
+    loaded = rss_mb()
+
+    encoder.encode(QUERIES)  # warm-up
+    latencies = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        encoder.encode(QUERIES[i % len(QUERIES)])
+        latencies.append((time.perf_counter() - started) * 1000)
+    batch = QUERIES * 2
+    started = time.perf_counter()
+    for _ in range(5):
+        encoder.encode(batch)
+    batch_qps = 5 * len(batch) / (time.perf_counter() - started)
+
+    print(json.dumps({
+        'rss_mb': round(loaded - before, 1),
+        'rss_total_mb': round(rss_mb(), 1),
+        'load_s': round(load_s, 2),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(statistics.quantiles(latencies, n=100)[94], 2),
+        'batch_qps': round(batch_qps, 1),
+        'torch_imported': 'torch' in sys.modules,
+    }))
+
+
+def measure(backend, model, onnx_dir, queries):
+    result = subprocess.run(
+        [sys.executable, '-m', 'TEST.bench_onnx_encoder', '--worker', backend, '--model', model,
+         '--onnx-dir', onnx_dir, '--queries', str(queries)],
+        capture_output=True, text=True, cwd=BACKEND_DIR,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"{backend} worker failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--random-weights', action='store_true', help='Untrained MiniLM-sized model (offline)')
+    parser.add_argument('--queries', type=int, default=200, help='Single-query encodes per backend')
+    parser.add_argument('--worker', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--onnx-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.worker:
+        return worker(args)
+
+    from sentence_transformers import SentenceTransformer
+    from ai_agent.onnx_encoder import OnnxSentenceEncoder, agreement, export_onnx
+    from TEST.bench_embeddings import QUERIES, build_random_minilm
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model = args.model
+        if args.random_weights:
+            os.makedirs(os.path.join(workdir, 'build'))
+            model = os.path.join(workdir, 'sentence-transformer')
+            build_random_minilm(os.path.join(workdir, 'build')).save(model)
+        onnx_dir = os.path.join(workdir, 'onnx')
+        reference = SentenceTransformer(model, device='cpu')
+        export_onnx(reference, onnx_dir)
+        sizes = {
+            'torch': None,
+            'onnx-fp32': os.path.getsize(os.path.join(onnx_dir, 'model.onnx')) / 2 ** 20,
+            'onnx-int8': os.path.getsize(os.path.join(onnx_dir, 'model_int8.onnx')) / 2 ** 20,
+        }
+        cosines = {'torch': 1.0}
+        for backend in BACKENDS[1:]:
+            candidate = OnnxSentenceEncoder(onnx_dir, quantized=backend == 'onnx-int8')
+            cosines[backend] = float(agreement(reference, candidate, QUERIES)[0].min())
+
+        print(f"{'backend':<10}{'file MB':>9}{'RSS MB':>8}{'load s':>8}{'p50 ms':>8}{'p95 ms':>8}"
+              f"{'batch q/s':>11}{'min cos':>9}  torch")
+        for backend in BACKENDS:
+            result = measure(backend, model, onnx_dir, args.queries)
+            size = f"{sizes[backend]:.1f}" if sizes[backend] else '-'
+            print(f"{backend:<10}{size:>9}{result['rss_mb']:>8.0f}{result['load_s']:>8.2f}{result['p50_ms']:>8.2f}"
+                  f"{result['p95_ms']:>8.2f}{result['batch_qps']:>11.1f}{cosines[backend]:>9.4f}  "
+                  f"{'yes' if result['torch_imported'] else 'no'}")
+
+
+if __name__ == '__main__':
+    main()
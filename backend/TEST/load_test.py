@@ -0,0 +1,470 @@
+"""
+End-to-end load test of the chat, medical report and session endpoints.
+
+Closed-loop clients (each sends its next request as soon as the previous
+one is answered) drive one scenario at a time, for each concurrency level:
+
+    chat      POST /api/ai/chat/ with questions that need the LLM
+    report    POST /api/ai/process-medical-report/ with a rendered lab report
+    sessions  POST /api/user/sessions/, then alternately add_chat and the
+              user's session list
+
+Each run records p50/p95/p99 latency, throughput, status codes (429s from
+the LLM scheduler are counted as rejected, not as errors) and the server's
+resident memory over time, and writes everything as JSON so results from
+different commits can be compared:
+
+    python -m TEST.load_test --random-weights --output load-$(git rev-parse --short HEAD).json
+    python -m TEST.load_test --scenario chat --concurrency 1 8 32 --duration 60
+    python -m TEST.load_test --url http://localhost:8000 --pid 1234
+    python -m TEST.load_test --compare load-old.json load-new.json --max-regression 10
+
+Without --url it starts its own server (gunicorn with gunicorn.conf.py, or
+--server runserver) on a fresh SQLite database with LLM_BACKEND=fake, so
+no model server is needed; --server-env passes further settings
+(e.g. LLM_FAKE_TOKENS_PER_SECOND=15 or LLM_MAX_CONCURRENCY=4).
+--random-weights serves an ONNX export of an untrained MiniLM-sized
+encoder (see bench_embeddings.py) for machines without the real model.
+The report scenario needs Tesseract on the server.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCENARIOS = ('chat', 'report', 'sessions')
+USER_PREFIX = 'loadtest'
+# Compared between result files
+METRICS = ('req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak RSS MB')
+
+REPORT_LINES = [
+    "CITY GENERAL HOSPITAL - LABORATORY REPORT",
+    "Patient: Jane Doe    DOB: 1980-04-12",
+    "Hemoglobin: 11.2 g/dL (ref 12.0-15.5) LOW",
+    "White blood cells: 7.8 x10^9/L (ref 4.5-11.0)",
+    "Fasting glucose: 126 mg/dL (ref 70-99) HIGH",
+    "LDL cholesterol: 162 mg/dL (ref <100) HIGH",
+    "Impression: mild anemia, impaired fasting glucose.",
+    "Plan: iron supplement, repeat HbA1c in 3 months.",
+]
+
+
+def percentiles(latencies):
+    """Latency summary in ms."""
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else [ordered[0]] * 99
+    return {
+        'p50': round(cuts[49], 1),
+        'p95': round(cuts[94], 1),
+        'p99': round(cuts[98], 1),
+        'mean': round(statistics.fmean(ordered), 1),
+        'max': round(ordered[-1], 1),
+    }
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of pid and all its descendants (gunicorn master and workers) in MB, from /proc."""
+    children = {}
+    for stat in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat) as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.split('/')[2]))
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            continue
+        pending.extend(children.get(current, ()))
+    return round(total / 1024, 1)
+
+
+class RSSSampler:
+    """Samples the server's memory every interval seconds in a background thread."""
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.pid and os.path.exists('/proc'):
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append([round(time.monotonic() - self._started, 1), process_tree_rss_mb(self.pid)])
+            self._stop.wait(self.interval)
+
+    def window(self, start, end):
+        """Summary and series of the samples taken between two sampler timestamps."""
+        series = [sample for sample in self.samples if start <= sample[0] <= end]
+        if not series:
+            return None
+        return {
+            'start': series[0][1],
+            'end': series[-1][1],
+            'peak': max(mb for _, mb in series),
+            'samples': series,
+        }
+
+    def now(self):
+        return round(time.monotonic() - self._started, 1)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def report_image():
+    """A lab report rendered as PNG bytes, large enough for OCR."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:  # Pillow < 10.1
+        font = ImageFont.load_default()
+    image = Image.new('L', (1400, 80 + 50 * len(REPORT_LINES)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(REPORT_LINES):
+        draw.text((40, 40 + 50 * i), line, fill=0, font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Client:
+    """One simulated user: a keep-alive HTTP session and the scenario's per-user state."""
+
+    def __init__(self, base_url, scenario, number, timeout, image=None):
+        from TEST.bench_embeddings import QUERIES
+
+        self.base_url = base_url.rstrip('/')
+        self.scenario = scenario
+        self.number = number
+        self.timeout = timeout
+        self.image = image
+        self.user_id = f'{USER_PREFIX}-{number}'
+        self.email = f'{USER_PREFIX}-{number}@example.com'
+        self.queries = QUERIES[number % len(QUERIES):] + QUERIES[:number % len(QUERIES)]
+        self.session_id = None
+        self.http = requests.Session()
+        self.sent = 0
+
+    def step(self):
+        """Send the next request; returns (endpoint, status code)."""
+        i, self.sent = self.sent, self.sent + 1
+        if self.scenario == 'chat':
+            return 'chat', self._post('/api/ai/chat/', json={
+                'query': self.queries[i % len(self.queries)], 'user_id': self.user_id})
+        if self.scenario == 'report':
+            return 'report', self._post('/api/ai/process-medical-report/', data={'user_id': self.user_id},
+                                        files={'file': ('report.png', self.image, 'image/png')})
+        if self.session_id is None:
+            response = self.http.post(f'{self.base_url}/api/user/sessions/', json={'user_email': self.email},
+                                      timeout=self.timeout)
+            if response.ok:
+                self.session_id = response.json()['id']
+            return 'session_create', response.status_code
+        if i % 2:
+            return 'session_add_chat', self._post(
+                f'/api/user/sessions/{self.session_id}/add_chat/',
+                json={'message': {'role': 'user', 'content': self.queries[i % len(self.queries)]}})
+        response = self.http.get(f'{self.base_url}/api/user/sessions/user_sessions/', params={'email': self.email},
+                                 timeout=self.timeout)
+        return 'session_list', response.status_code
+
+    def _post(self, path, **kwargs):
+        return self.http.post(f'{self.base_url}{path}', timeout=self.timeout, **kwargs).status_code
+
+
+def run_level(args, scenario, concurrency, sampler, image):
+    """Drive one scenario at one concurrency level for args.duration seconds."""
+    clients = [Client(args.url, scenario, n, args.timeout, image) for n in range(concurrency)]
+    results = []  # (endpoint, status, ms)
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(client):
+        mine = []
+        barrier.wait()
+        while time.monotonic() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                endpoint, code = client.step()
+            except requests.RequestException as e:
+                endpoint, code = scenario, type(e).__name__
+            mine.append((endpoint, code, (time.perf_counter() - started) * 1000))
+        with lock:
+            results.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(client,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    rss_start = sampler.now()
+    started = time.monotonic()
+    deadline[0] = started + args.duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    ok = [ms for _, code, ms in results if isinstance(code, int) and code < 400]
+    endpoints = {}
+    for endpoint in sorted({endpoint for endpoint, _, _ in results}):
+        mine = [(code, ms) for name, code, ms in results if name == endpoint]
+        endpoints[endpoint] = {
+            'requests': len(mine),
+            'latency_ms': percentiles([ms for code, ms in mine if isinstance(code, int) and code < 400]),
+        }
+    statuses = Counter(str(code) for _, code, _ in results)
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(results),
+        'ok': len(ok),
+        'rejected': statuses.get('429', 0),
+        'errors': len(results) - len(ok) - statuses.get('429', 0),
+        'statuses': dict(statuses),
+        'throughput_rps': round(len(ok) / elapsed, 2),
+        'latency_ms': percentiles(ok),
+        'endpoints': endpoints,
+        'rss_mb': sampler.window(rss_start, sampler.now()),
+        'server_metrics': server_metrics(args.url),
+    }
+
+
+def server_metrics(base_url):
+    """The worker's own counters (/api/ai/metrics/), when reachable."""
+    try:
+        return requests.get(f"{base_url.rstrip('/')}/api/ai/metrics/", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def build_random_encoder(workdir):
+    """ONNX export of an untrained MiniLM-sized encoder; returns the settings that select it."""
+    from ai_agent.onnx_encoder import export_onnx
+    from TEST.bench_embeddings import build_random_minilm
+
+    model_dir = os.path.join(workdir, 'minilm')
+    os.makedirs(model_dir)
+    export_onnx(build_random_minilm(model_dir), os.path.join(workdir, 'encoder-onnx'))
+    return {'SENTENCE_ENCODER_BACKEND': 'onnx', 'SENTENCE_ENCODER_ONNX_DIR': os.path.join(workdir, 'encoder-onnx')}
+
+
+def start_server(args, workdir):
+    """Start the backend on a free port with a fresh database; returns (process, url, environment overrides)."""
+    port = free_port()
+    overrides = {
+        'DB_ENGINE': 'sqlite',
+        'DB_NAME': os.path.join(workdir, 'load.sqlite3'),
+        'LLM_BACKEND': 'fake',
+        'AI_WARMUP': 'blocking' if args.server == 'gunicorn' else 'background',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+    }
+    if args.random_weights:
+        overrides.update(build_random_encoder(workdir))
+    overrides.update(dict(item.split('=', 1) for item in args.server_env))
+    env = dict(os.environ, **overrides)
+
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'], cwd=BACKEND_DIR, env=env, check=True)
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'LLMediCare.wsgi']
+    else:
+        command = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(f'{url}/api/ai/health/ready/', timeout=2).status_code == 200:
+                return process, url, overrides
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    with open(log.name) as f:
+        raise SystemExit(f"Server did not become ready:\n{f.read()[-3000:]}")
+
+
+def remove_test_histories():
+    """Delete the conversation histories the simulated users left behind."""
+    for pattern in (f'agent_histories/agent_history_{USER_PREFIX}-*.pkl',
+                    f'conversation_histories/history_{USER_PREFIX}-*.pkl'):
+        for path in glob.glob(os.path.join(BACKEND_DIR, 'ai_agent', pattern)):
+            os.remove(path)
+
+
+def git_revision():
+    def git(*command):
+        return subprocess.run(['git', *command], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+
+    commit = git('rev-parse', '--short', 'HEAD')
+    return {'commit': commit or None, 'dirty': bool(commit and git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def number(value):
+    return f"{value:.0f}" if value >= 100 else f"{value:.1f}" if value >= 1 else f"{value:.2f}"
+
+
+def compare(base_path, new_path, max_regression=None):
+    """Print per-run throughput and latency changes; returns the regressions beyond max_regression percent."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    base_runs = {(run['scenario'], run['concurrency']): run for run in base['runs']}
+    print(f"base {base['meta']['git']['commit']} vs new {new['meta']['git']['commit']}")
+    print(f"{'scenario':<10}{'conc':>5}" + ''.join(f"{title:>21}" for title in METRICS))
+
+    def change(old, current, higher_is_better=False):
+        if old is None or current is None:
+            return '-', 0.0
+        delta = round((current - old) / old * 100, 1) if old else 0.0
+        worse = -delta if higher_is_better else delta
+        return f"{number(old)} -> {number(current)} ({delta:+.0f}%)", worse
+
+    regressions = []
+    for run in new['runs']:
+        old = base_runs.get((run['scenario'], run['concurrency']))
+        if old is None:
+            continue
+        cells = [change(old['throughput_rps'], run['throughput_rps'], higher_is_better=True)]
+        for q in ('p50', 'p95', 'p99'):
+            cells.append(change((old['latency_ms'] or {}).get(q), (run['latency_ms'] or {}).get(q)))
+        cells.append(change((old['rss_mb'] or {}).get('peak'), (run['rss_mb'] or {}).get('peak')))
+        print(f"{run['scenario']:<10}{run['concurrency']:>5}" + ''.join(f" {text:>20}" for text, _ in cells))
+        if max_regression is not None:
+            for name, (_, worse) in zip(METRICS, cells):
+                if worse > max_regression:
+                    regressions.append(f"{run['scenario']} x{run['concurrency']}: {name} {worse:+.0f}%")
+    return regressions
+
+
+def print_run(run):
+    latency = run['latency_ms'] or {}
+    rss = run['rss_mb'] or {}
+    print(f"{run['scenario']:<10}{run['concurrency']:>5}{run['throughput_rps']:>9.2f}{run['ok']:>7}{run['rejected']:>6}"
+          f"{run['errors']:>7}{latency.get('p50', '-'):>9}{latency.get('p95', '-'):>9}{latency.get('p99', '-'):>9}"
+          f"{rss.get('peak', '-'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Test a running server instead of starting one')
+    parser.add_argument('--pid', type=int, help='Server process to sample memory from, with --url')
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per scenario and concurrency level')
+    parser.add_argument('--warmup', type=int, default=2, help='Unrecorded requests per scenario before measuring')
+    parser.add_argument('--timeout', type=float, default=300, help='Per-request timeout in seconds')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='Seconds between memory samples')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--server', choices=('gunicorn', 'runserver'), default='gunicorn')
+    parser.add_argument('--server-env', nargs='*', default=[], metavar='KEY=VALUE',
+                        help='Extra settings for the started server')
+    parser.add_argument('--random-weights', action='store_true', help='Serve an untrained MiniLM-sized encoder (offline)')
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two result files and exit')
+    parser.add_argument('--max-regression', type=float,
+                        help='With --compare, exit 1 if any metric is this many percent worse')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.compare:
+        regressions = compare(*args.compare, max_regression=args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+    workdir = tempfile.TemporaryDirectory()
+    process, overrides = None, {}
+    if args.url is None:
+        process, args.url, overrides = start_server(args, workdir.name)
+        args.pid = process.pid
+    sampler = RSSSampler(args.pid, args.sample_interval).start()
+    image = report_image() if 'report' in args.scenario else None
+
+    results = {
+        'meta': {
+            'git': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'url': args.url,
+            'server': args.server if process else 'external',
+            'server_env': {key: value for key, value in overrides.items() if key not in ('DB_NAME', 'GUNICORN_BIND')},
+            'duration_s': args.duration,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'runs': [],
+    }
+    print(f"{'scenario':<10}{'conc':>5}{'req/s':>9}{'ok':>7}{'429':>6}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'peak MB':>10}")
+    try:
+        for scenario in args.scenario:
+            warmup = Client(args.url, scenario, 0, args.timeout, image)
+            for _ in range(args.warmup):
+                try:
+                    warmup.step()
+                except requests.RequestException:
+                    pass
+            for concurrency in args.concurrency:
+                run = run_level(args, scenario, concurrency, sampler, image)
+                results['runs'].append(run)
+                print_run(run)
+    finally:
+        sampler.stop()
+        if process:
+            process.terminate()
+            process.wait(30)
+            remove_test_histories()
+        workdir.cleanup()
+
+    results['rss_mb'] = sampler.samples
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
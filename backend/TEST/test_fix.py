@@ -6,6 +6,11 @@ import os
 # Add parent directory to path so we can import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# The chatbot reads its models and the Ollama URL from the Django settings
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
+django.setup()
+
 from ai_agent.ai_handler import EnhancedAIAgent
 from ai_agent.chatbot import MedicalChatbot
 
@@ -1,18 +1,226 @@
+import argparse
 import asyncio
 import logging
+import random
+import re
 import sys
 import os
+import time
 
 # Add parent directory to path so we can import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# The chatbot reads its models and the Ollama URL from the Django settings
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LLMediCare.settings')
+django.setup()
+
 from ai_agent.ai_handler import EnhancedAIAgent
 from ai_agent.chatbot import MedicalChatbot
+from ai_agent.formatting import ResponseFormatter, format_response
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The new formatter must be at least this many times faster than the legacy one
+MIN_SPEEDUP = 2.0
+
+def legacy_format_response(text):
+    """
+    MedicalChatbot._format_response before ai_agent/formatting.py replaced it,
+    kept as the reference the new formatter must match byte for byte
+    """
+    # Remove any extra whitespace
+    text = text.strip()
+
+    # If the text is empty, return a default message
+    if not text:
+        return "I apologize, but I couldn't generate a proper response. Please try asking your question again."
+
+    # Format the response with Markdown styling for better visual appearance
+    formatted_text = text
+
+    # Ensure section headers use proper Markdown format
+    # Replace any headers that don't use ## format
+    header_patterns = [
+        (r'(?im)^(summary|overview)[:]\s*$', '## Summary\n'),
+        (r'(?im)^(symptoms|signs)[:]\s*$', '## Symptoms\n'),
+        (r'(?im)^(diagnosis|condition|disease)[:]\s*$', '## Diagnosis\n'),
+        (r'(?im)^(treatment|therapy|management)[:]\s*$', '## Treatment\n'),
+        (r'(?im)^(medications|prescription|drug)[:]\s*$', '## Medications\n'),
+        (r'(?im)^(recommendations|advice|suggestions)[:]\s*$', '## Recommendations\n'),
+        (r'(?im)^(prevention|precautions)[:]\s*$', '## Prevention\n'),
+        (r'(?im)^(warnings|cautions|alerts)[:]\s*$', '## Important Warnings\n'),
+        (r'(?im)^(follow.?up|next.?steps)[:]\s*$', '## Follow-up Steps\n'),
+        (r'(?im)^(key medical findings)[:]\s*$', '## Key Medical Findings\n'),
+        (r'(?im)^(report summary)[:]\s*$', '## Report Summary\n'),
+        (r'(?im)^(diagnosed conditions)[:]\s*$', '## Diagnosed Conditions\n')
+    ]
+
+    # Process each section pattern
+    for pattern, replacement in header_patterns:
+        formatted_text = re.sub(pattern, replacement, formatted_text)
+
+    # Process each line
+    lines = formatted_text.split('\n')
+    formatted_lines = []
+    in_list = False
+    in_numbered_list = False
+    expected_next_number = 1
+
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            # Keep paragraph breaks
+            formatted_lines.append('')
+            in_list = False
+            in_numbered_list = False
+            expected_next_number = 1
+            continue
+
+        # Check if this line is already a properly formatted section header (## Header)
+        if re.match(r'^##\s+.+', line):
+            # Add spacing before headers (except the first one)
+            if i > 0 and formatted_lines and formatted_lines[-1] != '':
+                formatted_lines.append('')
+
+            formatted_lines.append(line)
+            in_list = False
+            in_numbered_list = False
+            expected_next_number = 1
+            continue
+
+        # Check if this is a numbered list item
+        numbered_match = re.match(r'^(\d+)\.?\s+(.+)', line)
+        if numbered_match:
+            number = int(numbered_match.group(1))
+            content = numbered_match.group(2)
+
+            # Ensure proper sequential numbering
+            if not in_numbered_list or number == expected_next_number:
+                formatted_lines.append(f"{number}. {content}")
+                in_numbered_list = True
+                expected_next_number = number + 1
+            else:
+                # If the number doesn't match what we expect, force the correct number
+                formatted_lines.append(f"{expected_next_number}. {content}")
+                expected_next_number += 1
+
+            in_list = False
+            continue
+
+        # Check if this is a bullet list item
+        if re.match(r'^[-*•]\s+.+', line):
+            # Format existing bullet points consistently
+            if line.startswith('•') or line.startswith('*'):
+                line = '- ' + line[1:].lstrip()
+            formatted_lines.append(line)
+            in_list = True
+            in_numbered_list = False
+            expected_next_number = 1
+            continue
+
+        # Format short phrases as bullet points if they're not already
+        elif len(line) < 100 and not line.endswith('.') and not re.match(r'^[A-Z].*[\.\?!]$', line):
+            # Convert to a list item if it's not a complete sentence
+            formatted_lines.append(f"- {line}")
+            in_list = True
+            in_numbered_list = False
+            expected_next_number = 1
+            continue
+
+        # Regular paragraph text
+        formatted_lines.append(line)
+        in_list = False
+        in_numbered_list = False
+        expected_next_number = 1
+
+    # Join the lines back together
+    formatted_text = '\n'.join(formatted_lines)
+
+    # Add a disclaimer if not already present
+    if "disclaimer" not in formatted_text.lower() and "note:" not in formatted_text.lower():
+        formatted_text += "\n\n*Disclaimer: This information is provided for educational purposes only and should not replace professional medical advice.*"
+
+    # Ensure consistent spacing between sections
+    # Replace multiple consecutive newlines with just two
+    formatted_text = re.sub(r'\n{3,}', '\n\n', formatted_text)
+
+
+    return formatted_text
+
+
+SAMPLE_REPORT = """Summary:
+The patient shows elevated blood pressure and mild tachycardia.
+
+Key Medical Findings:
+1. Blood pressure 150/95
+2. Heart rate 105 bpm
+4. Cholesterol borderline
+- LDL slightly high
+* HDL normal
+
+Recommendations:
+- Reduce salt intake
+- Exercise 30 minutes a day
+Follow up with cardiology in 2 weeks.
+"""
+
+# Line shapes the formatter treats differently, mixed at random below
+LINE_SHAPES = [
+    "Summary:", "summary:  ", "OVERVIEW:", "  Symptoms:", "Follow-up:", "next steps:", "Next_Steps:\t",
+    "Key Medical Findings:", "report summary:", "Diagnosed Conditions: ", "Drug:", "diagnosis: extra",
+    "## Treatment", "##Title", "### Sub", "1. First", "2. Second", "5. Fifth", "3 Third", "2023 was a year",
+    "- bullet", "* star bullet", "• dot bullet", "*emphasis*", "-nospace", "A complete sentence.",
+    "Is this a question?", "Wow!", "lowercase fragment", "x" * 120, "Note: be careful",
+    "This is a disclaimer line", "", "", "   ", "\t", "\r", "Summary:\r", "A", "?", "12", "  indented text.",
+]
+
+
+def random_response(rng):
+    text = '\n'.join(rng.choice(LINE_SHAPES) for _ in range(rng.randint(0, 25)))
+    if rng.random() < 0.3:
+        text = rng.choice(['', '\n', '  \n ']) + text + rng.choice(['', '\n', '\n\n  '])
+    return text
+
+
+def test_formatter_matches_legacy(samples=20000, seed=0):
+    """The single-pass formatter gives the legacy output, whole and streamed in random chunks"""
+    rng = random.Random(seed)
+    texts = [SAMPLE_REPORT, "", "   \n  ", SAMPLE_REPORT.replace('\n', '\r\n')]
+    texts += [random_response(rng) for _ in range(samples)]
+    for text in texts:
+        expected = legacy_format_response(text)
+        assert format_response(text) == expected, f"Output differs for {text!r}"
+
+        formatter = ResponseFormatter()
+        streamed, i = '', 0
+        while i < len(text):
+            step = rng.randint(1, 16)
+            streamed += formatter.feed(text[i:i + step])
+            i += step
+        streamed += formatter.finish()
+        assert streamed == expected, f"Streamed output differs for {text!r}"
+    print(f"✅ Formatter output identical to the legacy formatter on {len(texts)} responses")
+
+
+def bench_formatter(repeat=200):
+    """Throughput of both formatters on a long report analysis"""
+    text = SAMPLE_REPORT * 20
+    results = {}
+    for name, formatter in (('legacy', legacy_format_response), ('single-pass', format_response)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            formatter(text)
+        elapsed = time.perf_counter() - started
+        results[name] = len(text) * repeat / elapsed
+        print(f"{name:<12} {results[name] / 1e6:8.2f} MB/s  {elapsed / repeat * 1000:7.3f} ms/response")
+    speedup = results['single-pass'] / results['legacy']
+    print(f"Speedup: {speedup:.1f}x (target {MIN_SPEEDUP}x)")
+    assert speedup >= MIN_SPEEDUP, f"Formatter throughput below target: {speedup:.1f}x < {MIN_SPEEDUP}x"
+
+
 async def test_duplicate_formats():
     """Test to ensure the chatbot doesn't produce duplicate formatted responses"""
     print("Initializing AI agent and chatbot...")
@@ -90,4 +298,12 @@ async def test_duplicate_formats():
     print("\n✅ All tests passed successfully! No duplicate formatting detected.")
 
 if __name__ == "__main__":
-    asyncio.run(test_duplicate_formats()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--formatter-only', action='store_true',
+                        help="Only compare and benchmark the formatter (no Ollama needed)")
+    args = parser.parse_args()
+
+    test_formatter_matches_legacy()
+    bench_formatter()
+    if not args.formatter_only:
+        asyncio.run(test_duplicate_formats())
@@ -1,68 +1,24 @@
-from sentence_transformers import SentenceTransformer
-import torch
 import logging
 from typing import Dict, List
 import asyncio
 import os
 import pickle
+import threading
+from .loaders import get_embedding_service
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class EnhancedAIAgent:
-    def __init__(self, user_id=None):
-        logger.info("Initializing EnhancedAIAgent with sentence-transformers")
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Initialize the model for semantic search
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.model.to(self.device)
-        
-        # Initialize conversation memory with user-specific history
-        self.conversation_history = []
-        self.max_history = 5
-        self.user_id = user_id or "default"
-        
-        # Create a directory for user agent histories
-        self.history_dir = os.path.join(os.path.dirname(__file__), "agent_histories")
-        os.makedirs(self.history_dir, exist_ok=True)
-        
-        # Set history file specific to this user
-        self.history_file = os.path.join(self.history_dir, f"agent_history_{self.user_id}.pkl")
-        
-        # Load any existing history
-        self._load_history()
-        
-        # Initialize medical knowledge base
-        self._initialize_medical_knowledge()
+# Embeddings of the knowledge base queries, shared by every agent in the process
+_knowledge_embeddings = {}
+_knowledge_lock = threading.Lock()
 
-    def _load_history(self):
-        """Load conversation history from file"""
-        try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'rb') as f:
-                    self.conversation_history = pickle.load(f)
-                    logger.info(f"Loaded {len(self.conversation_history)} agent history items")
-        except Exception as e:
-            logger.error(f"Error loading agent history: {e}")
-            self.conversation_history = []
-
-    def _save_history(self):
-        """Save conversation history to file"""
-        try:
-            with open(self.history_file, 'wb') as f:
-                pickle.dump(self.conversation_history, f)
-                logger.info(f"Saved {len(self.conversation_history)} agent history items")
-        except Exception as e:
-            logger.error(f"Error saving agent history: {e}")
-
-    def _initialize_medical_knowledge(self):
-        """Initialize the medical knowledge base with structured medical information"""
-        self.medical_knowledge = [
-            {
-                "query": "What are common symptoms of flu and cold?",
-                "response": """**Information**
+# Structured medical information the agent answers from, by similarity to "query"
+MEDICAL_KNOWLEDGE = [
+    {
+        "query": "What are common symptoms of flu and cold?",
+        "response": """**Information**
 - Fever and chills
 - Cough and sore throat
 - Body aches and fatigue
@@ -84,10 +40,10 @@ class EnhancedAIAgent:
 - Stay home to prevent spreading
 - Contact your doctor if symptoms worsen
 - Follow proper hygiene practices"""
-            },
-            {
-                "query": "How can I maintain a healthy heart?",
-                "response": """**Information**
+    },
+    {
+        "query": "How can I maintain a healthy heart?",
+        "response": """**Information**
 - Regular exercise is essential for heart health
 - A balanced diet plays a crucial role
 - Blood pressure monitoring is important
@@ -110,10 +66,10 @@ class EnhancedAIAgent:
 - Create a personalized exercise plan
 - Monitor your blood pressure
 - Discuss heart health with your doctor"""
-            },
-            {
-                "query": "What is a balanced diet?",
-                "response": """**Information**
+    },
+    {
+        "query": "What is a balanced diet?",
+        "response": """**Information**
 - A balanced diet includes all essential nutrients
 - Proper portion control is important
 - Regular meal timing helps maintain health
@@ -136,10 +92,10 @@ class EnhancedAIAgent:
 - Keep a food diary
 - Consult a nutritionist if needed
 - Make gradual dietary changes"""
-            },
-            {
-                "query": "How to manage stress and anxiety?",
-                "response": """**Information**
+    },
+    {
+        "query": "How to manage stress and anxiety?",
+        "response": """**Information**
 - Stress and anxiety are common experiences
 - Various techniques can help manage symptoms
 - Lifestyle changes play an important role
@@ -162,10 +118,10 @@ class EnhancedAIAgent:
 - Consider professional counseling if needed
 - Join support groups
 - Develop a daily relaxation routine"""
-            },
-            {
-                "query": "I broke my arm at the gym. What should I do?",
-                "response": """**Information**
+    },
+    {
+        "query": "I broke my arm at the gym. What should I do?",
+        "response": """**Information**
 - Broken arms typically cause severe pain, swelling, and visible deformity
 - You may experience limited movement or a grating sensation
 - The injured area may appear bruised or discolored
@@ -187,10 +143,10 @@ class EnhancedAIAgent:
 - Ask for an X-ray to confirm the fracture
 - Follow the treatment plan from your healthcare provider
 - Consider physical therapy during recovery"""
-            },
-            {
-                "query": "injured at gym broken bone",
-                "response": """**Information**
+    },
+    {
+        "query": "injured at gym broken bone",
+        "response": """**Information**
 - Gym injuries involving broken bones require immediate medical attention
 - Common signs include severe pain, swelling, deformity, and limited mobility
 - The severity and healing time depend on the location and type of fracture
@@ -212,33 +168,89 @@ class EnhancedAIAgent:
 - Follow all medical instructions for immobilization (cast, splint, etc.)
 - Attend all follow-up appointments to monitor healing
 - Consider physical therapy as recommended by your doctor"""
-            }
-        ]
+    }
+]
+
+
+def get_knowledge_embeddings(model):
+    """
+    Unit-length embeddings of the MEDICAL_KNOWLEDGE queries under model, computed
+    once per process. Plain numpy, so the ONNX encoder backend never needs torch.
+    """
+    from .intents import normalise
+
+    queries = tuple(item["query"] for item in MEDICAL_KNOWLEDGE)
+    with _knowledge_lock:
+        if queries not in _knowledge_embeddings:
+            _knowledge_embeddings[queries] = normalise(model.encode(list(queries)))
+    return _knowledge_embeddings[queries]
+
+
+class EnhancedAIAgent:
+    def __init__(self, user_id=None):
+        logger.info("Initializing EnhancedAIAgent with sentence-transformers")
+        
+        # The semantic search model is loaded once per process and shared between agents;
+        # concurrent queries are encoded together in micro-batches
+        self.model = get_embedding_service()
+        self.device = self.model.device
+        
+        # Initialize conversation memory with user-specific history
+        self.conversation_history = []
+        self.max_history = 5
+        self.user_id = user_id or "default"
+        
+        # Create a directory for user agent histories
+        self.history_dir = os.path.join(os.path.dirname(__file__), "agent_histories")
+        os.makedirs(self.history_dir, exist_ok=True)
+        
+        # Set history file specific to this user
+        self.history_file = os.path.join(self.history_dir, f"agent_history_{self.user_id}.pkl")
         
-        # Create embeddings for the medical knowledge queries
-        self.query_embeddings = self.model.encode(
-            [item["query"] for item in self.medical_knowledge],
-            convert_to_tensor=True
-        ).to(self.device)
+        # Load any existing history
+        self._load_history()
+        
+        # Initialize medical knowledge base
+        self._initialize_medical_knowledge()
+
+    def _load_history(self):
+        """Load conversation history from file"""
+        try:
+            if os.path.exists(self.history_file):
+                with open(self.history_file, 'rb') as f:
+                    self.conversation_history = pickle.load(f)
+                    logger.info(f"Loaded {len(self.conversation_history)} agent history items")
+        except Exception as e:
+            logger.error(f"Error loading agent history: {e}")
+            self.conversation_history = []
+
+    def _save_history(self):
+        """Save conversation history to file"""
+        try:
+            with open(self.history_file, 'wb') as f:
+                pickle.dump(self.conversation_history, f)
+                logger.info(f"Saved {len(self.conversation_history)} agent history items")
+        except Exception as e:
+            logger.error(f"Error saving agent history: {e}")
+
+    def _initialize_medical_knowledge(self):
+        """Initialize the medical knowledge base with structured medical information"""
+        self.medical_knowledge = MEDICAL_KNOWLEDGE
+        self.query_embeddings = get_knowledge_embeddings(self.model)
 
     def _get_most_relevant_response(self, query: str) -> str:
         """Get the most relevant response based on semantic similarity"""
+        from .intents import normalise
+        
         # Get query embedding
-        query_embedding = self.model.encode(
-            query,
-            convert_to_tensor=True
-        ).to(self.device)
+        query_embedding = normalise(self.model.encode(query))
         
-        # Calculate similarities
-        similarities = torch.nn.functional.cosine_similarity(
-            query_embedding.unsqueeze(0),
-            self.query_embeddings,
-            dim=1
-        )
+        # Cosine similarities: both sides are unit length
+        similarities = self.query_embeddings @ query_embedding
         
         # Get the most relevant response
-        max_similarity_idx = torch.argmax(similarities).item()
-        max_similarity = similarities[max_similarity_idx].item()
+        max_similarity_idx = int(similarities.argmax())
+        max_similarity = float(similarities[max_similarity_idx])
         
         logger.info(f"Query: {query}")
         logger.info(f"Most similar knowledge entry: {self.medical_knowledge[max_similarity_idx]['query']}")
@@ -0,0 +1,270 @@
+"""
+Shared health state of the LLM backend.
+
+Every chatbot used to probe Ollama's /tags twice when it was constructed
+(without a timeout the first time) and could pull the model synchronously
+inside a request. Instead, one BackendHealth per process probes with a short
+timeout, caches the result for a TTL and refreshes it in the background once
+it is stale; requests only read the cached state. Requests themselves go
+through a CircuitBreaker, so while the backend is down they fail at once
+instead of each waiting for a connection timeout. Model pulls only run in
+the startup warm-up or in a background thread.
+"""
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed: requests flow. After failure_threshold consecutive failures it
+    opens and rejects requests for reset_timeout seconds, then half-opens and
+    lets a single trial request through: success closes it, failure reopens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            self._half_open_if_due()
+            return self._state
+
+    def _half_open_if_due(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow(self):
+        """Whether a request may go to the backend now."""
+        with self._lock:
+            self._half_open_if_due()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self):
+        """Open at once, e.g. when a health probe finds the backend down."""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._trial_in_flight = False
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial request through (0 when it already would)."""
+        with self._lock:
+            self._half_open_if_due()
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def snapshot(self):
+        state = self.state
+        return {'state': state, 'failures': self._failures, 'retry_after_s': round(self.retry_after(), 1)}
+
+
+class BackendHealth:
+    """
+    Cached result of probe(), a callable that returns details about the
+    backend or raises when it is unreachable.
+    """
+
+    def __init__(self, name, probe, ttl=30.0, breaker=None, clock=time.monotonic):
+        self.name = name
+        self._probe = probe
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.up = None          # None until the first probe finishes
+        self.details = {}
+        self.error = None
+        self.checked_at = None
+
+    def refresh(self):
+        """Probe now (blocking) and return whether the backend is up."""
+        try:
+            details, error = self._probe(), None
+        except Exception as e:
+            details, error = {}, str(e)
+        with self._lock:
+            was_up = self.up
+            self.up = error is None
+            self.details = details
+            self.error = error
+            self.checked_at = self._clock()
+            self._refreshing = False
+        if self.up:
+            # Reachable is not the same as generating: only generation outcomes
+            # (or the half-open trial) close a breaker that failed generations opened
+            if was_up is False:
+                logger.info(f"{self.name} is reachable again")
+        else:
+            self.breaker.trip()
+            if was_up is not False:
+                logger.error(f"{self.name} is unavailable: {error}")
+        return self.up
+
+    def refresh_in_background(self):
+        """Start a refresh unless one is already running; never blocks."""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name=f'{self.name}-probe', daemon=True).start()
+        return True
+
+    @property
+    def stale(self):
+        return self.checked_at is None or self._clock() - self.checked_at >= self.ttl
+
+    def allow_request(self, trial=True):
+        """
+        Whether a request should go to the backend; kicks off a refresh if the
+        cached state is stale. With trial=False this only checks, without
+        claiming the half-open trial, for callers that may not reach the backend.
+        """
+        if self.stale:
+            self.refresh_in_background()
+        if not trial:
+            return self.breaker.state != CircuitBreaker.OPEN
+        return self.breaker.allow()
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.breaker.record_failure()
+
+    def snapshot(self):
+        with self._lock:
+            age = None if self.checked_at is None else round(self._clock() - self.checked_at, 1)
+            result = {'up': self.up, 'checked_s_ago': age, 'error': self.error, **self.details}
+        result['breaker'] = self.breaker.snapshot()
+        return result
+
+
+class OllamaHealth(BackendHealth):
+    """BackendHealth for Ollama, which also knows whether the chat model is pulled."""
+
+    def __init__(self, base_url, model, timeout=2.0, pull_timeout=1800.0, **kwargs):
+        super().__init__('Ollama', self._list_models, **kwargs)
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.pull_timeout = pull_timeout
+        self._pull_lock = threading.Lock()
+        self.pulling = False
+
+    def _list_models(self):
+        response = requests.get(f"{self.base_url}/tags", timeout=self.timeout)
+        response.raise_for_status()
+        return {'models': [model["name"] for model in response.json().get("models", [])]}
+
+    @property
+    def has_model(self):
+        """True/False once probed, None while unknown."""
+        if self.up is None:
+            return None
+        names = self.details.get('models', [])
+        wanted = self.model if ':' in self.model else f"{self.model}:latest"
+        return wanted in names
+
+    def pull_model(self):
+        """Pull the chat model (blocking; for startup and background threads only)."""
+        if not self._pull_lock.acquire(blocking=False):
+            return False
+        self.pulling = True
+        try:
+            logger.info(f"Pulling {self.model} into Ollama...")
+            response = requests.post(
+                f"{self.base_url}/pull", json={"name": self.model, "stream": False}, timeout=self.pull_timeout,
+            )
+            response.raise_for_status()
+            logger.info(f"Pulled {self.model}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to pull {self.model}: {e}")
+            return False
+        finally:
+            self.pulling = False
+            self._pull_lock.release()
+            self.refresh()
+
+    def ensure_model(self, wait=False):
+        """
+        Make sure the chat model is pulled. Unless wait is set this returns at
+        once, starting the pull in a background thread when the model is missing.
+        """
+        if self.stale:
+            if not wait:
+                self.refresh_in_background()
+                return self.has_model
+            self.refresh()
+        if self.up and not self.has_model and not self.pulling:
+            if wait:
+                return self.pull_model()
+            threading.Thread(target=self.pull_model, name='ollama-pull', daemon=True).start()
+        return self.has_model
+
+    def snapshot(self):
+        result = super().snapshot()
+        result.update({'model': self.model, 'has_model': self.has_model, 'pulling': self.pulling})
+        return result
+
+
+_ollama_health = None
+_ollama_health_lock = threading.Lock()
+
+
+def get_ollama_health():
+    """The process-wide OllamaHealth, created from settings on first call."""
+    global _ollama_health
+    if _ollama_health is None:
+        with _ollama_health_lock:
+            if _ollama_health is None:
+                _ollama_health = OllamaHealth(
+                    settings.OLLAMA_BASE_URL,
+                    settings.OLLAMA_MODEL,
+                    timeout=settings.OLLAMA_PROBE_TIMEOUT,
+                    pull_timeout=settings.OLLAMA_PULL_TIMEOUT,
+                    ttl=settings.OLLAMA_PROBE_TTL,
+                    breaker=CircuitBreaker(settings.OLLAMA_FAILURE_THRESHOLD, settings.OLLAMA_RETRY_AFTER),
+                )
+    return _ollama_health
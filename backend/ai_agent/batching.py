@@ -0,0 +1,134 @@
+"""
+Dynamic micro-batching of sentence embeddings.
+
+Each chat turn encodes its query on its own (knowledge lookup, intent
+fallback), so under concurrent load the CPU runs many one-sentence forward
+passes that compete for the same threads. EmbeddingBatcher sits in front of
+the encoder: callers hand in their sentences and block, a single worker
+thread collects requests for up to max_wait seconds (or max_batch
+sentences), encodes them in one forward pass and gives every caller its
+rows back. A request that waited while the previous batch was encoding is
+already older than the window, so under load batches form without extra
+delay. When there is no sign of concurrency (the previous batch had one
+request and nobody else is inside encode()), a batch closes at once, so a
+lone request doesn't wait at all.
+
+The batcher has the encode() signature the code already used on
+SentenceTransformer (a string gives one vector, a list gives a matrix;
+convert_to_tensor for torch), so it is a drop-in replacement.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ('sentences', 'future', 'enqueued')
+
+    def __init__(self, sentences):
+        self.sentences = sentences
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class EmbeddingBatcher:
+    def __init__(self, encoder, max_batch=32, max_wait=0.005):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._callers = 0
+        self._last_batch = 1
+        self.batches = 0
+        self.sentences = 0
+
+    @property
+    def device(self):
+        return self.encoder.device
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        """Embed sentences in a shared batch; blocks until this caller's rows are ready."""
+        single = isinstance(sentences, str)
+        request = _Request([sentences] if single else list(sentences))
+        if not request.sentences:
+            return self.encoder.encode([], convert_to_tensor=convert_to_tensor, **kwargs)
+        requests = self._ensure_worker()
+        with self._lock:
+            self._callers += 1
+        try:
+            requests.put(request)
+            vectors = request.future.result()
+        finally:
+            with self._lock:
+                self._callers -= 1
+        if single:
+            vectors = vectors[0]
+        if convert_to_tensor:
+            import torch
+
+            return torch.from_numpy(vectors)
+        return vectors
+
+    def _ensure_worker(self):
+        # The worker thread is per process: one started before a fork doesn't exist in the child
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.SimpleQueue()
+                    threading.Thread(target=self._work, args=(self._queue,), name='embedding-batcher',
+                                     daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _collect(self, requests):
+        """Block for a first request, then take more until the batch is full or the window has passed."""
+        batch = [requests.get()]
+        size = len(batch[0].sentences)
+        deadline = batch[0].enqueued + self.max_wait
+        if self._last_batch == 1 and self._callers <= 1:
+            # Nobody else is encoding: waiting could only add latency
+            deadline = 0.0
+        while size < self.max_batch:
+            try:
+                timeout = deadline - time.monotonic()
+                request = requests.get_nowait() if timeout <= 0 else requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.sentences)
+        self._last_batch = len(batch)
+        return batch
+
+    def _work(self, requests):
+        while True:
+            batch = self._collect(requests)
+            sentences = [sentence for request in batch for sentence in request.sentences]
+            try:
+                vectors = self.encoder.encode(sentences, convert_to_numpy=True)
+            except Exception as e:
+                logger.error(f"Batched encoding of {len(sentences)} sentences failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.sentences += len(sentences)
+            start = 0
+            for request in batch:
+                end = start + len(request.sentences)
+                request.future.set_result(vectors[start:end])
+                start = end
+
+    def snapshot(self):
+        return {
+            'batches': self.batches,
+            'sentences': self.sentences,
+            'mean_batch_size': round(self.sentences / self.batches, 2) if self.batches else None,
+        }
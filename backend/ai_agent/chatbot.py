@@ -1,89 +1,85 @@
-import requests
 import json
 from typing import Dict, List, Optional
 import logging
+from django.conf import settings
 from .ai_handler import EnhancedAIAgent
+from .intents import CHAT_TOPICS, CHAT_INTENTS
+from . import fast_path
+from .formatting import format_response
+from .coalescing import llm_flights
+from .llm_backends import BackendUnavailable, LLMBackendError
+from .scheduler import get_llm_scheduler, Overloaded, CHAT, REPORT
+from .loaders import get_llm_backend, get_ocr
+from .metrics import chat_tiers, TEMPLATE, LLM
 import os
 from pathlib import Path
 import pickle
 import traceback
 import asyncio
-import pytesseract
-from PIL import Image
-import numpy as np
 import io
 import base64
 import sys
-import re
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Tesseract path for Windows
-if os.name == 'nt':  # Windows
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    # Alternative common locations
-    if not os.path.exists(pytesseract.pytesseract.tesseract_cmd):
-        potential_paths = [
-            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
-            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-            r'C:\Tesseract-OCR\tesseract.exe'
-        ]
-        for path in potential_paths:
-            if os.path.exists(path):
-                pytesseract.pytesseract.tesseract_cmd = path
-                break
+class LLMModel:
+    """Scheduling, coalescing and fail-fast around the configured text generation backend (see llm_backends.py)"""
 
-class OllamaModel:
-    """Wrapper for Ollama API to provide a consistent interface for text generation"""
-    def __init__(self, base_url, model_name):
-        self.base_url = base_url
-        self.model_name = model_name
-        self.available = self.test_connection()
-        if self.available:
-            logger.info(f"Initialized OllamaModel with model: {model_name}")
-        else:
-            logger.error(f"Failed to initialize OllamaModel: Ollama service not available at {base_url}")
+    def __init__(self, backend=None):
+        self.backend = backend or get_llm_backend()
+        logger.info(f"Initialized LLMModel with {self.backend.name} model: {self.backend.model_name}")
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is believed up (cached probe and circuit breaker for Ollama); never blocks"""
+        return self.backend.available
         
     def test_connection(self) -> bool:
-        """Test if Ollama API is available"""
-        try:
-            response = requests.get(f"{self.base_url}/tags", timeout=5)
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"Error connecting to Ollama API: {str(e)}")
-            return False
+        """Check the backend now and update the shared health state"""
+        return self.backend.test_connection()
+        
+    def _stream(self, prompt: str, work_class: str, user=None):
+        """Yield the generated text as the backend streams it (one upstream call, in a scheduler slot)"""
+        with get_llm_scheduler().slot(work_class, user):
+            # Checked here, where the upstream call starts: a half-open breaker's trial
+            # is only claimed by a request that will report its outcome
+            if not self.backend.allow_request():
+                raise BackendUnavailable(f"The {self.backend.name} backend is unavailable")
+            yield from self.backend.stream(prompt)
+
+    def stream_text(self, prompt: str, work_class: str = CHAT, user=None):
+        """
+        Iterate the generated text chunk by chunk. Identical prompts of the
+        same work class in flight at the same time share one generation, so a
+        request is never queued at another class's priority. Raises Overloaded
+        when the scheduler rejects this request (not when it rejects the one
+        whose generation it joined).
+        """
+        key = llm_flights.key(self.backend.name, self.backend.model_name, prompt, self.backend.options, work_class)
+        return llm_flights.stream(key, lambda: self._stream(prompt, work_class, user),
+                                  timeout=settings.LLM_FOLLOW_TIMEOUT, rejected=Overloaded)
         
-    async def generate_text(self, prompt: str) -> str:
-        """Generate text using the Ollama API"""
+    async def generate_text(self, prompt: str, work_class: str = CHAT, user=None) -> str:
+        """Generate text with the configured backend"""
         try:
-            if not self.available:
+            if not self.backend.allow_request(trial=False):
+                # Fail fast while the backend is down instead of waiting for a timeout
                 return "I apologize, but the AI service is currently unavailable. Please try again later."
                 
-            logger.info(f"Generating text with model: {self.model_name}")
-            response = requests.post(
-                f"{self.base_url}/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "top_k": 40,
-                        "num_predict": 2048,
-                    }
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Error from Ollama API: {response.status_code} - {response.text}")
-                return "I apologize, but I'm having trouble processing your request right now."
-                
-            result = response.json()
-            return result.get("response", "")
+            logger.info(f"Generating text with model: {self.backend.model_name}")
+            return await asyncio.to_thread(lambda: ''.join(self.stream_text(prompt, work_class, user)))
             
+        except Overloaded:
+            # The view answers 429 with Retry-After
+            raise
+        except BackendUnavailable:
+            return "I apologize, but the AI service is currently unavailable. Please try again later."
+        except LLMBackendError as e:
+            logger.error(f"Error from the {self.backend.name} backend: {e}")
+            return "I apologize, but I'm having trouble processing your request right now."
         except Exception as e:
             logger.error(f"Error generating text: {str(e)}")
             logger.error(traceback.format_exc())
@@ -91,8 +87,6 @@ class OllamaModel:
 
 class MedicalChatbot:
     def __init__(self, user_id=None):
-        self.base_url = "http://localhost:11434/api"
-        self.model = "gemma:2b"  # Using Google's Gemma 2B model
         self.user_id = user_id or "default"
         self.ai_agent = EnhancedAIAgent(user_id=self.user_id)
         self.conversation_history = []
@@ -108,33 +102,16 @@ class MedicalChatbot:
         # Load any existing history
         self._load_history()
         
+        # Initialize the LLM model interface
+        self.llm_model = LLMModel()
+        
         # Initialize Gemma model
         self._initialize_gemma()
-        
-        # Initialize the LLM model interface
-        self.llm_model = OllamaModel(self.base_url, self.model)
 
     def _initialize_gemma(self):
-        """Initialize the Gemma model using Ollama"""
-        try:
-            # Check if Gemma model is already pulled
-            response = requests.get(f"{self.base_url}/tags")
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                if not any(model["name"].startswith("gemma") for model in models):
-                    logger.info("Pulling Gemma model...")
-                    # Pull the Gemma model
-                    response = requests.post(
-                        f"{self.base_url}/pull",
-                        json={"name": self.model}
-                    )
-                    if response.status_code != 200:
-                        logger.error("Failed to pull Gemma model")
-                        raise Exception("Failed to initialize Gemma model")
-            logger.info("Gemma model initialized successfully")
-        except Exception as e:
-            logger.error(f"Error initializing Gemma model: {e}")
-            raise
+        """Make sure the chat model (Gemma in Ollama by default) is available, without blocking the request"""
+        # Ollama reads the shared probe; a missing model is pulled in a background thread
+        self.llm_model.backend.ensure_model()
 
     def _load_history(self):
         """Load conversation history from file"""
@@ -177,126 +154,10 @@ class MedicalChatbot:
     def _format_response(self, text: str) -> str:
         """
         Apply formatting to the model's response to make it more structured and readable
-        with bullet points and proper section formatting
+        with bullet points and proper section formatting (see formatting.py)
         """
-        # Remove any extra whitespace
-        text = text.strip()
-        
-        # If the text is empty, return a default message
-        if not text:
-            return "I apologize, but I couldn't generate a proper response. Please try asking your question again."
-        
-        # Format the response with Markdown styling for better visual appearance
-        formatted_text = text
-        
-        # Ensure section headers use proper Markdown format
-        # Replace any headers that don't use ## format
-        header_patterns = [
-            (r'(?im)^(summary|overview)[:]\s*$', '## Summary\n'),
-            (r'(?im)^(symptoms|signs)[:]\s*$', '## Symptoms\n'),
-            (r'(?im)^(diagnosis|condition|disease)[:]\s*$', '## Diagnosis\n'),
-            (r'(?im)^(treatment|therapy|management)[:]\s*$', '## Treatment\n'),
-            (r'(?im)^(medications|prescription|drug)[:]\s*$', '## Medications\n'),
-            (r'(?im)^(recommendations|advice|suggestions)[:]\s*$', '## Recommendations\n'),
-            (r'(?im)^(prevention|precautions)[:]\s*$', '## Prevention\n'),
-            (r'(?im)^(warnings|cautions|alerts)[:]\s*$', '## Important Warnings\n'),
-            (r'(?im)^(follow.?up|next.?steps)[:]\s*$', '## Follow-up Steps\n'),
-            (r'(?im)^(key medical findings)[:]\s*$', '## Key Medical Findings\n'),
-            (r'(?im)^(report summary)[:]\s*$', '## Report Summary\n'),
-            (r'(?im)^(diagnosed conditions)[:]\s*$', '## Diagnosed Conditions\n')
-        ]
-        
-        # Process each section pattern
-        for pattern, replacement in header_patterns:
-            formatted_text = re.sub(pattern, replacement, formatted_text)
-        
-        # Process each line
-        lines = formatted_text.split('\n')
-        formatted_lines = []
-        in_list = False
-        in_numbered_list = False
-        expected_next_number = 1
-        
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                # Keep paragraph breaks
-                formatted_lines.append('')
-                in_list = False
-                in_numbered_list = False
-                expected_next_number = 1
-                continue
-            
-            # Check if this line is already a properly formatted section header (## Header)
-            if re.match(r'^##\s+.+', line):
-                # Add spacing before headers (except the first one)
-                if i > 0 and formatted_lines and formatted_lines[-1] != '':
-                    formatted_lines.append('')
-                
-                formatted_lines.append(line)
-                in_list = False
-                in_numbered_list = False
-                expected_next_number = 1
-                continue
-            
-            # Check if this is a numbered list item
-            numbered_match = re.match(r'^(\d+)\.?\s+(.+)', line)
-            if numbered_match:
-                number = int(numbered_match.group(1))
-                content = numbered_match.group(2)
-                
-                # Ensure proper sequential numbering
-                if not in_numbered_list or number == expected_next_number:
-                    formatted_lines.append(f"{number}. {content}")
-                    in_numbered_list = True
-                    expected_next_number = number + 1
-                else:
-                    # If the number doesn't match what we expect, force the correct number
-                    formatted_lines.append(f"{expected_next_number}. {content}")
-                    expected_next_number += 1
-                
-                in_list = False
-                continue
-                
-            # Check if this is a bullet list item
-            if re.match(r'^[-*•]\s+.+', line):
-                # Format existing bullet points consistently
-                if line.startswith('•') or line.startswith('*'):
-                    line = '- ' + line[1:].lstrip()
-                formatted_lines.append(line)
-                in_list = True
-                in_numbered_list = False
-                expected_next_number = 1
-                continue
-                
-            # Format short phrases as bullet points if they're not already
-            elif len(line) < 100 and not line.endswith('.') and not re.match(r'^[A-Z].*[\.\?!]$', line):
-                # Convert to a list item if it's not a complete sentence
-                formatted_lines.append(f"- {line}")
-                in_list = True
-                in_numbered_list = False
-                expected_next_number = 1
-                continue
-            
-            # Regular paragraph text
-            formatted_lines.append(line)
-            in_list = False
-            in_numbered_list = False
-            expected_next_number = 1
-        
-        # Join the lines back together
-        formatted_text = '\n'.join(formatted_lines)
-        
-        # Add a disclaimer if not already present
-        if "disclaimer" not in formatted_text.lower() and "note:" not in formatted_text.lower():
-            formatted_text += "\n\n*Disclaimer: This information is provided for educational purposes only and should not replace professional medical advice.*"
-        
-        # Ensure consistent spacing between sections
-        # Replace multiple consecutive newlines with just two
-        formatted_text = re.sub(r'\n{3,}', '\n\n', formatted_text)
-        
+        formatted_text = format_response(text)
         logger.info(f"Formatted response with improved styling, length: {len(formatted_text)} characters")
-        
         return formatted_text
 
     def _format_section_content(self, content):
@@ -320,41 +181,53 @@ class MedicalChatbot:
             
         return '\n'.join(formatted_lines)
 
-    def _should_ask_about_symptoms(self, query: str) -> bool:
+    def _should_ask_about_symptoms(self, query: str, topics=None) -> bool:
         """
         Determine if we should prompt the user for more symptom information
         """
-        query_lower = query.lower()
-        symptom_keywords = [
-            "symptom", "feel", "sick", "pain", "ache", "hurt", "discomfort", 
-            "sore", "unwell", "ill", "suffering", "not feeling", "condition"
-        ]
-        
-        # Check if query contains symptom-related terms but is vague
-        has_symptom_terms = any(keyword in query_lower for keyword in symptom_keywords)
+        if topics is None:
+            topics = CHAT_TOPICS.matches(query)
         
         # Determine if query is short/vague (simple heuristic)
         is_vague = len(query.split()) < 10
         
-        return has_symptom_terms and is_vague
+        return 'symptom' in topics and is_vague
         
-    def _should_ask_about_medication(self, query: str) -> bool:
+    def _should_ask_about_medication(self, query: str, topics=None) -> bool:
         """
         Determine if we should prompt the user for more medication information
         """
-        query_lower = query.lower()
-        medication_keywords = [
-            "medicine", "medication", "drug", "pill", "prescription", "dose", 
-            "taking", "take", "prescribed", "pharmacy", "treatment", "side effect"
-        ]
+        if topics is None:
+            topics = CHAT_TOPICS.matches(query)
         
-        # Check if query mentions medications but is missing specifics
-        has_medication_terms = any(keyword in query_lower for keyword in medication_keywords)
+        # Skip when the query is already about drug interactions or side effects
+        return 'medication' in topics and 'interaction' not in topics
+
+    def classify_intent(self, query: str):
+        """
+        Route the query to a conversational intent: keyword rules first, then the
+        nearest intent centroid under the already-loaded MiniLM encoder
+        """
+        return CHAT_INTENTS.route(query, encoder=getattr(self.ai_agent, 'model', None))
+
+    async def _fast_path_response(self, query: str):
+        """
+        Answer pure small talk (greetings, thanks, goodbyes) from templates.
+        Returns None when the query needs the LLM.
+        """
+        started = time.perf_counter()
+        intent, method = CHAT_INTENTS.route(query)
+        if method == 'default':
+            # No keyword rule matched; try the embedding centroids off the event loop
+            intent, method = await asyncio.to_thread(self.classify_intent, query)
         
-        # Check if query is likely asking about drug interactions or side effects
-        is_interaction_query = "interact" in query_lower or "side effect" in query_lower
+        tier = fast_path.tier_for(intent, query)
+        answer = fast_path.template_answer(intent) if tier == TEMPLATE else None
         
-        return has_medication_terms and not is_interaction_query
+        if answer is not None:
+            chat_tiers.record(tier, time.perf_counter() - started)
+            logger.info(f"Answered {intent} ({method}) from the {tier} tier without the LLM")
+        return answer
         
     async def _get_additional_knowledge(self, query: str) -> str:
         """
@@ -390,6 +263,9 @@ class MedicalChatbot:
             # Log the image size for debugging
             logger.info(f"Processing image of size: {len(image_data)} bytes")
             
+            # OCR libraries are imported on first use (see loaders.py)
+            pytesseract, Image, np = get_ocr()
+            
             # Convert image bytes to PIL Image
             image = Image.open(io.BytesIO(image_data))
             
@@ -485,7 +361,7 @@ class MedicalChatbot:
             )
             
             # Generate the analysis using the LLM
-            analysis = await self.llm_model.generate_text(prompt)
+            analysis = await self.llm_model.generate_text(prompt, REPORT, self.user_id)
             
             return {
                 "success": True,
@@ -493,6 +369,8 @@ class MedicalChatbot:
                 "analysis": analysis
             }
             
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Error processing medical image: {str(e)}", exc_info=True)
             error_message = f"Error processing image: {str(e)}"
@@ -502,19 +380,30 @@ class MedicalChatbot:
                 "error": error_message
             }
 
-    async def generate_response(self, query: str, context: Dict = None) -> str:
+    async def generate_response(self, query: str, context: Dict = None, work_class: str = CHAT) -> str:
         """
         Generate a conversational response to the user's query
         
         Args:
             query: The user's query
             context: Optional context information such as appointment details or medical records
+            work_class: Scheduling class of the LLM call (see scheduler.WORK_CLASSES)
         """
         try:
+            started = time.perf_counter()
+            
             # Default context to empty dict if None
             if context is None:
                 context = {}
+            
+            # Small talk skips the knowledge lookup and the LLM entirely
+            fast_answer = await self._fast_path_response(query)
+            if fast_answer is not None:
+                return fast_answer
                 
+            # One pass over the query finds every topic the prompt depends on
+            topics = CHAT_TOPICS.matches(query)
+            
             # Determine if this is a follow-up question related to a medical report
             is_followup_question = context.get('is_followup_question', False)
             has_report_context = context.get('report_text') or context.get('report_analysis')
@@ -522,19 +411,9 @@ class MedicalChatbot:
             # Check if the query appears unrelated to the medical report context
             # This helps avoid forcing all responses to be about the medical report
             if is_followup_question and has_report_context:
-                # Check if the query appears to be about a completely different topic
-                medical_keywords = [
-                    "report", "scan", "test", "results", "diagnosis", "doctor", 
-                    "medical", "hospital", "treatment", "cancer", "tumor", "medication",
-                    "prescription", "therapy", "doctor", "health", "symptom"
-                ]
-                
-                # Simple heuristic to check if query is likely unrelated to the report
-                query_lower = query.lower()
-                contains_medical_term = any(keyword in query_lower for keyword in medical_keywords)
-                
-                # If the query seems completely unrelated, don't treat it as a follow-up
-                if not contains_medical_term and len(query.split()) > 3:
+                # Simple heuristic to check if query is likely unrelated to the report:
+                # if the query seems completely unrelated, don't treat it as a follow-up
+                if 'medical' not in topics and len(query.split()) > 3:
                     logger.info("Query appears unrelated to medical report context - responding as general query")
                     # Clear the context for this specific query to avoid forcing a medical report response
                     is_followup_question = False
@@ -543,8 +422,8 @@ class MedicalChatbot:
             knowledge_info = await self._get_additional_knowledge(query)
             
             # Determine conversation mode and needed information
-            should_ask_about_symptoms = self._should_ask_about_symptoms(query)
-            should_ask_about_medication = self._should_ask_about_medication(query)
+            should_ask_about_symptoms = self._should_ask_about_symptoms(query, topics)
+            should_ask_about_medication = self._should_ask_about_medication(query, topics)
             
             # Build the base prompt for the model 
             prompt = (
@@ -620,14 +499,17 @@ class MedicalChatbot:
             
             # Get the raw response from the model
             logger.info(f"Sending prompt to LLM model. Prompt length: {len(prompt)} characters")
-            raw_response = await self.llm_model.generate_text(prompt)
+            raw_response = await self.llm_model.generate_text(prompt, work_class, self.user_id)
             logger.info(f"Received raw response. Length: {len(raw_response)} characters")
             
             # Apply formatting to preserve natural conversation flow while improving structure
             formatted_response = self._format_response(raw_response)
+            chat_tiers.record(LLM, time.perf_counter() - started)
             
             return formatted_response
             
+        except Overloaded:
+            raise
         except Exception as e:
             # Log the error and return a friendly error message
             logger.error(f"Error generating response: {str(e)}", exc_info=True)
@@ -0,0 +1,140 @@
+"""
+Single-flight coalescing of identical LLM generations.
+
+When several users send the same prompt at about the same time (a popular
+question during a health-news spike), only the first request starts a
+generation; the others join it and share its output. Output is fanned out
+chunk by chunk as it streams in, so every waiter sees the same text as soon
+as the one upstream call produces it, and a waiter that joins late first
+gets the chunks produced so far. Nothing is cached: once a generation
+finishes, the next identical prompt starts a new one.
+
+The leader's admission is its own: when its generation fails before
+producing anything with one of the errors passed as rejected (the
+scheduler's Overloaded for the leader's user), every follower starts over
+with its own produce() and gets its own admission decision. Followers wait
+at most timeout seconds for each next chunk.
+
+Requests run their coroutines on separate event loops (async_to_sync), so
+flights are coordinated with threads rather than asyncio primitives. The
+upstream call runs in its own thread and finishes even if the request
+that started it goes away.
+"""
+import hashlib
+import json
+import threading
+
+
+class Flight:
+    """One in-progress generation and the chunks it has produced so far."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, timeout=None):
+        """
+        Yield every chunk from the first, blocking for new ones; re-raise the
+        producer's error at the end. Raises TimeoutError when no chunk comes
+        for timeout seconds.
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError(f"No output from the shared generation for {timeout} s")
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            yield from chunks
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    def __init__(self, name='single-flight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(*parts):
+        """Stable hash of everything that determines the output (backend, model, prompt, options)."""
+        encoded = json.dumps(parts, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def join(self, key, produce):
+        """
+        Return the flight for key, starting one that iterates produce() if
+        none is in progress.
+        """
+        return self._join(key, produce)[0]
+
+    def _join(self, key, produce):
+        """The flight for key and whether this call started it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.started += 1
+        threading.Thread(target=self._run, args=(key, flight, produce), name=self.name, daemon=True).start()
+        return flight, True
+
+    def _run(self, key, flight, produce):
+        error = None
+        try:
+            for chunk in produce():
+                flight.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            # Remove before finishing, so a request arriving after the last chunk starts afresh
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish(error)
+
+    def stream(self, key, produce, timeout=None, rejected=()):
+        """
+        Iterate the chunks of the (possibly shared) generation for key. A
+        follower whose leader was rejected tries again with its own produce().
+        """
+        while True:
+            flight, started = self._join(key, produce)
+            try:
+                yield from flight.follow(timeout)
+                return
+            except rejected:
+                if started or flight.chunks:
+                    raise
+
+    def run(self, key, produce, timeout=None, rejected=()):
+        """The full text of the (possibly shared) generation for key."""
+        return ''.join(self.stream(key, produce, timeout, rejected))
+
+    def snapshot(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), 'started': self.started, 'coalesced': self.coalesced}
+
+
+# Every LLM generation in the process goes through here
+llm_flights = SingleFlight('llm-flight')
@@ -0,0 +1,55 @@
+"""
+Answers for small talk without the LLM.
+
+Pure greetings, thanks and goodbyes are answered from templates. A message
+that also asks or says anything else goes to the LLM.
+"""
+import logging
+import re
+
+from .metrics import TEMPLATE
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TEMPLATES = {
+    'greeting': """## Hello!
+- I'm MediCare, your health assistant.
+- Ask me about symptoms, conditions, treatments or healthy habits.
+
+How can I help you today?""",
+    'thanks': """## You're Welcome!
+- I'm glad I could help.
+- Feel free to ask a follow-up question at any time.""",
+    'goodbye': """## Take Care!
+- Thanks for chatting with MediCare.
+- Come back any time you have a health question.""",
+}
+
+# Everything a pure small-talk message may be made of. "Hi, what is a good
+# diet?" leaves words over once these are removed, so it goes to the LLM
+SMALL_TALK_WORDS = frozenset([
+    'hello', 'hi', 'hey', 'greetings', 'good', 'morning', 'afternoon', 'evening', 'there',
+    'thank', 'thanks', 'you', 'so', 'much', 'very', 'a', 'lot', 'appreciate', 'it', 'for', 'the', 'help',
+    'bye', 'goodbye', 'see', 'later', 'now', 'cheers', 'ok', 'okay',
+])
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def tier_for(intent, query):
+    """Return 'template' or None (use the LLM) for a routed query."""
+    if intent in TEMPLATES and is_small_talk(query):
+        return TEMPLATE
+    return None
+
+
+def is_small_talk(query):
+    """Whether the message is only a greeting, thanks or goodbye: no question and nothing else said."""
+    if '?' in query:
+        return False
+    words = _WORD_RE.findall(query.lower())
+    return bool(words) and all(word in SMALL_TALK_WORDS for word in words)
+
+
+def template_answer(intent):
+    return TEMPLATES[intent]
@@ -0,0 +1,155 @@
+"""
+Single-pass formatter for model responses.
+
+Produces exactly what MedicalChatbot._format_response used to produce with a
+dozen whole-text re.sub passes and per-line re.match calls, but looks at
+each line once, with precompiled patterns and one header table. It can also
+be fed a streamed response chunk by chunk; every completed line is formatted
+and returned immediately.
+"""
+import re
+
+EMPTY_RESPONSE = "I apologize, but I couldn't generate a proper response. Please try asking your question again."
+DISCLAIMER = ("*Disclaimer: This information is provided for educational purposes only "
+              "and should not replace professional medical advice.*")
+
+# Plain "Label:" lines the model writes instead of markdown headers
+HEADERS = [
+    ('Summary', r'summary|overview'),
+    ('Symptoms', r'symptoms|signs'),
+    ('Diagnosis', r'diagnosis|condition|disease'),
+    ('Treatment', r'treatment|therapy|management'),
+    ('Medications', r'medications|prescription|drug'),
+    ('Recommendations', r'recommendations|advice|suggestions'),
+    ('Prevention', r'prevention|precautions'),
+    ('Important Warnings', r'warnings|cautions|alerts'),
+    ('Follow-up Steps', r'follow.?up|next.?steps'),
+    ('Key Medical Findings', r'key medical findings'),
+    ('Report Summary', r'report summary'),
+    ('Diagnosed Conditions', r'diagnosed conditions'),
+]
+_HEADER = re.compile(
+    '(?:' + '|'.join(f'(?P<h{i}>{pattern})' for i, (_, pattern) in enumerate(HEADERS)) + r'):\s*',
+    re.IGNORECASE,
+)
+_HEADER_TITLES = {f'h{i}': f'## {title}' for i, (title, _) in enumerate(HEADERS)}
+
+_MARKDOWN_HEADER = re.compile(r'##\s+.+')
+_NUMBERED = re.compile(r'(\d+)\.?\s+(.+)')
+_BULLET = re.compile(r'[-*•]\s+.+')
+_UPPERCASE = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+class ResponseFormatter:
+    """
+    Incremental formatter: feed() text as it arrives, then finish().
+    The concatenation of everything returned equals format_response(full_text).
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._started = False          # seen any non-whitespace yet
+        self._emitted = False          # written any line yet
+        self._blanks = 0               # blank lines since the last written line
+        self._after_header = False     # last line was a converted "Label:" header
+        self._numbered = False
+        self._next_number = 1
+        self._has_disclaimer = False
+
+    def feed(self, chunk):
+        """Add text; return the formatted output for every line it completed."""
+        self._buffer += chunk
+        if '\n' not in self._buffer:
+            return ''
+        *lines, self._buffer = self._buffer.split('\n')
+        return ''.join(self._line(line) for line in lines)
+
+    def finish(self):
+        """Format the remaining text and return the final output, disclaimer included."""
+        out = self._line(self._buffer) if self._buffer else ''
+        self._buffer = ''
+        if not self._emitted:
+            return EMPTY_RESPONSE
+        if self._after_header:
+            # A header on the last line keeps its trailing blank line
+            out += '\n'
+        if not self._has_disclaimer:
+            out += ('\n' if self._after_header else '\n\n') + DISCLAIMER
+        return out
+
+    def _line(self, raw):
+        if not self._started:
+            # Leading whitespace of the whole response is dropped
+            raw = raw.lstrip()
+            if not raw:
+                return ''
+            self._started = True
+
+        # Cheap first-character/substring checks skip regexes that can't match
+        header = ':' in raw and _HEADER.fullmatch(raw)
+        if header:
+            # Any blank lines that follow are folded into the header's one blank line
+            out = self._write(_HEADER_TITLES[header.lastgroup], header=True)
+            self._after_header = True
+            self._reset_numbering()
+            return out
+
+        line = raw.strip()
+        if not line:
+            if not self._after_header:
+                self._blanks += 1
+            self._reset_numbering()
+            return ''
+
+        if line[0] == '#' and _MARKDOWN_HEADER.match(line):
+            self._reset_numbering()
+            return self._write(line, header=True)
+
+        numbered = line[0].isdigit() and _NUMBERED.match(line)
+        if numbered:
+            number = int(numbered.group(1))
+            if not self._numbered or number == self._next_number:
+                self._numbered = True
+                self._next_number = number + 1
+            else:
+                # Out-of-sequence numbers are rewritten to continue the list
+                number = self._next_number
+                self._next_number += 1
+            return self._write(f"{number}. {numbered.group(2)}")
+
+        self._reset_numbering()
+        if line[0] in '-*•' and _BULLET.match(line):
+            if line[0] in '•*':
+                line = '- ' + line[1:].lstrip()
+            return self._write(line)
+        if len(line) < 100 and not line.endswith('.') and not (
+                len(line) > 1 and line[0] in _UPPERCASE and line[-1] in '.?!'):
+            # Fragments that aren't complete sentences become bullet points
+            return self._write(f"- {line}")
+        return self._write(line)
+
+    def _write(self, line, header=False):
+        if not self._emitted:
+            separator = ''
+        elif self._blanks or self._after_header or header:
+            # Runs of blank lines collapse to one; headers always get one before them
+            separator = '\n\n'
+        else:
+            separator = '\n'
+        self._emitted = True
+        self._blanks = 0
+        self._after_header = False
+        if not self._has_disclaimer:
+            lowered = line.lower()
+            self._has_disclaimer = 'disclaimer' in lowered or 'note:' in lowered
+        return separator + line
+
+    def _reset_numbering(self):
+        self._numbered = False
+        self._next_number = 1
+
+
+def format_response(text):
+    """Format a complete response."""
+    formatter = ResponseFormatter()
+    return formatter.feed(text) + formatter.finish()
@@ -0,0 +1,212 @@
+"""
+Keyword and embedding based intent routing.
+
+KeywordMatcher finds every label whose keywords occur in a text with a single
+regex pass, instead of one `any(kw in text ...)` scan per label. IntentRouter
+puts a priority order on top of it and, when no keyword matches, falls back to
+the nearest intent centroid in the sentence-embedding space of the encoder the
+caller already has loaded (MiniLM for the chatbot).
+"""
+import logging
+import re
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class KeywordMatcher:
+    """
+    Matches many keyword lists against a text in one pass.
+
+    By default a keyword matches anywhere, exactly like `keyword in text.lower()`.
+    With whole_words=True it must start and end on a word boundary, so 'hi'
+    no longer matches inside 'this'.
+    """
+
+    def __init__(self, keywords, whole_words=False):
+        self.keywords = {label: [word.lower() for word in words] for label, words in keywords.items()}
+        self.labels = list(self.keywords)
+        self.whole_words = whole_words
+        owners = {}
+        for label, words in self.keywords.items():
+            for word in words:
+                owners.setdefault(word, set()).add(label)
+
+        # Longest first, so at each position the regex reports the longest keyword;
+        # shorter keywords starting at the same position are prefixes of it and
+        # their labels are folded in below, which keeps overlapping keywords exact.
+        words = sorted(owners, key=len, reverse=True)
+        self._labels_for = {}
+        for word in words:
+            labels = set()
+            for other, other_labels in owners.items():
+                if word.startswith(other) and (not whole_words or self._ends_word(word, len(other))):
+                    labels |= other_labels
+            self._labels_for[word] = frozenset(labels)
+
+        alternation = '|'.join(re.escape(word) for word in words)
+        if whole_words:
+            alternation = rf'\b(?:{alternation})\b'
+        # Zero-width lookahead so matches may overlap (e.g. 'pill' and 'ill')
+        self._regex = re.compile(f'(?=({alternation}))') if words else None
+
+    @staticmethod
+    def _ends_word(word, length):
+        return length == len(word) or not (word[length].isalnum() or word[length] == '_')
+
+    def matches(self, text):
+        """Return the set of labels with at least one keyword in text."""
+        if self._regex is None or not text:
+            return set()
+        found = set()
+        labels_for = self._labels_for
+        for match in self._regex.finditer(text.lower()):
+            found |= labels_for[match.group(1)]
+        return found
+
+    def first(self, text, default=None):
+        """Return the first label, in declaration order, with a keyword in text."""
+        found = self.matches(text)
+        for label in self.labels:
+            if label in found:
+                return label
+        return default
+
+
+class IntentRouter:
+    """
+    Classifies a message into one intent: keyword rules first, then (optionally)
+    the nearest centroid of example phrases under a sentence encoder.
+    """
+
+    def __init__(self, rules, examples=None, default='general', threshold=0.5, whole_words=True):
+        self.matcher = KeywordMatcher(rules, whole_words=whole_words)
+        self.examples = examples or {}
+        self.default = default
+        self.threshold = threshold
+        self._encoder = None
+        self._centroids = None
+
+    def _centroids_for(self, encoder):
+        """Normalised mean embedding of each intent's examples, computed once per encoder."""
+        if self._encoder is not encoder:
+            import numpy as np
+
+            labels = list(self.examples)
+            phrases = [phrase for label in labels for phrase in self.examples[label]]
+            vectors = normalise(np.asarray(encoder.encode(phrases)))
+            centroids, start = [], 0
+            for label in labels:
+                end = start + len(self.examples[label])
+                centroids.append(vectors[start:end].mean(axis=0))
+                start = end
+            self._centroids = (labels, normalise(np.vstack(centroids)))
+            self._encoder = encoder
+        return self._centroids
+
+    def route(self, text, encoder=None):
+        """Return (intent, method), method being 'rule', 'embedding' or 'default'."""
+        intent = self.matcher.first(text)
+        if intent is not None:
+            return intent, 'rule'
+        if encoder is not None and self.examples and text and text.strip():
+            try:
+                import numpy as np
+
+                labels, centroids = self._centroids_for(encoder)
+                query = normalise(np.asarray(encoder.encode([text])))[0]
+                scores = centroids @ query
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    return labels[best], 'embedding'
+            except Exception as e:
+                logger.error(f"Embedding intent fallback failed: {e}")
+        return self.default, 'default'
+
+
+def normalise(vectors):
+    import numpy as np
+
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# Topic flags the chatbot uses to shape its prompt. Plain substring matching,
+# as the keyword lists were written for it ('feel' covers 'feeling').
+CHAT_TOPICS = KeywordMatcher({
+    'symptom': [
+        "symptom", "feel", "sick", "pain", "ache", "hurt", "discomfort",
+        "sore", "unwell", "ill", "suffering", "not feeling", "condition",
+    ],
+    'medication': [
+        "medicine", "medication", "drug", "pill", "prescription", "dose",
+        "taking", "take", "prescribed", "pharmacy", "treatment", "side effect",
+    ],
+    'interaction': ["interact", "side effect"],
+    'medical': [
+        "report", "scan", "test", "results", "diagnosis", "doctor",
+        "medical", "hospital", "treatment", "cancer", "tumor", "medication",
+        "prescription", "therapy", "health", "symptom",
+    ],
+})
+
+# Conversational intents of a chat message, in priority order. Whole words only:
+# these decide how a message is answered, so 'hi' must not fire on 'this'.
+CHAT_INTENTS = IntentRouter(
+    rules={
+        'greeting': ['hello', 'hi', 'hey', 'greetings', 'good morning', 'good afternoon', 'good evening'],
+        'thanks': ['thank you', 'thanks', 'thank', 'appreciate it'],
+        'goodbye': ['bye', 'goodbye', 'see you'],
+        'medication_lookup': ['my medications', 'my medication', 'my medicines', 'my meds', 'my pills',
+                              'my prescriptions'],
+        'appointment_lookup': ['my appointments', 'my appointment', 'my next appointment', 'my bookings'],
+        'record_lookup': ['my records', 'my medical records', 'my medical history', 'my health records',
+                          'my documents', 'my reports'],
+    },
+    examples={
+        'greeting': ["hello there", "hi, how are you", "good morning"],
+        'thanks': ["thank you so much", "thanks for the help", "that was helpful, thanks"],
+        'goodbye': ["bye for now", "see you later", "that's all, goodbye"],
+        'medication_lookup': ["what medicines am I on", "list the medications I take",
+                              "which pills have I been prescribed"],
+        'appointment_lookup': ["when is my next doctor visit", "list my upcoming appointments",
+                               "do I have any bookings with the doctor"],
+        'record_lookup': ["show me my medical records", "what is in my health history",
+                          "list the documents I uploaded"],
+    },
+    threshold=0.6,
+)
+
+# Intents of the assistant service, with its original keyword lists and order
+ASSISTANT_INTENTS = KeywordMatcher({
+    'symptom_check': ['symptom', 'feel', 'sick', 'pain', 'ache', 'hurt'],
+    'appointment_scheduling': ['appointment', 'schedule', 'book', 'visit', 'see doctor'],
+    'medication_reminder': ['medication', 'medicine', 'pill', 'drug', 'reminder'],
+    'health_recommendation': ['recommendation', 'suggest', 'advice', 'healthy'],
+    'medical_record_query': ['record', 'history', 'document', 'test result'],
+})
+
+RECOMMENDATION_TYPES = KeywordMatcher({
+    'diet': ['diet', 'food', 'eat', 'nutrition'],
+    'exercise': ['exercise', 'workout', 'fitness', 'physical activity'],
+    'lifestyle': ['sleep', 'rest', 'stress', 'mental', 'anxiety'],
+    'preventive': ['checkup', 'screening', 'prevention'],
+})
+
+RECORD_TYPES = KeywordMatcher({
+    'general': ['general', 'health record', 'medical record'],
+    'diagnosis': ['diagnosis', 'diagnosed'],
+    'prescription': ['prescription', 'medicine', 'medication'],
+    'test_result': ['test', 'lab', 'result', 'blood test'],
+    'vaccination': ['vaccine', 'vaccination', 'immunization', 'shot'],
+    'surgery': ['surgery', 'operation', 'procedure'],
+    'allergy': ['allergy', 'allergic'],
+})
+
+SMALL_TALK = KeywordMatcher({
+    'greeting': ['hello', 'hi', 'hey', 'greetings'],
+    'thanks': ['thank', 'thanks', 'appreciate'],
+    'goodbye': ['bye', 'goodbye', 'see you'],
+    'help': ['help', 'assist', 'support'],
+})
@@ -0,0 +1,162 @@
+"""
+Startup lifecycle of a worker's AI stack.
+
+A worker is 'starting' until the sentence encoder, the knowledge-base and
+intent embeddings and the OCR stack are loaded; it then warms up the LLM
+backend (for Ollama, one short generation so the chat model is resident;
+for llama.cpp, loading the model file), and reports 'ready' (or
+'failed' when a required step broke). /api/ai/health/ready/ answers 503
+until then, so a load balancer only sends chats to warm workers.
+
+How the warm-up runs is set by AI_WARMUP:
+  blocking    load before the application object is returned. Under gunicorn
+              with preload_app (gunicorn.conf.py) this happens once in the
+              master, and the forked workers share the loaded models
+              copy-on-write. Thread pools don't survive a fork, so the master
+              runs the warm-up inference single-threaded and after_fork()
+              sizes each worker's pools.
+  background  load in a daemon thread and serve meanwhile (runserver, ASGI).
+  off         load lazily on first use; the worker reports ready at once.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from . import loaders
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+
+# A worker can answer chats without OCR or a warm LLM, but not without these
+REQUIRED_STEPS = ('encoder', 'knowledge', 'intents')
+
+
+def _load_knowledge():
+    from .ai_handler import get_knowledge_embeddings
+
+    get_knowledge_embeddings(loaders.get_embedding_service())
+
+
+def _load_intents():
+    from .intents import CHAT_INTENTS
+
+    # Centroids are cached per encoder object: use the one the chatbot will pass
+    CHAT_INTENTS.route('warm-up', encoder=loaders.get_embedding_service())
+
+
+def _warm_up_llm():
+    """Load the chat model: for Ollama, pull it if needed and run one single-token generation."""
+    loaders.get_llm_backend().warm_up()
+
+
+class Lifecycle:
+    steps = (
+        ('encoder', loaders.get_sentence_encoder),
+        ('knowledge', _load_knowledge),
+        ('intents', _load_intents),
+        ('ocr', loaders.get_ocr),
+        ('llm', _warm_up_llm),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = STARTING
+            self.checks = {}
+            self.started = time.time()
+            self.ready_at = None
+        self._thread = None
+
+    def start(self, mode=None):
+        """Warm up according to mode (default: the AI_WARMUP setting). Call once the app is created."""
+        mode = mode or getattr(settings, 'AI_WARMUP', 'background')
+        if mode == 'off':
+            self._finish(READY)
+        elif mode == 'blocking':
+            self.run()
+        else:
+            self._thread = threading.Thread(target=self.run, name='ai-warm-up', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def run(self):
+        """Run every warm-up step in order, then settle on 'ready' or 'failed'."""
+        failed = []
+        for name, step in self.steps:
+            if failed and name in REQUIRED_STEPS:
+                # They all need the encoder; don't retry a download that just failed
+                self._record(name, 0.0, f"skipped after {failed[0]} failed")
+            else:
+                self._run_step(name, step)
+            if name in REQUIRED_STEPS and not self.checks[name]['ok']:
+                failed.append(name)
+        self._finish(FAILED if failed else READY)
+        if failed:
+            logger.error(f"AI warm-up failed ({', '.join(failed)}); models will load on first use")
+        else:
+            logger.info(f"AI stack ready in {self.ready_at - self.started:.1f}s")
+
+    def _run_step(self, name, step):
+        started = time.perf_counter()
+        error = None
+        try:
+            step()
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"AI warm-up step {name} failed: {e}")
+        self._record(name, time.perf_counter() - started, error)
+
+    def _record(self, name, seconds, error=None):
+        with self._lock:
+            self.checks[name] = {'ok': error is None, 'ms': round(seconds * 1000, 1), 'error': error}
+
+    def _finish(self, state):
+        with self._lock:
+            self.state = state
+            self.ready_at = time.time()
+
+    def after_fork(self, workers=1):
+        """
+        Per-worker setup after a preloaded master forks. The models are
+        inherited; the master kept torch single-threaded (gunicorn.conf.py),
+        and each worker now gets its share of the cores and a fresh ONNX
+        session.
+        """
+        self._lock = threading.Lock()
+        threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        if 'torch' in sys.modules:
+            import torch
+
+            torch.set_num_threads(threads)
+        loaders.after_fork(threads)
+        if self.state == STARTING and self._thread is not None:
+            # The master's warm-up thread did not survive the fork
+            self.start('background')
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'pid': os.getpid(),
+                'uptime_s': round(time.time() - self.started, 1),
+                'ready_after_s': round(self.ready_at - self.started, 1) if self.ready_at else None,
+                'checks': {name: dict(check) for name, check in self.checks.items()},
+            }
+
+
+lifecycle = Lifecycle()
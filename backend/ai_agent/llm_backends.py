@@ -0,0 +1,306 @@
+"""
+Text generation backends.
+
+Generation used to be tied to Ollama's HTTP API inside the chatbot, with
+llama.cpp set up separately (and with different sampling settings) in
+main.py and the ai_assistant app. Every backend now implements LLMBackend:
+
+  ollama    Ollama over HTTP (the default), behind the shared OllamaHealth
+            probe and circuit breaker
+  llamacpp  a GGUF model run in-process by llama-cpp-python
+  fake      a deterministic stub with configurable first-token latency and
+            token rate, so the whole request path can be load-tested offline
+
+LLM_BACKEND selects one per process (loaders.get_llm_backend()). Scheduling
+and coalescing of identical prompts stay in the chatbot's LLMModel, so they
+apply to every backend alike.
+
+Sampling options use one vocabulary (DEFAULT_OPTIONS); each backend maps
+them onto its own parameter names.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from .backend_health import CircuitBreaker, get_ollama_health
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "top_k": 40,
+    "max_tokens": 2048,
+}
+
+
+class LLMBackendError(Exception):
+    """The backend failed to generate"""
+
+
+class BackendUnavailable(LLMBackendError):
+    """The circuit breaker turned the generation away"""
+
+
+class OllamaAPIError(LLMBackendError):
+    """Ollama answered a generation with an error"""
+
+
+class LLMBackend:
+    """
+    stream() yields the generated text chunk by chunk and blocks while it
+    waits for the model; it runs in a worker thread (the scheduler and the
+    coalescing are thread-based). generate() is the awaitable form.
+    """
+    name = None
+
+    def __init__(self, model_name, options=None):
+        self.model_name = model_name
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is believed able to generate; never blocks"""
+        return True
+
+    def allow_request(self, trial=True) -> bool:
+        """
+        Whether a generation may be attempted now (False while a circuit
+        breaker is open). Only the caller that makes the upstream call passes
+        trial=True, since that claims a half-open breaker's single trial.
+        """
+        return True
+
+    def test_connection(self) -> bool:
+        """Check the backend now"""
+        return self.available
+
+    def ensure_model(self):
+        """Start making the model available without blocking (e.g. a pull in the background)"""
+
+    def warm_up(self):
+        """Load the model so the first request doesn't pay for it; raises when it can't"""
+        ''.join(self.stream("Hello", {"max_tokens": 1}))
+
+    def stream(self, prompt: str, options=None):
+        raise NotImplementedError
+
+    async def generate(self, prompt: str, options=None) -> str:
+        return await asyncio.to_thread(lambda: ''.join(self.stream(prompt, options)))
+
+    def snapshot(self):
+        return {'backend': self.name, 'model': self.model_name, 'available': self.available}
+
+
+class OllamaBackend(LLMBackend):
+    name = 'ollama'
+
+    def __init__(self, base_url, model_name, health=None, timeout=120, warmup_timeout=120, options=None):
+        super().__init__(model_name, options)
+        self.base_url = base_url
+        self.timeout = timeout
+        self.warmup_timeout = warmup_timeout
+        # Availability comes from the process-wide cached probe, not a request per chatbot
+        self.health = health or get_ollama_health()
+
+    @property
+    def available(self) -> bool:
+        return self.health.up is not False and self.health.breaker.state != CircuitBreaker.OPEN
+
+    def allow_request(self, trial=True) -> bool:
+        return self.health.allow_request(trial)
+
+    def test_connection(self) -> bool:
+        """Probe Ollama now and update the shared health state"""
+        return self.health.refresh()
+
+    def ensure_model(self):
+        # Reads the shared probe; a missing model is pulled in a background thread
+        self.health.ensure_model()
+
+    def warm_up(self):
+        """Pull the model if needed, then one single-token generation so Ollama loads it into memory."""
+        if not self.health.ensure_model(wait=True):
+            raise RuntimeError(self.health.error or f"{self.model_name} is not available in Ollama")
+        response = requests.post(
+            f"{self.base_url}/generate",
+            json={
+                "model": self.model_name,
+                "prompt": "Hello",
+                "stream": False,
+                "options": {"num_predict": 1},
+            },
+            timeout=self.warmup_timeout,
+        )
+        response.raise_for_status()
+
+    def _ollama_options(self, options):
+        options = {**self.options, **(options or {})}
+        options["num_predict"] = options.pop("max_tokens")
+        return options
+
+    def stream(self, prompt: str, options=None):
+        try:
+            response = requests.post(
+                f"{self.base_url}/generate",
+                json={
+                    "model": self.model_name,
+                    "prompt": prompt,
+                    "stream": True,
+                    "options": self._ollama_options(options),
+                },
+                stream=True,
+                timeout=self.timeout
+            )
+        except requests.RequestException:
+            self.health.record_failure()
+            raise
+
+        with response:
+            if response.status_code >= 500:
+                self.health.record_failure()
+            else:
+                self.health.record_success()
+            if response.status_code == 404:
+                # Model not pulled (yet): pull it in the background, never in the request
+                self.health.ensure_model()
+            if response.status_code != 200:
+                raise OllamaAPIError(f"{response.status_code} - {response.text}")
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                if "error" in part:
+                    raise OllamaAPIError(part["error"])
+                if part.get("response"):
+                    yield part["response"]
+                if part.get("done"):
+                    break
+
+    def snapshot(self):
+        return {**self.health.snapshot(), 'backend': self.name}
+
+
+class LlamaCppBackend(LLMBackend):
+    """A GGUF model run in this process; loaded on first use (or by the warm-up)."""
+    name = 'llamacpp'
+
+    def __init__(self, model_path, context=2048, threads=None, batch=8, options=None):
+        super().__init__(os.path.basename(model_path), options)
+        self.model_path = model_path
+        self.context = context
+        self.threads = threads
+        self.batch = batch
+        self.error = None
+        self._llm = None
+        # A llama.cpp context runs one generation at a time
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.error is None and os.path.exists(self.model_path)
+
+    def _load(self):
+        if self._llm is None:
+            if not os.path.exists(self.model_path):
+                self.error = f"Model file not found: {self.model_path}"
+                raise LLMBackendError(self.error)
+            from llama_cpp import Llama  # Optional dependency, only needed for the llamacpp backend
+
+            logger.info(f"Loading llama.cpp model {self.model_path}")
+            try:
+                self._llm = Llama(model_path=self.model_path, n_ctx=self.context, n_threads=self.threads,
+                                  n_batch=self.batch, verbose=False)
+            except Exception as e:
+                self.error = str(e)
+                raise LLMBackendError(f"Could not load {self.model_path}: {e}") from e
+            self.error = None
+        return self._llm
+
+    def warm_up(self):
+        with self._lock:
+            self._load()
+
+    def stream(self, prompt: str, options=None):
+        options = {**self.options, **(options or {})}
+        with self._lock:
+            llm = self._load()
+            for chunk in llm.create_completion(
+                    prompt, stream=True, max_tokens=options["max_tokens"], temperature=options["temperature"],
+                    top_p=options["top_p"], top_k=options["top_k"]):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+    def snapshot(self):
+        return {**super().snapshot(), 'loaded': self._llm is not None, 'error': self.error}
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic stand-in for load tests: waits `latency` seconds for the
+    first token, then streams `tokens` words (at most max_tokens) at
+    tokens_per_second. The same prompt always gives the same text, formatted
+    with sections and bullets like a real answer.
+    """
+    name = 'fake'
+    words = ("rest", "fluids", "symptoms", "doctor", "sleep", "water", "pain", "fever", "daily", "health",
+             "monitor", "medication", "exercise", "diet", "advice", "consult", "mild", "follow", "check", "care")
+
+    def __init__(self, latency=0.2, tokens_per_second=30.0, tokens=120, options=None, sleep=time.sleep):
+        super().__init__('fake', options)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self._sleep = sleep
+
+    def warm_up(self):
+        pass
+
+    def text(self, prompt: str, tokens: int):
+        """The chunks generated for prompt"""
+        seed = hashlib.sha256(prompt.encode('utf-8')).digest()
+        chunks = ["## Summary\n-"]
+        for i in range(tokens):
+            if i and i % 8 == 0:
+                chunks.append(f"\n\n## Section {i // 8}\n-" if i % 24 == 0 else "\n-")
+            chunks.append(f" {self.words[seed[i % len(seed)] % len(self.words)]}")
+        return chunks
+
+    def stream(self, prompt: str, options=None):
+        options = {**self.options, **(options or {})}
+        if self.latency:
+            self._sleep(self.latency)
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for chunk in self.text(prompt, min(self.tokens, options["max_tokens"])):
+            if interval and chunk.startswith(" "):  # one token per word
+                self._sleep(interval)
+            yield chunk
+
+    def snapshot(self):
+        return {**super().snapshot(), 'latency_ms': self.latency * 1000, 'tokens_per_second': self.tokens_per_second,
+                'tokens': self.tokens}
+
+
+def create_backend(name=None):
+    """The backend named by LLM_BACKEND (or name), configured from settings."""
+    name = (name or settings.LLM_BACKEND).lower()
+    if name == 'ollama':
+        return OllamaBackend(settings.OLLAMA_BASE_URL, settings.OLLAMA_MODEL, timeout=settings.OLLAMA_TIMEOUT,
+                             warmup_timeout=settings.OLLAMA_WARMUP_TIMEOUT)
+    if name == 'llamacpp':
+        return LlamaCppBackend(settings.LLAMACPP_MODEL_PATH, context=settings.LLAMACPP_CONTEXT,
+                               threads=settings.LLAMACPP_THREADS)
+    if name == 'fake':
+        return FakeBackend(latency=settings.LLM_FAKE_LATENCY_MS / 1000,
+                           tokens_per_second=settings.LLM_FAKE_TOKENS_PER_SECOND, tokens=settings.LLM_FAKE_TOKENS)
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -0,0 +1,139 @@
+"""
+Lazy loaders for the AI stack.
+
+torch, sentence-transformers and the OCR libraries take seconds to import,
+so nothing imports them at module level: they are loaded on first use, once
+per process, and shared by every user's agent. Web workers load them at start
+(see lifecycle.py) so the first chat request doesn't pay for it, while
+manage.py commands and tests never do.
+"""
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_encoder = None
+_embeddings = None
+_ocr = None
+_llm_backend = None
+
+
+def get_sentence_encoder():
+    """
+    The process-wide sentence encoder (MiniLM by default), loaded on first call:
+    a SentenceTransformer, or its ONNX export with SENTENCE_ENCODER_BACKEND=onnx.
+    """
+    global _encoder
+    if _encoder is None:
+        with _lock:
+            if _encoder is None:
+                if getattr(settings, 'SENTENCE_ENCODER_BACKEND', 'torch') == 'onnx':
+                    _encoder = _load_onnx_encoder()
+                else:
+                    _encoder = _load_torch_encoder()
+    return _encoder
+
+
+def _load_torch_encoder():
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model_name = getattr(settings, 'SENTENCE_ENCODER_MODEL', 'all-MiniLM-L6-v2')
+    logger.info(f"Loading sentence encoder {model_name} on {device}")
+    return SentenceTransformer(model_name, device=device)
+
+
+def _load_onnx_encoder():
+    # Exported with `manage.py export_onnx_encoder`; runs without torch
+    from .onnx_encoder import OnnxSentenceEncoder
+
+    return OnnxSentenceEncoder(settings.SENTENCE_ENCODER_ONNX_DIR, quantized=settings.SENTENCE_ENCODER_ONNX_INT8)
+
+
+def get_embedding_service():
+    """
+    The process-wide EmbeddingBatcher over the sentence encoder: what request
+    handling should encode with, so concurrent queries share forward passes.
+    """
+    global _embeddings
+    if _embeddings is None:
+        encoder = get_sentence_encoder()
+        with _lock:
+            if _embeddings is None:
+                from .batching import EmbeddingBatcher
+
+                _embeddings = EmbeddingBatcher(
+                    encoder,
+                    max_batch=getattr(settings, 'EMBEDDING_MAX_BATCH', 32),
+                    max_wait=getattr(settings, 'EMBEDDING_MAX_WAIT_MS', 5) / 1000,
+                )
+    return _embeddings
+
+
+def get_llm_backend():
+    """The process-wide text generation backend selected by LLM_BACKEND (see llm_backends.py)."""
+    global _llm_backend
+    if _llm_backend is None:
+        with _lock:
+            if _llm_backend is None:
+                from .llm_backends import create_backend
+
+                _llm_backend = create_backend()
+                logger.info(f"Using the {_llm_backend.name} LLM backend ({_llm_backend.model_name})")
+    return _llm_backend
+
+
+def get_ocr():
+    """(pytesseract, PIL.Image, numpy), imported and configured on first call."""
+    global _ocr
+    if _ocr is None:
+        with _lock:
+            if _ocr is None:
+                import numpy as np
+                import pytesseract
+                from PIL import Image
+
+                if os.name == 'nt':  # Windows
+                    _configure_windows_tesseract(pytesseract)
+                _ocr = (pytesseract, Image, np)
+    return _ocr
+
+
+def _configure_windows_tesseract(pytesseract):
+    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    # Alternative common locations
+    if not os.path.exists(pytesseract.pytesseract.tesseract_cmd):
+        potential_paths = [
+            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+            r'C:\Tesseract-OCR\tesseract.exe'
+        ]
+        for path in potential_paths:
+            if os.path.exists(path):
+                pytesseract.pytesseract.tesseract_cmd = path
+                break
+
+
+def after_fork(threads):
+    """
+    Recreate what a forked worker can't inherit from a preloaded master: the
+    ONNX encoder's onnxruntime session runs on its own thread pool.
+    """
+    if _encoder is not None and hasattr(_encoder, 'open_session'):
+        _encoder.open_session(threads)
+
+
+def _reset_lock():
+    # A fork while another thread was loading would leave the child's lock held forever
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock)
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def probe_sentences():
+    """Knowledge-base queries and intent examples: what the encoder embeds in production."""
+    from ai_agent.ai_handler import MEDICAL_KNOWLEDGE
+    from ai_agent.intents import CHAT_INTENTS
+
+    knowledge = [item["query"] for item in MEDICAL_KNOWLEDGE]
+    examples = [phrase for phrases in CHAT_INTENTS.examples.values() for phrase in phrases]
+    return knowledge, examples
+
+
+class Command(BaseCommand):
+    help = 'Export the sentence encoder to ONNX (with an int8 copy) and check it against the PyTorch model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=settings.SENTENCE_ENCODER_MODEL,
+                            help='SentenceTransformer name or path (default: SENTENCE_ENCODER_MODEL)')
+        parser.add_argument('--output', default=settings.SENTENCE_ENCODER_ONNX_DIR,
+                            help='Directory to write (default: SENTENCE_ENCODER_ONNX_DIR)')
+        parser.add_argument('--no-quantize', action='store_true', help='Only export the fp32 model')
+
+    def handle(self, *args, **options):
+        from sentence_transformers import SentenceTransformer
+        from ai_agent.onnx_encoder import MIN_COSINE, OnnxSentenceEncoder, agreement, export_onnx
+
+        reference = SentenceTransformer(options['model'], device='cpu')
+        export_onnx(reference, options['output'], quantize=not options['no_quantize'])
+        self.stdout.write(f"Exported {options['model']} to {options['output']}")
+
+        knowledge, examples = probe_sentences()
+        failed = []
+        for quantized in ([False] if options['no_quantize'] else [False, True]):
+            label = 'int8' if quantized else 'fp32'
+            candidate = OnnxSentenceEncoder(options['output'], quantized=quantized)
+            cosines, same_neighbour = agreement(reference, candidate, knowledge + examples, knowledge)
+            self.stdout.write(
+                f"{label}: cosine to PyTorch min {cosines.min():.4f} mean {cosines.mean():.4f}, "
+                f"same nearest knowledge entry for {same_neighbour:.0%} of sentences"
+            )
+            if cosines.min() < MIN_COSINE:
+                failed.append(label)
+        if failed:
+            raise CommandError(f"{', '.join(failed)} embeddings diverge from PyTorch (cosine < {MIN_COSINE})")
+        self.stdout.write(self.style.SUCCESS("Embeddings match; set SENTENCE_ENCODER_BACKEND=onnx to serve them"))
@@ -0,0 +1,69 @@
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules that must only load through ai_agent.loaders, never at startup
+HEAVY_MODULES = (
+    'torch', 'sentence_transformers', 'transformers', 'pytesseract', 'PIL',
+    'numpy', 'langchain', 'openai',
+)
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from `python -X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def measure(root_module):
+    """Import Django, set it up and import root_module in a fresh interpreter; return the parsed timings."""
+    code = f"import django; django.setup(); import {root_module}"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=settings.BASE_DIR,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Importing {root_module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+class Command(BaseCommand):
+    help = 'Profile the imports a worker runs at startup and fail on heavy modules or a blown time budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.ROOT_URLCONF,
+                            help='Module to import after django.setup() (default: the URLconf)')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list')
+        parser.add_argument('--budget-ms', type=int, default=settings.STARTUP_IMPORT_BUDGET_MS,
+                            help='Fail if the total import time exceeds this many milliseconds')
+
+    def handle(self, *args, **options):
+        rows = measure(options['module'])
+        total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+
+        self.stdout.write(f"{'cumulative':>11} {'self':>9}  module")
+        for module, self_us, cumulative_us, _ in sorted(rows, key=lambda row: row[2], reverse=True)[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:9.1f}ms {self_us / 1000:7.1f}ms  {module}")
+
+        loaded = sorted({module for module, _, _, _ in rows if module.split('.')[0] in HEAVY_MODULES})
+        problems = []
+        if loaded:
+            roots = sorted({module.split('.')[0] for module in loaded})
+            problems.append(f"heavy modules imported at startup: {', '.join(roots)}")
+        if total_ms > options['budget_ms']:
+            problems.append(f"imports took {total_ms:.0f}ms, over the {options['budget_ms']}ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rows)} modules imported in {total_ms:.0f}ms (budget {options['budget_ms']}ms), no heavy modules"
+        ))
@@ -0,0 +1,56 @@
+"""
+In-process counters for the chatbot's response tiers.
+
+Each answered query is recorded against the tier that produced it
+(template or llm) with how long it took, so the share of traffic
+kept away from the LLM is visible at /api/ai/metrics/. Counters are per
+worker process and reset on restart.
+"""
+import threading
+import time
+
+TEMPLATE = 'template'
+LLM = 'llm'
+TIERS = (TEMPLATE, LLM)
+
+
+class TierCounters:
+    def __init__(self, tiers=TIERS):
+        self._lock = threading.Lock()
+        self._tiers = tuple(tiers)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self._tiers, 0)
+            self._seconds = dict.fromkeys(self._tiers, 0.0)
+            self._started = time.time()
+
+    def record(self, tier, seconds):
+        with self._lock:
+            self._counts[tier] = self._counts.get(tier, 0) + 1
+            self._seconds[tier] = self._seconds.get(tier, 0.0) + seconds
+
+    def snapshot(self):
+        """Counts, mean latency and share of traffic per tier, plus the LLM calls avoided."""
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+            started = self._started
+        total = sum(counts.values())
+        return {
+            'since': started,
+            'total': total,
+            'llm_calls_avoided': total - counts.get(LLM, 0),
+            'tiers': {
+                tier: {
+                    'count': count,
+                    'share': round(count / total, 4) if total else 0.0,
+                    'mean_ms': round(seconds[tier] / count * 1000, 2) if count else None,
+                }
+                for tier, count in counts.items()
+            },
+        }
+
+
+chat_tiers = TierCounters()
@@ -0,0 +1,196 @@
+"""
+ONNX Runtime backend for the sentence encoder, for CPU-only nodes.
+
+export_onnx() turns a SentenceTransformer (MiniLM by default) into an ONNX
+graph of its transformer, quantizes the weights to int8 with ONNX
+Runtime's dynamic quantization, and saves the tokenizer and pooling
+settings next to it (`manage.py export_onnx_encoder`).
+OnnxSentenceEncoder runs that directory with onnxruntime, the `tokenizers`
+library and numpy only, so serving with SENTENCE_ENCODER_BACKEND=onnx
+neither imports torch nor loads fp32 weights.
+
+The packages are optional (requirements-onnx.txt).
+
+Embeddings stay interchangeable with the PyTorch encoder's within the
+tolerance checked in the tests (cosine similarity >= MIN_COSINE), so
+knowledge-base and intent embeddings keep matching.
+"""
+import inspect
+import json
+import logging
+import os
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model_int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+CONFIG_FILE = 'encoder.json'
+
+# Agreement with the PyTorch encoder that the int8 model must keep
+MIN_COSINE = 0.98
+
+
+def export_onnx(sentence_transformer, output_dir, quantize=True):
+    """
+    Export sentence_transformer's transformer to output_dir (and an int8 copy
+    when quantize is set). Needs torch, onnx and onnxruntime.
+    """
+    import torch
+    from sentence_transformers import models
+
+    os.makedirs(output_dir, exist_ok=True)
+    transformer = sentence_transformer[0]
+    if not isinstance(transformer, models.Transformer):
+        raise ValueError("Only SentenceTransformers starting with a Transformer module can be exported")
+    pooling = next((module for module in sentence_transformer if isinstance(module, models.Pooling)), None)
+    pooling_mode = _pooling_mode(pooling) if pooling is not None else None
+    if pooling_mode not in ('mean', 'cls'):
+        raise ValueError("Only mean or CLS pooling is supported")
+
+    tokenizer = transformer.tokenizer
+    inputs = tokenizer(["an example sentence", "another"], padding=True, return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in inputs]
+    model = transformer.auto_model.cpu().eval()
+
+    class Wrapper(torch.nn.Module):
+        # Positional inputs in input_names order; returns the token embeddings only
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    path = os.path.join(output_dir, MODEL_FILE)
+    export_options = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # torch >= 2.5; newer releases default to the dynamo exporter, which this graph isn't written for
+        export_options['dynamo'] = False
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+    with torch.no_grad():
+        torch.onnx.export(
+            Wrapper(), tuple(inputs[name] for name in input_names), path,
+            input_names=input_names, output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes, opset_version=17, **export_options,
+        )
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    config = {
+        'max_seq_length': sentence_transformer.get_max_seq_length(),
+        'pooling': pooling_mode,
+        'normalize': any(isinstance(module, models.Normalize) for module in sentence_transformer),
+        'inputs': input_names,
+        'dimension': sentence_transformer.get_sentence_embedding_dimension(),
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), 'w') as f:
+        json.dump(config, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+    return output_dir
+
+
+def agreement(reference, candidate, sentences, index_sentences=()):
+    """
+    How closely candidate reproduces reference: the cosine similarity of each
+    sentence's two embeddings, and the share of sentences whose nearest entry
+    in an index built from index_sentences is the same under both.
+    """
+    from .intents import normalise
+
+    reference_vectors = normalise(reference.encode(list(sentences)))
+    candidate_vectors = normalise(candidate.encode(list(sentences)))
+    cosines = (reference_vectors * candidate_vectors).sum(axis=1)
+    same_neighbour = None
+    if index_sentences:
+        reference_index = normalise(reference.encode(list(index_sentences)))
+        candidate_index = normalise(candidate.encode(list(index_sentences)))
+        same = (reference_vectors @ reference_index.T).argmax(axis=1) == (candidate_vectors @ candidate_index.T).argmax(axis=1)
+        same_neighbour = float(same.mean())
+    return cosines, same_neighbour
+
+
+def _pooling_mode(pooling):
+    config = pooling.get_config_dict()
+    if isinstance(config.get('pooling_mode'), str):
+        return config['pooling_mode']
+    # sentence-transformers 2.x stores one flag per mode
+    enabled = [mode for mode, key in (('mean', 'pooling_mode_mean_tokens'), ('cls', 'pooling_mode_cls_token'))
+               if config.get(key)]
+    others = [key for key, value in config.items() if key.startswith('pooling_mode_') and value
+              and key not in ('pooling_mode_mean_tokens', 'pooling_mode_cls_token')]
+    return enabled[0] if len(enabled) == 1 and not others else None
+
+
+class OnnxSentenceEncoder:
+    """Runs an export_onnx() directory; encode() behaves like SentenceTransformer.encode()."""
+    device = 'cpu'
+
+    def __init__(self, model_dir, quantized=True, threads=None):
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        self.model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        self.open_session(threads)
+        logger.info(f"Loaded ONNX sentence encoder {self.model_path}")
+
+    def open_session(self, threads=None):
+        """(Re)create the inference session; its thread pool does not survive a fork."""
+        import onnxruntime  # Optional dependency, only needed for the onnx backend
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def encode(self, sentences, batch_size=32, convert_to_tensor=False, **kwargs):
+        import numpy as np
+
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        batches = [self._encode_batch(sentences[start:start + batch_size])
+                   for start in range(0, len(sentences), batch_size)]
+        vectors = np.vstack(batches) if batches else np.zeros((0, self.config['dimension']), dtype='float32')
+        if single:
+            vectors = vectors[0]
+        if convert_to_tensor:
+            import torch
+
+            return torch.from_numpy(vectors)
+        return vectors
+
+    def _encode_batch(self, sentences):
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(sentences)
+        columns = {
+            'input_ids': [encoding.ids for encoding in encodings],
+            'attention_mask': [encoding.attention_mask for encoding in encodings],
+            'token_type_ids': [encoding.type_ids for encoding in encodings],
+        }
+        feed = {name: np.asarray(columns[name], dtype='int64') for name in self.config['inputs']}
+        tokens = self.session.run(None, feed)[0]
+
+        if self.config['pooling'] == 'cls':
+            vectors = tokens[:, 0]
+        else:
+            mask = feed.get('attention_mask', np.ones(tokens.shape[:2], dtype='int64'))[..., None].astype('float32')
+            vectors = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config['normalize']:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype('float32')
@@ -0,0 +1,202 @@
+"""
+Admission control and scheduling of LLM generations.
+
+The model backend runs a fixed number of generations at once (Ollama's
+OLLAMA_NUM_PARALLEL, llama.cpp's slots); anything beyond that used to pile
+up inside the backend, where a long report analysis could hold up dozens
+of short chat turns and overload surfaced as timeouts. Every upstream
+generation now takes a slot from LLMScheduler first:
+
+- at most LLM_MAX_CONCURRENCY generations run at once;
+- waiting work is served by class priority (chat before appointment
+  questions before summaries before report analysis) and, within a class,
+  round-robin between users, so one user's burst can't hold up the others;
+- when the queue holds LLM_MAX_QUEUE requests, or a user already has
+  LLM_MAX_QUEUED_PER_USER waiting, new work is rejected at once with
+  Overloaded, which the views turn into 429 with a Retry-After estimate.
+
+The limits are per process: with several gunicorn workers the backend
+sees up to workers * LLM_MAX_CONCURRENCY generations at once.
+
+Queue wait and generation time are tracked per class for /api/ai/metrics/.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+CHAT = 'chat'
+APPOINTMENT = 'appointment'
+SUMMARY = 'summary'
+REPORT = 'report'
+# Highest priority first
+WORK_CLASSES = (CHAT, APPOINTMENT, SUMMARY, REPORT)
+
+# Retry-After while no generation has finished yet to estimate from
+DEFAULT_GENERATION_SECONDS = 10.0
+
+
+class Overloaded(Exception):
+    """The LLM queue is full; retry after retry_after seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('work_class', 'user', 'granted')
+
+    def __init__(self, work_class, user):
+        self.work_class = work_class
+        self.user = user
+        self.granted = False
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=1, max_queue=16, max_queued_per_user=3, queue_timeout=60.0,
+                 work_classes=WORK_CLASSES, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_timeout = queue_timeout
+        self.work_classes = tuple(work_classes)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._running = 0
+        # Per class, the users with waiting work in round-robin order
+        self._queues = {work_class: OrderedDict() for work_class in self.work_classes}
+        self._queued_by_user = {}
+        self._queued = 0
+        self._stats = {work_class: dict.fromkeys(
+            ('admitted', 'rejected', 'timed_out', 'completed', 'wait_s', 'run_s'), 0) for work_class in self.work_classes}
+
+    @contextmanager
+    def slot(self, work_class=CHAT, user=None):
+        """Hold one generation slot for the duration of the block; raises Overloaded instead of queueing past the limits."""
+        waited = self._acquire(work_class, user)
+        started = self._clock()
+        try:
+            yield waited
+        finally:
+            self._release(work_class, self._clock() - started)
+
+    def _acquire(self, work_class, user):
+        if work_class not in self._queues:
+            raise ValueError(f"Unknown LLM work class: {work_class}")
+        enqueued = self._clock()
+        with self._cond:
+            stats = self._stats[work_class]
+            if self._running < self.max_concurrency and not self._queued:
+                self._running += 1
+                stats['admitted'] += 1
+                return 0.0
+            if self._queued >= self.max_queue:
+                stats['rejected'] += 1
+                raise Overloaded("The AI service is busy", self._retry_after())
+            if self._queued_by_user.get(user, 0) >= self.max_queued_per_user:
+                stats['rejected'] += 1
+                raise Overloaded("Too many of your requests are waiting", self._retry_after())
+
+            waiter = _Waiter(work_class, user)
+            self._queues[work_class].setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self._queued_by_user[user] = self._queued_by_user.get(user, 0) + 1
+            deadline = enqueued + self.queue_timeout
+            while not waiter.granted:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    self._remove(waiter)
+                    stats['timed_out'] += 1
+                    raise Overloaded("Timed out waiting for the AI service", self._retry_after())
+                self._cond.wait(remaining)
+            waited = self._clock() - enqueued
+            stats['admitted'] += 1
+            stats['wait_s'] += waited
+            return waited
+
+    def _release(self, work_class, seconds):
+        with self._cond:
+            self._running -= 1
+            stats = self._stats[work_class]
+            stats['completed'] += 1
+            stats['run_s'] += seconds
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiters: highest class first, round-robin between users within it."""
+        granted = False
+        while self._running < self.max_concurrency and self._queued:
+            users = next(users for users in self._queues.values() if users)
+            user, waiters = next(iter(users.items()))
+            waiter = waiters[0]
+            self._remove(waiter)
+            if user in users:
+                # The user's next request waits behind everyone else's in this class
+                users.move_to_end(user)
+            waiter.granted = True
+            self._running += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _remove(self, waiter):
+        users = self._queues[waiter.work_class]
+        users[waiter.user].remove(waiter)
+        if not users[waiter.user]:
+            del users[waiter.user]
+        self._queued -= 1
+        self._queued_by_user[waiter.user] -= 1
+        if not self._queued_by_user[waiter.user]:
+            del self._queued_by_user[waiter.user]
+
+    def _retry_after(self):
+        """Whole seconds until the current queue has probably drained."""
+        completed = sum(stats['completed'] for stats in self._stats.values())
+        run_s = sum(stats['run_s'] for stats in self._stats.values())
+        mean = run_s / completed if completed else DEFAULT_GENERATION_SECONDS
+        return max(1, math.ceil((self._queued + self._running) * mean / self.max_concurrency))
+
+    def snapshot(self):
+        with self._cond:
+            classes = {}
+            for work_class, stats in self._stats.items():
+                classes[work_class] = {
+                    'queued': sum(len(waiters) for waiters in self._queues[work_class].values()),
+                    'admitted': stats['admitted'],
+                    'rejected': stats['rejected'],
+                    'timed_out': stats['timed_out'],
+                    'completed': stats['completed'],
+                    'mean_wait_ms': round(stats['wait_s'] / stats['admitted'] * 1000, 1) if stats['admitted'] else None,
+                    'mean_generation_ms': (round(stats['run_s'] / stats['completed'] * 1000, 1)
+                                           if stats['completed'] else None),
+                }
+            return {
+                'running': self._running,
+                'queued': self._queued,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'classes': classes,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler():
+    """The process-wide LLMScheduler, created from settings on first call."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    max_queue=settings.LLM_MAX_QUEUE,
+                    max_queued_per_user=settings.LLM_MAX_QUEUED_PER_USER,
+                    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+                )
+    return _scheduler
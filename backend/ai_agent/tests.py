@@ -1,3 +1,852 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from .intents import ASSISTANT_INTENTS, CHAT_INTENTS, CHAT_TOPICS, RECORD_TYPES, IntentRouter, KeywordMatcher
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    messages = [
+        "I feel sick and my head hurts",
+        "Can I take this pill with food?",
+        "Please book an appointment to see doctor Smith",
+        "Show my blood test results",
+        "Any side effects if I take ibuprofen?",
+        "What does the diagnosis in my report mean?",
+        "Suggest a healthy breakfast",
+        "How's the weather?",
+        "",
+    ]
+
+    def test_matches_substring_semantics(self):
+        """Test the matcher agrees with any(keyword in text) for every label, including overlapping keywords"""
+        for matcher in (ASSISTANT_INTENTS, CHAT_TOPICS, RECORD_TYPES):
+            for message in self.messages:
+                expected = {label for label, words in matcher.keywords.items()
+                            if any(word in message.lower() for word in words)}
+                self.assertEqual(matcher.matches(message), expected, message)
+
+    def test_first_follows_declaration_order(self):
+        """Test first() returns the highest-priority label"""
+        self.assertEqual(ASSISTANT_INTENTS.first("My pill history hurts"), 'symptom_check')
+        self.assertEqual(RECORD_TYPES.first("my blood test"), 'test_result')
+        self.assertEqual(ASSISTANT_INTENTS.first("How's the weather?", default='general'), 'general')
+
+    def test_whole_words(self):
+        """Test whole-word matching ignores keywords inside other words"""
+        matcher = KeywordMatcher({'greeting': ['hi', 'hi there'], 'lookup': ['my meds']}, whole_words=True)
+        self.assertEqual(matcher.matches("this is it"), set())
+        self.assertEqual(matcher.matches("Hi there, show my meds"), {'greeting', 'lookup'})
+        self.assertEqual(matcher.matches("show my medsheet"), set())
+
+
+class FakeEncoder:
+    """Bag-of-words vectors over a tiny vocabulary, standing in for MiniLM."""
+    vocabulary = ['medicine', 'pills', 'take', 'doctor', 'visit', 'when', 'hello', 'morning']
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, sentences):
+        self.calls += 1
+        return [[sentence.lower().count(word) for word in self.vocabulary] for sentence in sentences]
+
+
+class IntentRouterTests(SimpleTestCase):
+    def test_rules_before_embeddings(self):
+        """Test keyword rules answer without touching the encoder"""
+        encoder = FakeEncoder()
+        self.assertEqual(CHAT_INTENTS.route("hello!", encoder=encoder), ('greeting', 'rule'))
+        self.assertEqual(CHAT_INTENTS.route("show my medications", encoder=encoder), ('medication_lookup', 'rule'))
+        self.assertEqual(encoder.calls, 0)
+
+    def test_centroid_fallback(self):
+        """Test unmatched messages go to the nearest centroid, or the default below the threshold"""
+        router = IntentRouter(
+            rules={'greeting': ['hello']},
+            examples={'medication_lookup': ["which medicine do I take", "pills I take"],
+                      'appointment_lookup': ["when is my doctor visit"]},
+            threshold=0.5,
+        )
+        encoder = FakeEncoder()
+        self.assertEqual(router.route("what pills should I take", encoder=encoder), ('medication_lookup', 'embedding'))
+        self.assertEqual(router.route("next visit to the doctor?", encoder=encoder), ('appointment_lookup', 'embedding'))
+        self.assertEqual(router.route("tell me a joke", encoder=encoder), ('general', 'default'))
+        self.assertEqual(router.route("tell me a joke"), ('general', 'default'))
+        # Centroids are computed once per encoder
+        self.assertEqual(encoder.calls, 4)
+
+
+class FastPathTests(TestCase):
+    def setUp(self):
+        from user_session.models import User
+        from .metrics import chat_tiers
+        cache.clear()
+        chat_tiers.reset()
+        self.patient = User.objects.create(name="John Doe", email="patient@example.com", role="patient")
+
+    def make_chatbot(self, user_id="patient@example.com"):
+        from .chatbot import MedicalChatbot
+        with mock.patch('ai_agent.chatbot.EnhancedAIAgent'), mock.patch('ai_agent.chatbot.LLMModel'), \
+                mock.patch.object(MedicalChatbot, '_initialize_gemma'), mock.patch.object(MedicalChatbot, '_load_history'):
+            chatbot = MedicalChatbot(user_id=user_id)
+        chatbot.ai_agent = mock.Mock(model=None, process_query=mock.AsyncMock(return_value=""))
+        chatbot.llm_model = mock.Mock(generate_text=mock.AsyncMock(return_value="Rest and drink fluids."))
+        return chatbot
+
+    def test_tier_selection(self):
+        """Test only pure small talk skips the LLM"""
+        from .fast_path import tier_for
+        self.assertEqual(tier_for('greeting', "Hi there!"), 'template')
+        self.assertIsNone(tier_for('greeting', "hi, I have a sore throat"))
+        self.assertEqual(tier_for('thanks', "Thank you so much!"), 'template')
+        for query in ("Hi, what is a good diet?", "Hello, how do I lose weight?", "hey can I drink alcohol tonight",
+                      "Thanks! Is coffee bad for me?", "hi, is ibuprofen safe?", "hello, how are you"):
+            self.assertIsNone(tier_for('greeting', query), query)
+        self.assertIsNone(tier_for('medication_lookup', "show my medications"))
+        self.assertIsNone(tier_for('general', "what causes migraines?"))
+
+    def test_greeting_skips_llm(self):
+        """Test greetings come from templates without the LLM, and everything else goes to it"""
+        from .metrics import chat_tiers
+        chatbot = self.make_chatbot()
+
+        self.assertIn("Hello", async_to_sync(chatbot.generate_response)("Hello!"))
+        chatbot.llm_model.generate_text.assert_not_awaited()
+        chatbot.ai_agent.process_query.assert_not_awaited()
+
+        async_to_sync(chatbot.generate_response)("Hi, is ibuprofen safe?")
+        async_to_sync(chatbot.generate_response)("Show my medications")
+        self.assertEqual(chatbot.llm_model.generate_text.await_count, 2)
+
+        tiers = chat_tiers.snapshot()['tiers']
+        self.assertEqual((tiers['template']['count'], tiers['llm']['count']), (1, 2))
+        self.assertEqual(chat_tiers.snapshot()['llm_calls_avoided'], 1)
+
+    def test_metrics_endpoint(self):
+        """Test the metrics endpoint reports per-tier counters"""
+        from django.urls import reverse
+        response = self.client.get(reverse('chat_metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['tiers']), {'template', 'llm'})
+
+
+class ResponseFormatterTests(SimpleTestCase):
+    raw = "Summary:\n\n\nBlood pressure is high\n3. Reduce salt\n7. Walk daily\n* Sleep well\nnote: see your doctor\n"
+
+    def test_format_response(self):
+        """Test headers, list renumbering, bullets and blank-line collapsing"""
+        from .formatting import format_response
+        self.assertEqual(
+            format_response(self.raw),
+            "## Summary\n\n- Blood pressure is high\n3. Reduce salt\n4. Walk daily\n- Sleep well\n- note: see your doctor",
+        )
+        self.assertTrue(format_response("A complete sentence.").endswith("professional medical advice.*"))
+        self.assertIn("couldn't generate", format_response("  \n "))
+
+    def test_streamed_chunks_match_whole_text(self):
+        """Test feeding the response in chunks gives the same output as formatting it at once"""
+        from .formatting import ResponseFormatter, format_response
+        formatter = ResponseFormatter()
+        streamed = ''.join(formatter.feed(self.raw[i:i + 5]) for i in range(0, len(self.raw), 5))
+        self.assertEqual(streamed + formatter.finish(), format_response(self.raw))
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_startup_imports_no_heavy_modules(self):
+        """Test importing the URLconf stays clear of torch, OCR and the other heavy AI libraries"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('importtime_report', '--top', '0', '--budget-ms', '60000', stdout=out)
+        self.assertIn('no heavy modules', out.getvalue())
+
+    def test_parse_importtime(self):
+        """Test parsing of `python -X importtime` lines"""
+        from .management.commands.importtime_report import parse_importtime
+
+        rows = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     encodings.idna\n"
+            "import time:      1500 |      40000 | torch\n"
+        )
+        self.assertEqual(rows, [('encodings.idna', 120, 120, 2), ('torch', 1500, 40000, 0)])
+
+
+class LifecycleTests(SimpleTestCase):
+    def lifecycle(self, **failures):
+        from .lifecycle import Lifecycle
+
+        def step(name):
+            def run():
+                self.calls.append(name)
+                if name in failures:
+                    raise RuntimeError(failures[name])
+            return run
+
+        self.calls = []
+        lifecycle = Lifecycle()
+        lifecycle.steps = tuple((name, step(name)) for name, _ in Lifecycle.steps)
+        return lifecycle
+
+    def test_blocking_start_runs_every_step(self):
+        """Test a blocking start loads the models, warms up the LLM and reports ready"""
+        lifecycle = self.lifecycle()
+        lifecycle.start('blocking')
+        self.assertEqual(self.calls, ['encoder', 'knowledge', 'intents', 'ocr', 'llm'])
+        self.assertTrue(lifecycle.ready)
+        self.assertTrue(all(check['ok'] for check in lifecycle.snapshot()['checks'].values()))
+
+    def test_llm_failure_is_not_fatal(self):
+        """Test the worker is ready without a warm LLM, and reports the failed check"""
+        lifecycle = self.lifecycle(llm='connection refused')
+        lifecycle.start('blocking')
+        self.assertTrue(lifecycle.ready)
+        self.assertEqual(lifecycle.snapshot()['checks']['llm']['error'], 'connection refused')
+
+    def test_encoder_failure_fails_readiness(self):
+        """Test a worker without its encoder reports failed"""
+        lifecycle = self.lifecycle(encoder='out of memory')
+        lifecycle.start('blocking')
+        self.assertEqual(lifecycle.state, 'failed')
+        self.assertEqual(self.calls, ['encoder', 'ocr', 'llm'])
+
+    def test_background_and_off(self):
+        """Test background warm-up finishes in its thread, and 'off' is ready at once"""
+        lifecycle = self.lifecycle()
+        lifecycle.start('background').join(5)
+        self.assertTrue(lifecycle.ready)
+
+        lifecycle = self.lifecycle()
+        self.assertIsNone(lifecycle.start('off'))
+        self.assertTrue(lifecycle.ready)
+        self.assertEqual(self.calls, [])
+
+    def test_after_fork_sizes_worker_pools(self):
+        """Test a forked worker gets its share of torch threads and reopens an ONNX session"""
+        import torch
+        from . import loaders
+
+        encoder = mock.Mock(spec=['open_session'])
+        with mock.patch('os.cpu_count', return_value=4), mock.patch.object(torch, 'set_num_threads') as set_threads, \
+                mock.patch.object(loaders, '_encoder', encoder):
+            self.lifecycle().after_fork(workers=2)
+        set_threads.assert_called_once_with(2)
+        encoder.open_session.assert_called_once_with(2)
+
+    def test_health_endpoints(self):
+        """Test liveness always answers and readiness answers 503 until warm"""
+        from django.urls import reverse
+
+        lifecycle = self.lifecycle()
+        with mock.patch('ai_agent.views.lifecycle', lifecycle):
+            self.assertEqual(self.client.get(reverse('health_live')).status_code, 200)
+            response = self.client.get(reverse('health_ready'))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()['state'], 'starting')
+
+            lifecycle.start('blocking')
+            response = self.client.get(reverse('health_ready'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['state'], 'ready')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_half_opens(self):
+        """Test the breaker rejects requests while open and lets one trial through after the timeout"""
+        from .backend_health import CircuitBreaker
+
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.retry_after(), 30)
+
+        clock.now += 30
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        clock.now += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+
+class BackendHealthTests(SimpleTestCase):
+    def health(self, models=('gemma:2b',), up=True):
+        from .backend_health import OllamaHealth
+
+        self.clock = FakeClock()
+        health = OllamaHealth('http://ollama/api', 'gemma:2b', ttl=30, clock=self.clock)
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'models': [{'name': name} for name in models]}
+        self.get = mock.patch('ai_agent.backend_health.requests.get',
+                              return_value=response, side_effect=None if up else ConnectionError('refused'))
+        self.get_mock = self.get.start()
+        self.addCleanup(self.get.stop)
+        return health
+
+    def test_probe_is_cached_until_stale(self):
+        """Test one probe serves every request until the TTL expires, then refreshes in the background"""
+        health = self.health()
+        self.assertTrue(health.refresh())
+        self.assertTrue(health.has_model)
+        for _ in range(5):
+            self.assertTrue(health.allow_request())
+        self.assertEqual(self.get_mock.call_count, 1)
+
+        self.clock.now += 30
+        with mock.patch.object(health, 'refresh_in_background') as refresh:
+            health.allow_request()
+        refresh.assert_called_once()
+
+    def test_failed_probe_trips_breaker(self):
+        """Test requests fail fast once a probe finds the backend down"""
+        health = self.health(up=False)
+        self.assertFalse(health.refresh())
+        self.assertFalse(health.allow_request())
+        self.assertEqual(health.snapshot()['breaker']['state'], 'open')
+
+    def test_successful_probe_keeps_breaker_open(self):
+        """Test a backend that answers probes but fails generations keeps failing fast"""
+        health = self.health()
+        health.refresh()
+        for _ in range(health.breaker.failure_threshold):
+            health.record_failure()
+        self.clock.now += 10
+        self.assertTrue(health.refresh())
+        self.assertEqual(health.breaker.state, 'open')
+
+        # The half-open trial still decides
+        self.clock.now += 30
+        self.assertTrue(health.allow_request())
+        self.assertFalse(health.allow_request())
+        health.refresh()
+        self.assertFalse(health.allow_request())
+        health.record_success()
+        self.assertEqual(health.breaker.state, 'closed')
+
+    def test_missing_model_is_pulled_in_background(self):
+        """Test ensure_model never pulls on the calling thread unless asked to wait"""
+        health = self.health(models=('llama2:latest',))
+        health.refresh()
+        self.assertFalse(health.has_model)
+        with mock.patch('ai_agent.backend_health.threading.Thread') as thread, \
+                mock.patch('ai_agent.backend_health.requests.post') as post:
+            health.ensure_model()
+        thread.assert_called_once_with(target=health.pull_model, name='ollama-pull', daemon=True)
+        post.assert_not_called()
+
+    def test_generation_fails_fast_when_open(self):
+        """Test LLMModel answers at once, without a request, while the breaker is open"""
+        from .chatbot import LLMModel
+        from .llm_backends import OllamaBackend
+
+        health = self.health()
+        health.refresh()
+        health.breaker.trip()
+        model = LLMModel(OllamaBackend('http://ollama/api', 'gemma:2b', health=health))
+        self.assertFalse(model.available)
+        with mock.patch('ai_agent.llm_backends.requests.post') as post:
+            answer = async_to_sync(model.generate_text)('hello')
+        post.assert_not_called()
+        self.assertIn('currently unavailable', answer)
+
+    def test_generation_failures_open_breaker(self):
+        """Test connection errors during generation count towards opening the breaker"""
+        import requests
+        from .chatbot import LLMModel
+        from .llm_backends import OllamaBackend
+
+        health = self.health()
+        health.refresh()
+        model = LLMModel(OllamaBackend('http://ollama/api', 'gemma:2b', health=health))
+        with mock.patch('ai_agent.llm_backends.requests.post', side_effect=requests.ConnectionError('refused')) as post:
+            for _ in range(5):
+                async_to_sync(model.generate_text)('hello')
+        self.assertEqual(post.call_count, health.breaker.failure_threshold)
+
+    def test_rejected_request_leaves_half_open_trial(self):
+        """Test a request turned away by the scheduler doesn't hold the half-open trial"""
+        from .chatbot import LLMModel
+        from .llm_backends import OllamaBackend
+        from .scheduler import Overloaded
+
+        health = self.health()
+        health.refresh()
+        health.breaker.trip()
+        self.clock.now += 30
+        model = LLMModel(OllamaBackend('http://ollama/api', 'gemma:2b', health=health))
+        scheduler = mock.Mock()
+        scheduler.slot.side_effect = Overloaded('LLM queue is full', 5)
+        with mock.patch('ai_agent.chatbot.get_llm_scheduler', return_value=scheduler):
+            with self.assertRaises(Overloaded):
+                async_to_sync(model.generate_text)('hello')
+        self.assertEqual(health.breaker.state, 'half_open')
+        self.assertTrue(health.allow_request())
+
+
+class SingleFlightTests(SimpleTestCase):
+    def blocking_producer(self, chunks, release, error=None):
+        self.produced = 0
+
+        def produce():
+            self.produced += 1
+            for i, chunk in enumerate(chunks):
+                if i == 1:
+                    release.wait(5)
+                yield chunk
+            if error:
+                raise error
+        return produce
+
+    def test_identical_requests_share_one_generation(self):
+        """Test a second request for the same key joins the running flight and sees every chunk"""
+        import threading
+        from .coalescing import SingleFlight
+
+        flights, release = SingleFlight(), threading.Event()
+        produce = self.blocking_producer(['Rest ', 'and ', 'fluids.'], release)
+        key = flights.key('gemma:2b', 'flu remedies', {'temperature': 0.7})
+        leader = flights.stream(key, produce)
+        self.assertEqual(next(leader), 'Rest ')
+
+        # Joins after the first chunk and still gets the full text
+        follower = flights.join(key, produce)
+        self.assertEqual(flights.snapshot(), {'in_flight': 1, 'started': 1, 'coalesced': 1})
+        release.set()
+        self.assertEqual(''.join(leader), 'and fluids.')
+        self.assertEqual(''.join(follower.follow()), 'Rest and fluids.')
+        self.assertEqual(self.produced, 1)
+
+        # Finished flights are not cached
+        self.assertEqual(flights.run(key, produce), 'Rest and fluids.')
+        self.assertEqual(self.produced, 2)
+
+    def test_error_reaches_every_waiter(self):
+        """Test a failed generation raises in the leader and in every follower"""
+        import threading
+        from .coalescing import SingleFlight
+
+        flights, release = SingleFlight(), threading.Event()
+        produce = self.blocking_producer(['partial'], release, error=ConnectionError('refused'))
+        key = flights.key('prompt')
+        waiters = [flights.join(key, produce), flights.join(key, produce)]
+        release.set()
+        for flight in waiters:
+            with self.assertRaises(ConnectionError):
+                ''.join(flight.follow())
+
+    def test_rejected_leader_does_not_fail_followers(self):
+        """Test followers of a leader the scheduler rejects get their own admission instead of its Overloaded"""
+        import threading
+        import time
+        from .coalescing import SingleFlight
+        from .scheduler import Overloaded
+
+        flights, rejected = SingleFlight(), threading.Event()
+        key = flights.key('flu remedies')
+        calls, answers = [], {}
+
+        def produce_for(user):
+            def produce():
+                calls.append(user)
+                if user == 'a':
+                    # 'a' is over its per-user queue limit
+                    rejected.wait(5)
+                    raise Overloaded("Too many of your requests are waiting", 1)
+                yield 'Rest and fluids.'
+            return produce
+
+        def ask(user):
+            try:
+                answers[user] = flights.run(key, produce_for(user), timeout=5, rejected=Overloaded)
+            except Overloaded:
+                answers[user] = 'overloaded'
+
+        threads = [threading.Thread(target=ask, args=(user,)) for user in ('a', 'b')]
+        threads[0].start()
+        deadline = time.monotonic() + 5
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.005)
+        threads[1].start()
+        while flights.coalesced < 1 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        rejected.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(answers, {'a': 'overloaded', 'b': 'Rest and fluids.'})
+        self.assertEqual(calls, ['a', 'b'])
+
+    def test_follower_wait_is_bounded(self):
+        """Test a follower gives up when the shared generation stops producing"""
+        import threading
+        from .coalescing import SingleFlight
+
+        flights, release = SingleFlight(), threading.Event()
+        key = flights.key('prompt')
+        leader = flights.stream(key, self.blocking_producer(['first ', 'second'], release), timeout=0.05)
+        self.assertEqual(next(leader), 'first ')
+        with self.assertRaises(TimeoutError):
+            next(leader)
+        release.set()
+
+    def test_concurrent_chats_make_one_ollama_call(self):
+        """Test LLMModel coalesces identical prompts into one streamed upstream request"""
+        import json
+        import threading
+        import time
+        from .backend_health import OllamaHealth
+        from .chatbot import LLMModel
+        from .llm_backends import OllamaBackend
+        from .coalescing import SingleFlight
+
+        release = threading.Event()
+        flights = SingleFlight()
+
+        def lines():
+            yield json.dumps({'response': 'Drink ', 'done': False}).encode()
+            release.wait(5)
+            yield json.dumps({'response': 'water.', 'done': True}).encode()
+
+        response = mock.MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_lines.side_effect = lambda: lines()
+        health = OllamaHealth('http://ollama/api', 'gemma:2b')
+        health.checked_at = float('inf')  # never stale: no probe
+        model = LLMModel(OllamaBackend('http://ollama/api', 'gemma:2b', health=health))
+
+        answers = []
+        with mock.patch('ai_agent.chatbot.llm_flights', flights), \
+                mock.patch('ai_agent.llm_backends.requests.post', return_value=response) as post:
+            threads = [threading.Thread(target=lambda: answers.append(async_to_sync(model.generate_text)('hi')))
+                       for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while flights.coalesced < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(answers, ['Drink water.'] * 3)
+
+
+class LLMSchedulerTests(SimpleTestCase):
+    def queue_in_order(self, scheduler, requests):
+        """Queue (name, work_class, user) requests one after another behind a held slot; return the grant order"""
+        import threading
+        import time
+
+        order = []
+
+        def run(name, work_class, user):
+            with scheduler.slot(work_class, user):
+                order.append(name)
+
+        with scheduler.slot():
+            threads = []
+            for queued, (name, work_class, user) in enumerate(requests, start=1):
+                thread = threading.Thread(target=run, args=(name, work_class, user))
+                thread.start()
+                threads.append(thread)
+                deadline = time.monotonic() + 5
+                while scheduler.snapshot()['queued'] < queued and time.monotonic() < deadline:
+                    time.sleep(0.005)
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_priority_order(self):
+        """Test waiting chat turns run before a report analysis queued ahead of them"""
+        from .scheduler import LLMScheduler
+
+        order = self.queue_in_order(LLMScheduler(), [
+            ('report', 'report', 'a'), ('summary', 'summary', 'b'), ('chat', 'chat', 'c'),
+        ])
+        self.assertEqual(order, ['chat', 'summary', 'report'])
+
+    def test_round_robin_between_users(self):
+        """Test one user's burst doesn't hold up another user's turn"""
+        from .scheduler import LLMScheduler
+
+        order = self.queue_in_order(LLMScheduler(), [
+            ('a1', 'chat', 'a'), ('a2', 'chat', 'a'), ('a3', 'chat', 'a'), ('b1', 'chat', 'b'),
+        ])
+        self.assertEqual(order, ['a1', 'b1', 'a2', 'a3'])
+
+    def test_admission_control(self):
+        """Test a full queue, or too many waiting requests from one user, is rejected at once"""
+        import threading
+        import time
+        from .scheduler import LLMScheduler, Overloaded
+
+        scheduler = LLMScheduler(max_queue=2, max_queued_per_user=1)
+
+        def wait(user):
+            with scheduler.slot('chat', user):
+                pass
+
+        with scheduler.slot():
+            threads = [threading.Thread(target=wait, args=(user,)) for user in ('a', 'b')]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while scheduler.snapshot()['queued'] < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            with self.assertRaises(Overloaded) as raised:
+                with scheduler.slot('chat', 'c'):
+                    pass
+            self.assertGreaterEqual(raised.exception.retry_after, 1)
+        for thread in threads:
+            thread.join(5)
+
+        scheduler = LLMScheduler(max_queued_per_user=1, queue_timeout=5)
+        with scheduler.slot():
+            thread = threading.Thread(target=wait, args=('a',))
+            thread.start()
+            deadline = time.monotonic() + 5
+            while scheduler.snapshot()['queued'] < 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            with self.assertRaises(Overloaded):
+                with scheduler.slot('chat', 'a'):
+                    pass
+        thread.join(5)
+        stats = scheduler.snapshot()['classes']['chat']
+        self.assertEqual((stats['rejected'], stats['completed']), (1, 2))
+
+    def test_queue_timeout(self):
+        """Test a request that waits longer than the queue timeout gives up and leaves the queue"""
+        from .scheduler import LLMScheduler, Overloaded
+
+        scheduler = LLMScheduler(queue_timeout=0.05)
+        with scheduler.slot():
+            with self.assertRaises(Overloaded):
+                with scheduler.slot('report', 'a'):
+                    pass
+        snapshot = scheduler.snapshot()
+        self.assertEqual((snapshot['queued'], snapshot['running']), (0, 0))
+        self.assertEqual(snapshot['classes']['report']['timed_out'], 1)
+
+    def test_overloaded_chat_returns_429(self):
+        """Test the chat endpoint answers 429 with Retry-After when the scheduler rejects the work"""
+        from django.urls import reverse
+        from .scheduler import Overloaded
+
+        chatbot = mock.Mock()
+        chatbot.generate_response = mock.AsyncMock(side_effect=Overloaded("The AI service is busy", 12))
+        with mock.patch('ai_agent.views.get_chatbot_for_user', return_value=chatbot):
+            response = self.client.post(reverse('process_query'), {'query': 'What helps a migraine?', 'user_id': 'a'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '12')
+        self.assertEqual(response.json()['retry_after'], 12)
+
+
+class LLMBackendTests(SimpleTestCase):
+    def test_fake_backend_is_deterministic_and_paced(self):
+        """Test the fake backend gives the same text per prompt, at its first-token latency and token rate"""
+        from .llm_backends import FakeBackend
+
+        sleeps = []
+        backend = FakeBackend(latency=0.5, tokens_per_second=10, tokens=20, sleep=sleeps.append)
+        text = ''.join(backend.stream('flu remedies'))
+        self.assertEqual(''.join(backend.stream('flu remedies')), text)
+        self.assertNotEqual(''.join(backend.stream('back pain')), text)
+        self.assertTrue(text.startswith('## Summary\n- '))
+        self.assertEqual(sleeps[:21], [0.5] + [0.1] * 20)
+        self.assertEqual(len(''.join(backend.stream('flu', {'max_tokens': 5})).split('- ')[-1].split()), 5)
+
+    def test_llm_model_runs_any_backend(self):
+        """Test generations go through the scheduler and coalescing whichever backend is configured"""
+        from .chatbot import LLMModel
+        from .llm_backends import FakeBackend
+        from .scheduler import LLMScheduler
+
+        backend = FakeBackend(latency=0, tokens_per_second=0, tokens=16)
+        scheduler = LLMScheduler()
+        with mock.patch('ai_agent.chatbot.get_llm_scheduler', return_value=scheduler):
+            answer = async_to_sync(LLMModel(backend).generate_text)('headache')
+        self.assertEqual(answer, ''.join(backend.text('headache', 16)))
+        self.assertEqual(scheduler.snapshot()['classes']['chat']['completed'], 1)
+
+    def test_create_backend(self):
+        """Test LLM_BACKEND selects the backend, and a missing llama.cpp model fails softly"""
+        from django.test import override_settings
+        from .chatbot import LLMModel
+        from .llm_backends import FakeBackend, LlamaCppBackend, OllamaBackend, create_backend
+
+        self.assertIsInstance(create_backend('ollama'), OllamaBackend)
+        with override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_MS=10):
+            backend = create_backend()
+        self.assertIsInstance(backend, FakeBackend)
+        self.assertEqual(backend.latency, 0.01)
+        with self.assertRaises(ValueError):
+            create_backend('gpt')
+
+        with override_settings(LLAMACPP_MODEL_PATH='/nonexistent/model.gguf'):
+            backend = create_backend('llamacpp')
+        self.assertIsInstance(backend, LlamaCppBackend)
+        self.assertFalse(backend.available)
+        answer = async_to_sync(LLMModel(backend).generate_text)('hello')
+        self.assertIn('trouble processing', answer)
+        self.assertIn('not found', backend.snapshot()['error'])
+
+
+class RecordingEncoder:
+    """Embeds a sentence as [length, vowels]; records the size of every encode call."""
+    device = 'cpu'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        import time
+        import numpy as np
+
+        self.calls.append(len(sentences))
+        time.sleep(self.delay)
+        return np.array([[len(s), sum(c in 'aeiou' for c in s)] for s in sentences], dtype='float32').reshape(-1, 2)
+
+
+class EmbeddingBatcherTests(SimpleTestCase):
+    def test_drop_in_encode(self):
+        """Test the batcher returns what SentenceTransformer.encode would for strings, lists and tensors"""
+        from .batching import EmbeddingBatcher
+
+        batcher = EmbeddingBatcher(RecordingEncoder())
+        self.assertEqual(batcher.encode('flu').tolist(), [3, 1])
+        self.assertEqual(batcher.encode(['cold', 'fever']).tolist(), [[4, 1], [5, 2]])
+        tensor = batcher.encode('rash', convert_to_tensor=True)
+        self.assertEqual(tensor.tolist(), [4, 1])
+        self.assertEqual(batcher.device, 'cpu')
+
+    def test_concurrent_callers_share_forward_passes(self):
+        """Test concurrent queries are encoded together and each caller gets its own rows"""
+        import threading
+        from .batching import EmbeddingBatcher
+
+        encoder = RecordingEncoder(delay=0.02)
+        batcher = EmbeddingBatcher(encoder, max_batch=64, max_wait=0.05)
+        sentences = [f"query number {i}" + 'a' * i for i in range(24)]
+        results = {}
+
+        def call(sentence):
+            results[sentence] = batcher.encode(sentence).tolist()
+
+        threads = [threading.Thread(target=call, args=(sentence,)) for sentence in sentences]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, {s: [len(s), sum(c in 'aeiou' for c in s)] for s in sentences})
+        self.assertEqual(sum(encoder.calls), len(sentences))
+        self.assertLess(len(encoder.calls), len(sentences) // 2)
+
+    def test_lone_request_does_not_wait(self):
+        """Test a request with no concurrent callers is encoded without waiting out the window"""
+        import time
+        from .batching import EmbeddingBatcher
+
+        batcher = EmbeddingBatcher(RecordingEncoder(), max_wait=5.0)
+        started = time.monotonic()
+        batcher.encode('headache')
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_encoder_errors_reach_callers(self):
+        """Test a failing batch raises in the caller instead of hanging it"""
+        from .batching import EmbeddingBatcher
+
+        encoder = RecordingEncoder()
+        encoder.encode = mock.Mock(side_effect=RuntimeError('out of memory'))
+        with self.assertRaises(RuntimeError):
+            EmbeddingBatcher(encoder).encode('cough')
+
+
+def _onnx_available():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@skipUnless(_onnx_available(), "onnx, onnxruntime and sentence-transformers are needed for the ONNX export")
+class OnnxEncoderTests(SimpleTestCase):
+    sentences = ["What are the symptoms of the flu?", "book an appointment", "my blood test results", "hello"]
+
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from sentence_transformers import SentenceTransformer, models
+        from transformers import BertConfig, BertModel, BertTokenizerFast
+        from .onnx_encoder import export_onnx
+
+        super().setUpClass()
+        cls.workdir = tempfile.TemporaryDirectory()
+        path = cls.workdir.name
+        words = sorted({word.strip('?').lower() for sentence in cls.sentences for word in sentence.split()})
+        with open(f'{path}/vocab.txt', 'w') as f:
+            f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + words))
+        BertTokenizerFast(f'{path}/vocab.txt').save_pretrained(path)
+        BertModel(BertConfig(vocab_size=5 + len(words), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                             intermediate_size=64)).save_pretrained(path)
+        transformer = models.Transformer(path, max_seq_length=32)
+        pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode='mean')
+        cls.reference = SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device='cpu')
+        export_onnx(cls.reference, f'{path}/onnx')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workdir.cleanup()
+        super().tearDownClass()
+
+    def test_embeddings_match_torch(self):
+        """Test fp32 and int8 ONNX embeddings agree with the PyTorch encoder"""
+        from .onnx_encoder import MIN_COSINE, OnnxSentenceEncoder, agreement
+
+        for quantized in (False, True):
+            encoder = OnnxSentenceEncoder(f'{self.workdir.name}/onnx', quantized=quantized)
+            cosines, same_neighbour = agreement(self.reference, encoder, self.sentences, self.sentences)
+            self.assertGreaterEqual(cosines.min(), MIN_COSINE)
+            self.assertEqual(same_neighbour, 1.0)
+
+    def test_encode_shapes(self):
+        """Test a string gives one vector and a list gives one row per sentence, like SentenceTransformer"""
+        from .onnx_encoder import OnnxSentenceEncoder
+
+        encoder = OnnxSentenceEncoder(f'{self.workdir.name}/onnx')
+        self.assertEqual(encoder.get_sentence_embedding_dimension(), 32)
+        self.assertEqual(encoder.encode('hello').shape, (32,))
+        self.assertEqual(encoder.encode(self.sentences, batch_size=3).shape, (4, 32))
+        self.assertEqual(encoder.encode([]).shape, (0, 32))
+
+        # What a forked worker does before its first encode
+        before = encoder.encode('hello')
+        encoder.open_session(threads=1)
+        self.assertEqual(encoder.encode('hello').tolist(), before.tolist())
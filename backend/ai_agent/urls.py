@@ -5,4 +5,7 @@ urlpatterns = [
     path('chat/', views.process_query, name='process_query'),
     path('clear/', views.clear_conversation, name='clear_conversation'),
     path('process-medical-report/', views.process_medical_report, name='process_medical_report'),
+    path('metrics/', views.chat_metrics, name='chat_metrics'),
+    path('health/live/', views.health_live, name='health_live'),
+    path('health/ready/', views.health_ready, name='health_ready'),
 ]
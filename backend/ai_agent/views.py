@@ -4,13 +4,18 @@ from rest_framework.response import Response
 from rest_framework import status
 from .ai_handler import EnhancedAIAgent
 from .chatbot import MedicalChatbot
+from .coalescing import llm_flights
+from .lifecycle import lifecycle
+from .loaders import get_llm_backend
+from .metrics import chat_tiers
+from .scheduler import get_llm_scheduler, Overloaded, APPOINTMENT, SUMMARY
 import os
 from django.conf import settings
 import json
 from datetime import datetime
 import asyncio
 from django.http import JsonResponse
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync
 import logging
 import traceback
 import uuid
@@ -52,18 +57,24 @@ def get_chatbot_for_user(user_id):
     
     return user_chatbots[user_id]
 
+def overloaded_response(error):
+    """429 with Retry-After for LLM work the scheduler turned away"""
+    response = Response(
+        {
+            'error': str(error),
+            'response': """**Busy**
+- The AI service is handling many requests right now.
+- Please try again in a few moments.""",
+            'retry_after': error.retry_after,
+        },
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
 @api_view(['POST', 'OPTIONS'])
 def process_query(request):
     """Process general queries using the enhanced chatbot"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        response = Response()
-        response["Access-Control-Allow-Origin"] = "*"
-        response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        response["Access-Control-Allow-Credentials"] = "true"
-        return response
-        
     try:
         query = request.data.get('query')
         # Extract context if provided (for report follow-up questions)
@@ -74,11 +85,6 @@ def process_query(request):
                 {'error': 'Query is required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            # Add CORS headers to error response
-            error_response["Access-Control-Allow-Origin"] = "*"
-            error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-            error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-            error_response["Access-Control-Allow-Credentials"] = "true"
             return error_response
         
         # Get or create user-specific chatbot
@@ -92,19 +98,14 @@ def process_query(request):
             logger.info(f"Processing general query for user {user_id}: {query[:50]}...")
         
         try:
-            # Run the async function in the event loop
-            response = asyncio.run(chatbot.generate_response(query, context))
+            # Run the async function; async_to_sync keeps database access on this thread
+            response = async_to_sync(chatbot.generate_response)(query, context)
             
             success_response = Response({'response': response})
-            
-            # Add CORS headers to success response
-            success_response["Access-Control-Allow-Origin"] = "*"
-            success_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-            success_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-            success_response["Access-Control-Allow-Credentials"] = "true"
-            
             return success_response
             
+        except Overloaded as e:
+            return overloaded_response(e)
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             logger.error(traceback.format_exc())
@@ -120,13 +121,6 @@ def process_query(request):
 - If the issue persists, please contact support"""
             
             error_response = Response({'response': error_message, 'error': str(e)})
-            
-            # Add CORS headers to error response
-            error_response["Access-Control-Allow-Origin"] = "*"
-            error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-            error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-            error_response["Access-Control-Allow-Credentials"] = "true"
-            
             return error_response
             
     except Exception as e:
@@ -142,13 +136,6 @@ def process_query(request):
             }, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-        
-        # Add CORS headers to error response
-        error_response["Access-Control-Allow-Origin"] = "*"
-        error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        error_response["Access-Control-Allow-Credentials"] = "true"
-        
         return error_response
 
 @api_view(['POST'])
@@ -166,24 +153,14 @@ def process_appointment_query(request):
         chatbot = get_chatbot_for_user(user_id)
         
         context = {'appointment_info': appointment_info}
-        response = asyncio.run(chatbot.generate_response(query, context))
+        response = async_to_sync(chatbot.generate_response)(query, context, APPOINTMENT)
         
-        # Add CORS headers
-        cors_response = Response({'response': response})
-        cors_response["Access-Control-Allow-Origin"] = "*"
-        cors_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        cors_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        cors_response["Access-Control-Allow-Credentials"] = "true"
-        
-        return cors_response
+        return Response({'response': response})
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error processing appointment query: {e}")
         error_response = Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        # Add CORS headers
-        error_response["Access-Control-Allow-Origin"] = "*"
-        error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        error_response["Access-Control-Allow-Credentials"] = "true"
         return error_response
 
 @api_view(['POST'])
@@ -200,24 +177,14 @@ def summarize_report(request):
         chatbot = get_chatbot_for_user(user_id)
         
         context = {'report_text': report_text}
-        response = asyncio.run(chatbot.generate_response("Please summarize this medical report", context))
-        
-        # Add CORS headers
-        cors_response = Response({'summary': response})
-        cors_response["Access-Control-Allow-Origin"] = "*"
-        cors_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        cors_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        cors_response["Access-Control-Allow-Credentials"] = "true"
+        response = async_to_sync(chatbot.generate_response)("Please summarize this medical report", context, SUMMARY)
         
-        return cors_response
+        return Response({'summary': response})
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error summarizing report: {e}")
         error_response = Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        # Add CORS headers
-        error_response["Access-Control-Allow-Origin"] = "*"
-        error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        error_response["Access-Control-Allow-Credentials"] = "true"
         return error_response
 
 @api_view(['POST'])
@@ -233,38 +200,19 @@ def process_medical_query(request):
         user_id = get_user_id(request)
         chatbot = get_chatbot_for_user(user_id)
         
-        response = asyncio.run(chatbot.generate_response(query))
+        response = async_to_sync(chatbot.generate_response)(query)
         
-        # Add CORS headers
-        cors_response = Response({'response': response})
-        cors_response["Access-Control-Allow-Origin"] = "*"
-        cors_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        cors_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        cors_response["Access-Control-Allow-Credentials"] = "true"
-        
-        return cors_response
+        return Response({'response': response})
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error processing medical query: {e}")
         error_response = Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        # Add CORS headers
-        error_response["Access-Control-Allow-Origin"] = "*"
-        error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        error_response["Access-Control-Allow-Credentials"] = "true"
         return error_response
 
 @api_view(['POST', 'OPTIONS'])
 def clear_conversation(request):
     """Clear conversation memory for a specific user"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        response = Response()
-        response["Access-Control-Allow-Origin"] = "http://localhost:3000"
-        response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        response["Access-Control-Allow-Credentials"] = "true"
-        return response
-        
     try:
         # Get the user ID
         user_id = get_user_id(request)
@@ -291,12 +239,6 @@ def clear_conversation(request):
             'user_id': user_id
         })
         
-        # Add CORS headers
-        response["Access-Control-Allow-Origin"] = "http://localhost:3000"
-        response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        response["Access-Control-Allow-Credentials"] = "true"
-        
         return response
         
     except Exception as e:
@@ -308,28 +250,12 @@ def clear_conversation(request):
             }, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-        
-        # Add CORS headers to error response as well
-        error_response["Access-Control-Allow-Origin"] = "http://localhost:3000"
-        error_response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        error_response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        error_response["Access-Control-Allow-Credentials"] = "true"
-        
         return error_response
 
 @api_view(['POST', 'OPTIONS'])
 @parser_classes([MultiPartParser, FormParser])
 def process_medical_report(request):
     """Process an uploaded medical report image using OCR and analyze its content"""
-    # Handle OPTIONS request for CORS preflight
-    if request.method == 'OPTIONS':
-        response = Response()
-        response["Access-Control-Allow-Origin"] = "*"
-        response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-        response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-        response["Access-Control-Allow-Credentials"] = "true"
-        return response
-        
     try:
         # Check if file is present in the request
         if 'file' not in request.FILES:
@@ -337,7 +263,7 @@ def process_medical_report(request):
                 {'success': False, 'error': 'No file provided'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            return add_cors_headers(error_response)
+            return error_response
             
         uploaded_file = request.FILES['file']
         
@@ -347,7 +273,7 @@ def process_medical_report(request):
                 {'success': False, 'error': 'Uploaded file must be an image'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            return add_cors_headers(error_response)
+            return error_response
             
         # Get user ID
         user_id = request.data.get('user_id')
@@ -363,7 +289,7 @@ def process_medical_report(request):
                 {'success': False, 'error': 'Image file is too large (max 10MB). Please upload a smaller image.'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            return add_cors_headers(error_response)
+            return error_response
             
         # Get the chatbot instance for this user
         chatbot = get_chatbot_for_user(user_id)
@@ -383,14 +309,14 @@ def process_medical_report(request):
                     {'success': False, 'error': 'OCR processing timed out. The image may be too complex or Tesseract OCR may be too slow. Try using a clearer or simpler image.'}, 
                     status=status.HTTP_408_REQUEST_TIMEOUT
                 )
-                return add_cors_headers(error_response)
+                return error_response
             
             if not result or not result.get("success", False):
                 error_response = Response(
                     {'success': False, 'error': result.get('error', 'Failed to process image')}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
-                return add_cors_headers(error_response)
+                return error_response
             
             # Success response
             success_response = Response({
@@ -400,8 +326,10 @@ def process_medical_report(request):
                 'message': "Medical report processed successfully"
             })
             
-            return add_cors_headers(success_response)
+            return success_response
             
+        except Overloaded as e:
+            return overloaded_response(e)
         except Exception as e:
             logger.error(f"Error in OCR processing: {e}")
             logger.error(traceback.format_exc())
@@ -410,7 +338,7 @@ def process_medical_report(request):
                 {'success': False, 'error': f"OCR processing error: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            return add_cors_headers(error_response)
+            return error_response
             
     except Exception as e:
         logger.error(f"General error processing medical report: {e}")
@@ -420,12 +348,24 @@ def process_medical_report(request):
             {'success': False, 'error': f"Error processing report: {str(e)}"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-        return add_cors_headers(error_response)
+        return error_response
+
+@api_view(['GET'])
+def chat_metrics(request):
+    """Per-tier answer counts for this worker (how many queries skipped the LLM), coalescing and LLM queue stats"""
+    snapshot = chat_tiers.snapshot()
+    snapshot['coalescing'] = llm_flights.snapshot()
+    snapshot['scheduler'] = get_llm_scheduler().snapshot()
+    return Response(snapshot)
+
+@api_view(['GET'])
+def health_live(request):
+    """Liveness: the worker process is up and serving requests"""
+    return Response({'status': 'alive', 'pid': os.getpid()})
 
-def add_cors_headers(response):
-    """Add CORS headers to a response"""
-    response["Access-Control-Allow-Origin"] = "*"
-    response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-    response["Access-Control-Allow-Headers"] = "Content-Type, Accept"
-    response["Access-Control-Allow-Credentials"] = "true"
-    return response
\ No newline at end of file
+@api_view(['GET'])
+def health_ready(request):
+    """Readiness: 200 once this worker's AI stack is loaded, 503 while it is starting or if it failed"""
+    snapshot = lifecycle.snapshot()
+    snapshot['llm_backend'] = get_llm_backend().snapshot()
+    return Response(snapshot, status=status.HTTP_200_OK if lifecycle.ready else status.HTTP_503_SERVICE_UNAVAILABLE)
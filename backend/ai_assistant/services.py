@@ -3,12 +3,13 @@ import json
 from datetime import datetime, timedelta
 import os
 import logging
-import openai
 from django.conf import settings
 from django.db.models import Q
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from langchain import PromptTemplate, LLMChain
-from langchain.llms import HuggingFacePipeline
+
+# openai and langchain are imported where they are used: they take seconds to
+# import and most requests (and every management command) never need them
+
+from ai_agent.intents import ASSISTANT_INTENTS, RECOMMENDATION_TYPES, RECORD_TYPES, SMALL_TALK
 
 from .models import ChatMessage, SymptomCheck, HealthRecommendation, AgentAction
 from users.models import User
@@ -108,8 +109,14 @@ class AIAssistantService:
         """
         Identify the intent of the user message using NLP
         """
+        # Keyword rules settle most messages without an API round trip
+        intent = self._rule_based_intent_identification(message_content)
+        if intent != 'general':
+            return intent
+        
         # Use OpenAI to identify intent if API key is available
         if hasattr(settings, 'OPENAI_API_KEY'):
+            import openai
             openai.api_key = settings.OPENAI_API_KEY
             try:
                 response = openai.ChatCompletion.create(
@@ -144,20 +151,7 @@ class AIAssistantService:
         """
         Simple rule-based intent identification as fallback
         """
-        message_lower = message_content.lower()
-        
-        if any(keyword in message_lower for keyword in ['symptom', 'feel', 'sick', 'pain', 'ache', 'hurt']):
-            return 'symptom_check'
-        elif any(keyword in message_lower for keyword in ['appointment', 'schedule', 'book', 'visit', 'see doctor']):
-            return 'appointment_scheduling'
-        elif any(keyword in message_lower for keyword in ['medication', 'medicine', 'pill', 'drug', 'reminder']):
-            return 'medication_reminder'
-        elif any(keyword in message_lower for keyword in ['recommendation', 'suggest', 'advice', 'healthy']):
-            return 'health_recommendation'
-        elif any(keyword in message_lower for keyword in ['record', 'history', 'document', 'test result']):
-            return 'medical_record_query'
-        else:
-            return 'general'
+        return ASSISTANT_INTENTS.first(message_content, default='general')
     
     def _init_llama_model(self):
         """
@@ -293,6 +287,9 @@ Please provide your analysis:"""
         seek_medical_attention = False
         
         try:
+            from langchain.chains import LLMChain
+            from langchain.prompts import PromptTemplate
+            
             # Create medical analysis prompt template with more detailed instructions
             prompt_template = PromptTemplate(
                 input_variables=["symptoms"],
@@ -573,6 +570,7 @@ Please provide your analysis:"""
         
         # Generate personalized recommendation
         if hasattr(settings, 'OPENAI_API_KEY'):
+            import openai
             openai.api_key = settings.OPENAI_API_KEY
             try:
                 # Get user health data for context
@@ -639,18 +637,7 @@ Please provide your analysis:"""
         """
         Identify the type of health recommendation requested
         """
-        message_lower = message_content.lower()
-        
-        if any(keyword in message_lower for keyword in ['diet', 'food', 'eat', 'nutrition']):
-            return 'diet'
-        elif any(keyword in message_lower for keyword in ['exercise', 'workout', 'fitness', 'physical activity']):
-            return 'exercise'
-        elif any(keyword in message_lower for keyword in ['sleep', 'rest', 'stress', 'mental', 'anxiety']):
-            return 'lifestyle'
-        elif any(keyword in message_lower for keyword in ['checkup', 'screening', 'prevention']):
-            return 'preventive'
-        else:
-            return 'other'
+        return RECOMMENDATION_TYPES.first(message_content, default='other')
     
     def _handle_medical_record_query(self, message_content):
         """
@@ -726,23 +713,7 @@ Please provide your analysis:"""
         """
         Identify the type of medical record being queried
         """
-        message_lower = message_content.lower()
-        
-        record_types = {
-            'general': ['general', 'health record', 'medical record'],
-            'diagnosis': ['diagnosis', 'diagnosed'],
-            'prescription': ['prescription', 'medicine', 'medication'],
-            'test_result': ['test', 'lab', 'result', 'blood test'],
-            'vaccination': ['vaccine', 'vaccination', 'immunization', 'shot'],
-            'surgery': ['surgery', 'operation', 'procedure'],
-            'allergy': ['allergy', 'allergic'],
-        }
-        
-        for record_type, keywords in record_types.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return record_type
-        
-        return None
+        return RECORD_TYPES.first(message_content)
     
     def _generate_general_response(self, session, message_content):
         """
@@ -752,6 +723,9 @@ Please provide your analysis:"""
             if self.model_type == 'llama':
                 # Use Llama model for response generation with validation
                 try:
+                    from langchain.chains import LLMChain
+                    from langchain.prompts import PromptTemplate
+                    
                     # Create a chat history context from previous messages
                     chat_history = ""
                     previous_messages = session.messages.order_by('created_at')[:10]  # Get last 10 messages for context
@@ -842,10 +816,10 @@ Assistant: """
         """
         Generate a rule-based response when AI models are unavailable
         """
-        message_lower = message_content.lower()
+        small_talk = SMALL_TALK.matches(message_content)
         
         # Enhanced rule-based responses with more detailed information
-        if any(greeting in message_lower for greeting in ['hello', 'hi', 'hey', 'greetings']):
+        if 'greeting' in small_talk:
             return """**Welcome to LLMediCare Assistant**
 - Hello! I'm your healthcare assistant, here to provide you with comprehensive medical information and support.
 - I can help you with a wide range of health-related questions and concerns.
@@ -871,7 +845,7 @@ Assistant: """
 
 How can I assist you today?"""
         
-        elif any(keyword in message_lower for keyword in ['thank', 'thanks', 'appreciate']):
+        elif 'thanks' in small_talk:
             return """**You're Welcome!**
 - I'm glad I could help you with your health-related questions.
 - Providing comprehensive health information is my primary goal.
@@ -888,7 +862,7 @@ How can I assist you today?"""
 
 Is there anything else I can help you with?"""
         
-        elif any(keyword in message_lower for keyword in ['bye', 'goodbye', 'see you']):
+        elif 'goodbye' in small_talk:
             return """**Goodbye and Take Care!**
 - Thank you for using LLMediCare Assistant for your health information needs.
 - I hope the information provided was helpful and comprehensive.
@@ -905,7 +879,7 @@ Is there anything else I can help you with?"""
 
 Take care of your health and feel free to return if you have more questions!"""
         
-        elif any(keyword in message_lower for keyword in ['help', 'assist', 'support']):
+        elif 'help' in small_talk:
             return """**How I Can Help You**
 - I provide comprehensive health information and medical guidance
 - I can assist with detailed symptom analysis and health assessments
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_blob_store(settings, tmp_path):
+    """Keep uploaded blobs and partial uploads out of the real backend/blobstore folder."""
+    settings.BLOB_STORE_ROOT = str(tmp_path / 'blobstore')
+    settings.DOCUMENT_UPLOAD_DIR = str(tmp_path / 'uploads')
@@ -23,16 +23,10 @@ def check_settings_file():
     with open(settings_path, 'r') as f:
         content = f.read()
     
-    # Check for django-cors-headers in INSTALLED_APPS
-    if 'corsheaders' not in content:
-        print("Error: 'corsheaders' not found in INSTALLED_APPS.")
-        print("Add 'corsheaders' to INSTALLED_APPS in your settings.py file.")
-        return False
-    
-    # Check for CorsMiddleware
-    if 'corsheaders.middleware.CorsMiddleware' not in content:
-        print("Error: CorsMiddleware not found in MIDDLEWARE.")
-        print("Add 'corsheaders.middleware.CorsMiddleware' at the beginning of MIDDLEWARE in your settings.py file.")
+    # Check for the CORS middleware
+    if 'user_session.middleware.CORSMiddleware' not in content:
+        print("Error: CORSMiddleware not found in MIDDLEWARE.")
+        print("Add 'user_session.middleware.CORSMiddleware' at the beginning of MIDDLEWARE in your settings.py file.")
         return False
     
     # Check CORS configuration
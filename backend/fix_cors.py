@@ -157,58 +157,32 @@ def fix_middleware():
     with open(settings_file, 'r') as f:
         content = f.read()
     
-    # Check if corsheaders middleware is in MIDDLEWARE
+    # A single CORS middleware handles preflight and response headers;
+    # django-cors-headers is no longer used alongside it
     cors_middleware = "'corsheaders.middleware.CorsMiddleware'"
     custom_middleware = "'user_session.middleware.CORSMiddleware'"
     
     middleware_changes = []
     
-    if cors_middleware not in content:
-        # Add corsheaders middleware at the beginning of MIDDLEWARE
-        content = re.sub(
-            r'(MIDDLEWARE\s*=\s*\[)',
-            f'\\1\n    {cors_middleware},  # Should be at the top',
-            content
-        )
-        middleware_changes.append(f"Added {cors_middleware}")
+    if cors_middleware in content:
+        content = re.sub(r"\n\s*'corsheaders\.middleware\.CorsMiddleware',[^\n]*", '', content)
+        middleware_changes.append(f"Removed {cors_middleware}")
     
-    # Ensure corsheaders middleware is before other middleware
-    middleware_match = re.search(r'MIDDLEWARE\s*=\s*\[(.*?)\]', content, re.DOTALL)
-    if middleware_match:
-        middleware_list = middleware_match.group(1).strip().split(',')
-        middleware_list = [m.strip() for m in middleware_list if m.strip()]
-        
-        # Find positions of the middleware
-        cors_index = -1
-        common_index = -1
-        for i, m in enumerate(middleware_list):
-            if cors_middleware in m:
-                cors_index = i
-            if "'django.middleware.common.CommonMiddleware'" in m:
-                common_index = i
-        
-        # Ensure corsheaders middleware is before CommonMiddleware
-        if cors_index > common_index and common_index != -1:
-            print("⚠️ CorsMiddleware should be placed before CommonMiddleware")
-            # This would require more complex manipulation, so just alert the user
-    
-    # Check custom middleware
-    if custom_middleware not in content and "'user_session.middleware.CorsHeaderMiddleware'" not in content:
-        # Add custom middleware after corsheaders middleware
-        content = re.sub(
-            r'(MIDDLEWARE\s*=\s*\[\s*\n.*?corsheaders\.middleware\.CorsMiddleware.*?\n)',
-            f'\\1    {custom_middleware},  # Our custom CORS middleware\n',
-            content,
-            flags=re.DOTALL
-        )
-        middleware_changes.append(f"Added {custom_middleware}")
-    elif "'user_session.middleware.CorsHeaderMiddleware'" in content:
+    if "'user_session.middleware.CorsHeaderMiddleware'" in content:
         # Update old middleware name to new one
         content = content.replace(
             "'user_session.middleware.CorsHeaderMiddleware'",
             custom_middleware
         )
         middleware_changes.append("Updated middleware class name to CORSMiddleware")
+    elif custom_middleware not in content:
+        # Add custom middleware at the beginning of MIDDLEWARE so it answers preflight first
+        content = re.sub(
+            r'(MIDDLEWARE\s*=\s*\[)',
+            f'\\1\n    {custom_middleware},',
+            content
+        )
+        middleware_changes.append(f"Added {custom_middleware}")
     
     # Write the updated content back to the file
     with open(settings_file, 'w') as f:
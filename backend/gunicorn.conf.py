@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the Django backend:
+
+    gunicorn -c gunicorn.conf.py LLMediCare.wsgi
+
+The application is imported once in the master with the AI stack fully
+loaded (AI_WARMUP=blocking, see ai_agent/lifecycle.py); workers are forked
+from it afterwards, so they share the model weights copy-on-write and are
+ready for their first chat. Poll /api/ai/health/ready/ before routing traffic.
+
+The master runs the warm-up inference single-threaded: an OpenMP pool (torch,
+MKL) started before the fork is unusable in the workers and can hang them.
+post_fork then gives each worker its share of the cores.
+"""
+import os
+
+os.environ.setdefault('AI_WARMUP', 'blocking')
+# Read when torch is first imported, i.e. while the master preloads the app
+os.environ['OMP_NUM_THREADS'] = '1'
+os.environ['MKL_NUM_THREADS'] = '1'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+# Each worker schedules LLM work on its own: the LLM_MAX_* limits in settings.py apply per worker
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# Threads keep a worker responsive to short requests while one waits on the LLM
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = True
+# Local LLM generations can take well over gunicorn's default 30s
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 180))
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    from ai_agent.lifecycle import lifecycle
+
+    lifecycle.after_fork(workers=server.cfg.workers)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UserSessionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user_session'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
+
+        from django.db.backends.signals import connection_created
+        from LLMediCare.database import configure_sqlite_connection
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='sqlite-pragmas')
@@ -0,0 +1,281 @@
+import base64
+import binascii
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Magic numbers for the formats patients usually upload
+_SIGNATURES = [
+    (b'%PDF', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+]
+
+_DATA_URL_RE = re.compile(r'^data:(?P<type>[^;,]*)(?:;[^,]*)?;base64,', re.IGNORECASE)
+
+
+def sniff_content_type(head):
+    """Guess a content type from the first bytes of a file."""
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return 'application/octet-stream'
+
+
+def decode_inline(value):
+    """
+    Decode an inline upload as sent by the frontend: a data URL
+    (data:image/png;base64,...) or bare base64. Anything that isn't valid
+    base64 is stored as UTF-8 text. Returns (bytes, content_type).
+    """
+    match = _DATA_URL_RE.match(value)
+    if match:
+        try:
+            data = base64.b64decode(value[match.end():])
+        except (binascii.Error, ValueError):
+            # A broken payload keeps the raw value rather than failing the save
+            data = value.encode('utf-8')
+            return data, sniff_content_type(data)
+        return data, match.group('type') or sniff_content_type(data)
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        data = value.encode('utf-8')
+    return data, sniff_content_type(data)
+
+
+class LocalBlobStore:
+    """
+    Content-addressed blobs on the local filesystem: each blob lives at
+    <root>/<aa>/<bb>/<sha256>, so identical uploads are stored once.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put_file(self, fileobj):
+        """Stream a file object into the store while hashing it. Returns (key, size)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            key = digest.hexdigest()
+            self.put_path(tmp_path, key)
+            return key, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_path(self, path, key):
+        """Move an already hashed file into place (deduplicating)."""
+        target = self._path(key)
+        if os.path.exists(target):
+            os.remove(path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def put_bytes(self, data):
+        import io
+        return self.put_file(io.BytesIO(data))
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def iter_range(self, key, start=0, end=None, chunk_size=CHUNK_SIZE):
+        """Yield the bytes of a blob from start to end (inclusive)."""
+        with open(self._path(key), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore:
+    """Same interface backed by any S3-compatible object store (needs boto3)."""
+
+    def __init__(self, bucket, prefix='blobs/', endpoint_url=None, staging_dir=None):
+        import boto3  # Optional dependency, only needed for the s3 backend
+
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.staging_dir = staging_dir or tempfile.gettempdir()
+
+    def _object_key(self, key):
+        return f"{self.prefix}{key[:2]}/{key}"
+
+    def put_file(self, fileobj):
+        # Hash while spooling to disk so the key is known before the upload
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile(dir=self.staging_dir) as spool:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+                spool.write(chunk)
+            key = digest.hexdigest()
+            if not self.exists(key):
+                spool.seek(0)
+                self.client.upload_fileobj(spool, self.bucket, self._object_key(key))
+        return key, size
+
+    def put_path(self, path, key):
+        if not self.exists(key):
+            self.client.upload_file(path, self.bucket, self._object_key(key))
+        os.remove(path)
+
+    def put_bytes(self, data):
+        import io
+        return self.put_file(io.BytesIO(data))
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception:
+            return False
+
+    def size(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))['ContentLength']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def iter_range(self, key, start=0, end=None, chunk_size=CHUNK_SIZE):
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key), Range=byte_range)['Body']
+        yield from body.iter_chunks(chunk_size)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Return the blob store configured by BLOB_STORE_BACKEND ('local' or 's3')."""
+    backend = getattr(settings, 'BLOB_STORE_BACKEND', 'local')
+    if backend == 's3':
+        config = (backend, settings.BLOB_STORE_BUCKET, getattr(settings, 'BLOB_STORE_ENDPOINT_URL', None))
+    else:
+        config = (backend, settings.BLOB_STORE_ROOT)
+    with _stores_lock:
+        if config not in _stores:
+            if backend == 's3':
+                _stores[config] = S3BlobStore(config[1], endpoint_url=config[2])
+            else:
+                _stores[config] = LocalBlobStore(config[1])
+        return _stores[config]
+
+
+def store_inline(value):
+    """Move an inline (base64 / data URL) payload into the blob store. Returns (key, content_type, size)."""
+    data, content_type = decode_inline(value)
+    key, size = get_blob_store().put_bytes(data)
+    return key, content_type, size
+
+
+def _parse_range(header, size):
+    """Parse a single 'bytes=' range. Returns (start, end), None for no range, or False if unsatisfiable."""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def blob_response(request, key, content_type, filename=None):
+    """
+    Stream a blob with HTTP range support. The content hash doubles as a
+    strong ETag, so unchanged files revalidate with a 304.
+    """
+    store = get_blob_store()
+    etag = f'"{key}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    try:
+        size = store.size(key)
+    except FileNotFoundError:
+        logger.warning(f"Blob {key} is missing from the store")
+        raise Http404("File not found")
+    byte_range = _parse_range(request.headers.get('Range', ''), size) if request.headers.get('Range') else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(store.iter_range(key, start, end), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(store.iter_range(key), content_type=content_type)
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    if filename:
+        extension = mimetypes.guess_extension(content_type or '') or ''
+        if extension and not filename.lower().endswith(extension):
+            filename += extension
+        response['Content-Disposition'] = 'inline; filename="{}"'.format(filename.replace('"', ''))
+    return response
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Cached responses are grouped into scopes (one user's profile, one user's
+# records, the doctor list); the dashboard caches each of its sections under
+# the matching per-user scope as well. Each scope has a timestamp that changes whenever
+# a row in it changes; it is part of every cache key in the scope, so bumping
+# it retires all of them at once and doubles as Last-Modified.
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def records_scope(user_id):
+    return f"records:{user_id}"
+
+
+def sessions_scope(user_id):
+    return f"sessions:{user_id}"
+
+
+def appointments_scope(user_id):
+    return f"appointments:{user_id}"
+
+
+def notifications_scope(user_id):
+    return f"notifications:{user_id}"
+
+
+def user_data_scopes(user_id):
+    """Every per-user scope except the profile itself."""
+    return [records_scope(user_id), sessions_scope(user_id), appointments_scope(user_id),
+            notifications_scope(user_id)]
+
+
+DOCTORS_SCOPE = 'doctors'
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _stamp_key(scope):
+    return f"scope-stamp:{scope}"
+
+
+def scope_stamps(scopes):
+    """Current timestamp of each scope, starting a scope that has none yet."""
+    cache = _cache()
+    keys = [_stamp_key(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, time.time(), None)
+            stamps[key] = cache.get(key) or time.time()
+    return [stamps[key] for key in keys]
+
+
+def _touch(scopes):
+    now = time.time()
+    _cache().set_many({_stamp_key(scope): now for scope in scopes}, None)
+
+
+def invalidate(*scopes):
+    """
+    Mark scopes as changed; every response cached under them becomes stale.
+    Repeated after commit, in case another request re-cached the old rows in between.
+    """
+    _touch(scopes)
+    transaction.on_commit(lambda: _touch(scopes))
+
+
+def cached_payload(name, scopes, build, vary=''):
+    """
+    Return (data, etag, last_modified) for a read-mostly payload, calling build()
+    only when the payload isn't cached for the current scope stamps. vary covers
+    anything else the payload depends on, such as the host in absolute URLs.
+    """
+    stamps = scope_stamps(scopes)
+    key = 'response:{}:{}:{}'.format(name, vary, ':'.join(f"{scope}@{stamp!r}" for scope, stamp in zip(scopes, stamps)))
+    key = 'response:' + hashlib.sha1(key.encode()).hexdigest()
+    entry = _cache().get(key)
+    if entry is None:
+        data = build()
+        body = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+        entry = (data, hashlib.sha1(body.encode()).hexdigest())
+        _cache().set(key, entry, getattr(settings, 'RESPONSE_CACHE_SECONDS', 300))
+    data, digest = entry
+    return data, quote_etag(digest), max(stamps)
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and math.floor(last_modified) <= if_modified_since
+
+
+def conditional_response(request, data, etag, last_modified):
+    """Response with ETag/Last-Modified validators, or a bare 304 when the client's copy is current."""
+    if _not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(math.floor(last_modified))
+    # Per-user data: browsers may keep it but must revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    return response
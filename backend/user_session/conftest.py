@@ -1,12 +1,86 @@
 import pytest
+from contextlib import contextmanager
 from rest_framework.test import APIClient
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from .models import User, Session, MedicalRecord, Document, Medication, Appointment, Notification
-from .factories import (
+from .factory_utils import (
     UserFactory, DoctorFactory, SessionFactory, MedicalRecordFactory, 
     DocumentFactory, MedicationFactory, AppointmentFactory, NotificationFactory
 )
 
+# Most SQL queries one request to each endpoint (method, URL name) may run, whatever
+# the number of rows. Every test client request is checked against this table,
+# so an N+1 regression fails the suite as soon as a test lists two rows.
+QUERY_BUDGETS = {
+    ('GET', 'appointment-list'): 2,
+    ('GET', 'user-appointments'): 2,
+    ('GET', 'appointment-detail'): 1,
+    ('GET', 'notification-list'): 1,
+    ('GET', 'unread-notifications'): 2,
+    ('GET', 'unread-notification-count'): 1,
+    ('GET', 'medical-record-list'): 2,
+    ('GET', 'document-list'): 2,
+    ('GET', 'medication-list'): 2,
+    ('GET', 'get_records'): 4,
+    ('GET', 'get_user_records'): 4,
+    ('GET', 'dashboard'): 8,
+}
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'query_budget(n): override the endpoint query budget for this test')
+    config.addinivalue_line('markers', 'no_query_budget: skip endpoint query budget checks')
+
+
+def _format_queries(captured):
+    return '\n'.join(f"  {i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, 1))
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager failing the test when the block runs more than n queries."""
+    @contextmanager
+    def budget(n):
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        if len(captured) > n:
+            pytest.fail(f"{len(captured)} queries run, budget is {n}:\n{_format_queries(captured)}")
+    return budget
+
+
+@pytest.fixture(autouse=True)
+def endpoint_query_budgets(request, monkeypatch):
+    """Check every test client request against QUERY_BUDGETS."""
+    if request.node.get_closest_marker('no_query_budget'):
+        yield
+        return
+    marker = request.node.get_closest_marker('query_budget')
+    override = marker.args[0] if marker else None
+    original = Client.request
+
+    def checked_request(client, **environ):
+        with CaptureQueriesContext(connection) as captured:
+            response = original(client, **environ)
+        match = getattr(response, 'resolver_match', None)
+        endpoint = (environ.get('REQUEST_METHOD'), match.url_name if match else None)
+        limit = override if override is not None else QUERY_BUDGETS.get(endpoint)
+        if limit is not None and len(captured) > limit:
+            pytest.fail(f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} ({match.url_name}) ran "
+                        f"{len(captured)} queries, budget is {limit}:\n{_format_queries(captured)}")
+        return response
+
+    monkeypatch.setattr(Client, 'request', checked_request)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def enable_db_access(db):
+    """Every test in this app talks to the database."""
+    pass
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -0,0 +1,118 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import MedicalRecord, Document, Medication, Session, Appointment, Notification
+from .serializers import (
+    MedicalRecordSerializer, DocumentSerializer, MedicationSerializer,
+    SessionSerializer, AppointmentSerializer, NotificationSerializer,
+)
+from . import caching, notifications
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _records(user, context):
+    documents = Document.objects.filter(user=user).defer('file')
+    return {
+        'records': MedicalRecordSerializer(MedicalRecord.objects.filter(user=user), many=True).data,
+        'documents': DocumentSerializer(documents, many=True, fields=DOCUMENT_FIELDS, context=context).data,
+        'medications': MedicationSerializer(Medication.objects.filter(user=user), many=True).data,
+    }
+
+
+def _sessions(user, context):
+    sessions = Session.objects.filter(user_email=user).order_by('-created_at')
+    return SessionSerializer(sessions, many=True).data
+
+
+def _appointments(user, context):
+    appointments = (
+        Appointment.objects.filter(Q(patient=user) | Q(doctor=user))
+        .select_related('doctor', 'patient')
+        .order_by('-appointment_date', '-start_time')
+    )
+    return AppointmentSerializer(appointments, many=True).data
+
+
+def _notifications(user, context):
+    unread = Notification.objects.filter(user=user, read=False).order_by('-created_at')
+    return {
+        'unread_count': notifications.unread_count(user.id),
+        'unread': NotificationSerializer(unread, many=True).data,
+    }
+
+
+# Document bodies live in the blob store; the dashboard only links to them
+DOCUMENT_FIELDS = ['id', 'user', 'title', 'type', 'date', 'content_type', 'size', 'file_url']
+
+SECTIONS = {
+    'records': _records,
+    'sessions': _sessions,
+    'appointments': _appointments,
+    'notifications': _notifications,
+}
+
+# Each section is cached under the user's scope for it (see caching.py), so the
+# signals that retire cached responses retire dashboard sections too
+SECTION_SCOPES = {
+    'records': caching.records_scope,
+    'sessions': caching.sessions_scope,
+    'appointments': caching.appointments_scope,
+    'notifications': caching.notifications_scope,
+}
+
+
+def cache_key(user_id, section, stamp):
+    return f"dashboard:{user_id}:{section}@{stamp!r}"
+
+
+def invalidate(user_id, *sections):
+    """Retire cached dashboard sections for a user (all sections if none are given)."""
+    caching.invalidate(*[SECTION_SCOPES[section](user_id) for section in (sections or SECTIONS)])
+
+
+def _run_in_thread(builder, user, context):
+    try:
+        return builder(user, context)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def _parallel():
+    # SQLite serializes access anyway and test transactions are not visible
+    # from other connections, so only fan out on a client/server database
+    return getattr(settings, 'DASHBOARD_PARALLEL', True) and connection.vendor != 'sqlite'
+
+
+def build_dashboard(user, sections=None, context=None):
+    """
+    Assemble the dashboard payload for a user. Each section is cached on its
+    own, so a new notification only rebuilds the notification section. Missing
+    sections are built concurrently when the database allows it.
+    """
+    sections = [name for name in (sections or SECTIONS) if name in SECTIONS]
+    timeout = getattr(settings, 'DASHBOARD_CACHE_SECONDS', 60)
+    stamps = caching.scope_stamps([SECTION_SCOPES[name](user.id) for name in sections])
+    keys = {name: cache_key(user.id, name, stamp) for name, stamp in zip(sections, stamps)}
+    cached = cache.get_many(keys.values())
+    payload = {name: cached[keys[name]] for name in sections if keys[name] in cached}
+    missing = [name for name in sections if name not in payload]
+
+    if len(missing) > 1 and _parallel():
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            futures = {name: pool.submit(_run_in_thread, SECTIONS[name], user, context) for name in missing}
+            built = {name: future.result() for name, future in futures.items()}
+    else:
+        built = {name: SECTIONS[name](user, context) for name in missing}
+
+    if built:
+        cache.set_many({keys[name]: data for name, data in built.items()}, timeout)
+    payload.update(built)
+    return payload
@@ -0,0 +1,123 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+
+from .models import User
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_REQUEST_ATTR = '_user_identity_cache'
+
+
+def normalize_email(email):
+    # Email lookups are exact in the database, so only surrounding whitespace
+    # is dropped; folding case here could hand back a different account
+    return (email or '').strip()
+
+
+def cache_key(email):
+    return f"user-identity:{normalize_email(email)}"
+
+
+def generation_key(email):
+    # Cached entries are only valid for the generation they were read under;
+    # forget() starts a new one, so a lookup that read the row before a
+    # change can't put the old values back afterwards
+    return f"user-identity-gen:{normalize_email(email)}"
+
+
+def _generation(email):
+    key = generation_key(email)
+    generation = _cache().get(key)
+    if generation is None:
+        # Never set, or evicted: a fresh token also invalidates anything cached before
+        _cache().add(key, uuid.uuid4().hex, None)
+        generation = _cache().get(key)
+    return generation
+
+
+def _cache():
+    return caches[getattr(settings, 'USER_IDENTITY_CACHE_ALIAS', 'default')]
+
+
+def _request_cache(request):
+    if request is None:
+        return None
+    request = getattr(request, '_request', request)  # Unwrap DRF requests
+    if not hasattr(request, _REQUEST_ATTR):
+        setattr(request, _REQUEST_ATTR, {})
+    return getattr(request, _REQUEST_ATTR)
+
+
+def _to_cache(user):
+    return {field.attname: getattr(user, field.attname) for field in User._meta.concrete_fields}
+
+
+def _from_cache(values):
+    names = list(values)
+    return User.from_db('default', names, [values[name] for name in names])
+
+
+def get_user(email, request=None):
+    """
+    Return the User with this email, checking the request-scoped cache, then the
+    process/shared cache, then the database. Raises User.DoesNotExist.
+    """
+    email = normalize_email(email)
+    per_request = _request_cache(request)
+    if per_request is not None and email in per_request:
+        return per_request[email]
+
+    cached = _cache().get_many([generation_key(email), cache_key(email)])
+    generation = cached.get(generation_key(email))
+    entry = cached.get(cache_key(email))
+    if generation is not None and entry is not None and entry['generation'] == generation:
+        user = _from_cache(entry['values'])
+    else:
+        if generation is None:
+            generation = _generation(email)
+        user = User.objects.get(email=email)
+        entry = {'generation': generation, 'values': _to_cache(user)}
+        timeout = getattr(settings, 'USER_IDENTITY_CACHE_SECONDS', 300)
+        # Only share rows that are committed; runs immediately outside a transaction
+        transaction.on_commit(lambda: _cache().set(cache_key(email), entry, timeout))
+
+    if per_request is not None:
+        per_request[email] = user
+    return user
+
+
+def get_user_or_404(email, request=None, role=None):
+    """get_object_or_404(User, email=..., role=...) served from the identity cache."""
+    try:
+        user = get_user(email, request)
+    except User.DoesNotExist:
+        raise Http404("No User matches the given query.")
+    if role is not None and user.role != role:
+        raise Http404("No User matches the given query.")
+    return user
+
+
+def forget(*emails, request=None):
+    """
+    Invalidate cached identities, now and again once the current transaction
+    commits, by starting a new generation for each email.
+    """
+    keys = [generation_key(email) for email in emails if email]
+    if not keys:
+        return
+
+    def bump():
+        _cache().set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+    per_request = _request_cache(request)
+    if per_request is not None:
+        for email in emails:
+            per_request.pop(normalize_email(email), None)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete read notifications older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention period for all types (overrides NOTIFICATION_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows archived and deleted per transaction')
+        parser.add_argument('--archive', choices=['table', 'file', 'none'], default='table',
+                            help='Where to keep archived notifications')
+        parser.add_argument('--archive-file', help='gzip JSON-lines file used with --archive file')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be removed')
+
+    def handle(self, *args, **options):
+        from user_session.retention import RetentionPolicy, apply_retention
+
+        policies = [RetentionPolicy(options['days'])] if options['days'] is not None else None
+        try:
+            stats = apply_retention(
+                policies=policies,
+                archive=options['archive'],
+                archive_path=options['archive_file'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {stats['deleted']} notifications would be removed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {stats['archived']} and deleted {stats['deleted']} notifications"
+            ))
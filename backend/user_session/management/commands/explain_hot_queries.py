@@ -0,0 +1,84 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+
+def hot_queries():
+    """The filters the busiest views run, with placeholder values (EXPLAIN needs no matching rows)."""
+    from user_session.models import User, Session, MedicalRecord, Document, Medication, Appointment, Notification
+
+    user_id = 1
+    today = timezone.now().date()
+    return [
+        ('user by email', User.objects.filter(email='patient@example.com')),
+        ('unread notifications', Notification.objects.filter(user_id=user_id, read=False).order_by('-created_at')),
+        ('notification list', Notification.objects.filter(user_id=user_id).order_by('-created_at')),
+        ('reminder already sent', Notification.objects.filter(
+            user_id=user_id, type='reminder', medication_id=1, created_at__date=today)),
+        ('retention sweep', Notification.objects.filter(read=True, created_at__lt=timezone.now() - timedelta(days=90))),
+        ('user sessions', Session.objects.filter(user_email_id=user_id).order_by('-created_at')),
+        ('doctor appointments', Appointment.objects.filter(doctor_id=user_id)),
+        ('patient appointments', Appointment.objects.filter(patient_id=user_id)),
+        ('appointment conflict check', Appointment.objects.filter(
+            doctor_id=user_id, appointment_date=today, status='accepted')),
+        ('active medications', Medication.objects.filter(
+            Q(start_date__lte=today) & (Q(end_date__gte=today) | Q(end_date__isnull=True)))),
+        ('medical records page', MedicalRecord.objects.filter(user_id=user_id).order_by('-id')),
+        ('documents page', Document.objects.filter(user_id=user_id).order_by('-id')),
+        ('medications page', Medication.objects.filter(user_id=user_id).order_by('-id')),
+    ]
+
+
+def full_scans(plan, vendor):
+    """Return the tables a query plan reads in full."""
+    if vendor == 'sqlite':
+        return [m.group(1) for line in plan.splitlines()
+                if (m := re.search(r'\bSCAN (\w+)', line)) and 'USING' not in line]
+    if vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    if vendor == 'mysql':
+        return re.findall(r'Table scan on (\w+)', plan)
+    return []
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot query paths and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if any query scans a table')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        explain_options = {}
+        if vendor == 'mysql':
+            explain_options['format'] = 'tree'
+
+        flagged = []
+        with connection.cursor() as cursor:
+            if vendor == 'postgresql':
+                # Small tables make the planner prefer sequential scans; ask whether an index *can* serve the query
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                for name, queryset in hot_queries():
+                    plan = queryset.explain(**explain_options)
+                    scans = full_scans(plan, vendor)
+                    if scans:
+                        flagged.append(name)
+                        self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}: {', '.join(scans)}"))
+                    else:
+                        self.stdout.write(f"ok         {name}")
+                    if options['verbose_plans'] or scans:
+                        self.stdout.write('\n'.join(f"    {line}" for line in plan.splitlines()))
+            finally:
+                if vendor == 'postgresql':
+                    cursor.execute('RESET enable_seqscan')
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"{len(flagged)} hot queries scan a full table: {', '.join(flagged)}")
+        summary = f"{len(flagged)} of {len(hot_queries())} hot queries scan a full table"
+        self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
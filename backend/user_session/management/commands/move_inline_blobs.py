@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Move document files and profile pictures still stored inline in the database into the blob store'
+
+    def handle(self, *args, **options):
+        from user_session.models import Document, User
+
+        moved = 0
+        for document in Document.objects.exclude(file='').iterator(chunk_size=100):
+            document.save(update_fields=['file'])
+            moved += 1
+        for user in User.objects.filter(profile_pic__startswith='data:').iterator(chunk_size=100):
+            user.save(update_fields=['profile_pic'])
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} inline files into the blob store"))
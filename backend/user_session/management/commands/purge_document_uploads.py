@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked document uploads that were abandoned before completion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Remove uploads idle for longer than this')
+
+    def handle(self, *args, **options):
+        from user_session.uploads import purge_stale_uploads
+
+        removed = purge_stale_uploads(max_age=timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} abandoned uploads"))
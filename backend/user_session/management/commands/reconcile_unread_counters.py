@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Repair per-user unread notification counters that drifted from the notification table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Counter rows read per query')
+
+    def handle(self, *args, **options):
+        from user_session.notifications import reconcile_unread_counters
+
+        fixed = reconcile_unread_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled unread counters ({fixed} corrected)"))
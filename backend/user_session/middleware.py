@@ -1,81 +1,105 @@
 import logging
-from django.http import HttpResponse
-from django.utils.deprecation import MiddlewareMixin
+import re
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-class CORSMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        """Process the request before it reaches the view."""
-        # Log request details for debugging
-        logger.debug(f"Request: {request.method} {request.path}")
-        logger.debug(f"Request Origin: {request.headers.get('Origin', 'None')}")
-        
-        # Handle preflight OPTIONS requests
-        if request.method == 'OPTIONS':
-            response = HttpResponse()
-            self._add_cors_headers(response, request)
-            return response
-        return None
-
-    def process_response(self, request, response):
-        """Process the response after the view is called."""
-        self._add_cors_headers(response, request)
-        
-        # Log response for debugging
-        logger.debug(f"Response status: {response.status_code}")
-        logger.debug(f"Response headers: {dict(response.headers)}")
-        
+DEFAULT_ALLOWED_ORIGINS = (
+    'http://localhost:3000',
+    'http://127.0.0.1:3000',
+    'http://127.0.0.1:8000',
+    'https://splendorous-melba-fc5384.netlify.app',
+    'https://devserver-main--splendorous-melba-fc5384.netlify.app',
+)
+
+# Netlify deploy previews and branch deploys of the frontend site (<branch>--<site>.netlify.app)
+DEFAULT_ALLOWED_ORIGIN_REGEXES = (
+    r'^https://([a-z0-9-]+--)?splendorous-melba-fc5384\.netlify\.app$',
+)
+
+DEFAULT_ALLOW_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+DEFAULT_ALLOW_HEADERS = ('Content-Type', 'Authorization', 'X-Requested-With', 'Accept')
+
+
+class CORSMiddleware:
+    """
+    Adds CORS headers to every response and answers preflight requests directly.
+
+    Everything that depends only on settings (origin set, origin patterns,
+    header values) is computed once when the middleware is loaded; the headers
+    for each distinct Origin are computed on first sight and reused.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+        self.allow_all = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+        self.allow_credentials = getattr(settings, 'CORS_ALLOW_CREDENTIALS', True)
+        self.allowed_origins = frozenset(getattr(settings, 'CORS_ALLOWED_ORIGINS', DEFAULT_ALLOWED_ORIGINS))
+        patterns = getattr(settings, 'CORS_ALLOWED_ORIGIN_REGEXES', DEFAULT_ALLOWED_ORIGIN_REGEXES)
+        self.origin_regex = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+
+        methods = getattr(settings, 'CORS_ALLOW_METHODS', DEFAULT_ALLOW_METHODS)
+        allow_headers = getattr(settings, 'CORS_ALLOW_HEADERS', DEFAULT_ALLOW_HEADERS)
+        self.preflight_headers = (
+            ('Access-Control-Allow-Methods', ', '.join(methods)),
+            ('Access-Control-Allow-Headers',
+             allow_headers if isinstance(allow_headers, str) else ', '.join(allow_headers)),
+            ('Access-Control-Max-Age', str(getattr(settings, 'CORS_PREFLIGHT_MAX_AGE', 86400))),
+        )
+        # Responses only differ by Origin when some origins are echoed back
+        self.vary_on_origin = bool(self.allowed_origins or self.origin_regex)
+        self.origin_headers = lru_cache(maxsize=512)(self._origin_headers)
+
+    def _origin_allowed(self, origin):
+        return origin in self.allowed_origins or bool(self.origin_regex and self.origin_regex.match(origin))
+
+    def _origin_headers(self, origin):
+        """Allow-Origin/Credentials headers for one Origin value (cached per origin)."""
+        if origin and self._origin_allowed(origin):
+            headers = (('Access-Control-Allow-Origin', origin),)
+            if self.allow_credentials:
+                headers += (('Access-Control-Allow-Credentials', 'true'),)
+            return headers
+        if self.allow_all or not origin:
+            # Wildcard responses can't carry credentials
+            return (('Access-Control-Allow-Origin', '*'),)
+        return ()
+
+    def _apply(self, response, origin):
+        for name, value in self.origin_headers(origin):
+            response[name] = value
+        if self.vary_on_origin:
+            patch_vary_headers(response, ('Origin',))
         return response
 
-    def _add_cors_headers(self, response, request):
-        """Add CORS headers to the response."""
-        # Get origin from request
+    def _preflight(self, origin):
+        response = HttpResponse()
+        for name, value in self.preflight_headers:
+            response[name] = value
+        return self._apply(response, origin)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
         origin = request.headers.get('Origin', '')
-        
-        # Get allowed origins from Django settings if available
-        allowed_origins = getattr(settings, 'CORS_ALLOWED_ORIGINS', [
-            'http://localhost:3000',
-            'http://127.0.0.1:3000',
-            'http://127.0.0.1:8000',
-            'https://splendorous-melba-fc5384.netlify.app',
-            'https://devserver-main--splendorous-melba-fc5384.netlify.app',
-        ])
-        
-        # Also support the CORS_ALLOW_ALL_ORIGINS setting
-        allow_all = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
-        
-        # Check for netlify.app origins and add them if needed
-        if 'netlify.app' in origin and origin not in allowed_origins:
-            allowed_origins.append(origin)
-            logger.info(f"Auto-adding Netlify origin to allowed list: {origin}")
-        
-        # Set CORS headers based on settings and request
-        if origin in allowed_origins:
-            response['Access-Control-Allow-Origin'] = origin
-            response['Access-Control-Allow-Credentials'] = 'true'
-        elif allow_all or not origin:
-            # If CORS_ALLOW_ALL_ORIGINS is True, use wildcard (not for credentials)
-            response['Access-Control-Allow-Origin'] = '*'
-        
-        # Get allowed methods and headers from settings
-        allowed_methods = getattr(settings, 'CORS_ALLOW_METHODS', [
-            'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'
-        ])
-        allowed_headers = getattr(settings, 'CORS_ALLOW_HEADERS', [
-            'Content-Type', 'Authorization', 'X-Requested-With', 'Accept'
-        ])
-        
-        # Set the headers
-        response['Access-Control-Allow-Methods'] = ', '.join(allowed_methods)
-        
-        # Handle headers differently based on the CORS spec
-        if isinstance(allowed_headers, list):
-            response['Access-Control-Allow-Headers'] = ', '.join(allowed_headers)
-        else:
-            # If it's a wildcard or non-list, pass it through
-            response['Access-Control-Allow-Headers'] = allowed_headers
-            
-        response['Access-Control-Max-Age'] = '86400'  # 24 hours 
\ No newline at end of file
+        if request.method == 'OPTIONS':
+            return self._preflight(origin)
+        return self._apply(self.get_response(request), origin)
+
+    async def __acall__(self, request):
+        origin = request.headers.get('Origin', '')
+        if request.method == 'OPTIONS':
+            return self._preflight(origin)
+        return self._apply(await self.get_response(request), origin)
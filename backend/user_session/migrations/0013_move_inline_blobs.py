@@ -0,0 +1,52 @@
+import base64
+
+from django.db import migrations
+
+
+def move_inline_blobs(apps, schema_editor):
+    """Move inline document files and profile pictures into the blob store."""
+    from user_session.blobstore import store_inline
+
+    Document = apps.get_model('user_session', 'Document')
+    User = apps.get_model('user_session', 'User')
+
+    for document in Document.objects.exclude(file='').only('id', 'file').iterator(chunk_size=100):
+        key, content_type, size = store_inline(document.file)
+        Document.objects.filter(pk=document.pk).update(blob_key=key, content_type=content_type, size=size, file='')
+
+    for user in User.objects.filter(profile_pic__startswith='data:').only('id', 'profile_pic').iterator(chunk_size=100):
+        key, content_type, _ = store_inline(user.profile_pic)
+        User.objects.filter(pk=user.pk).update(profile_pic_key=key, profile_pic_type=content_type, profile_pic='')
+
+
+def _data_url(key, content_type):
+    from user_session.blobstore import get_blob_store
+
+    data = b''.join(get_blob_store().iter_range(key))
+    return f"data:{content_type or 'application/octet-stream'};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def restore_inline_blobs(apps, schema_editor):
+    """Copy blobs back into the rows as data URLs, the inline form the older code reads."""
+    Document = apps.get_model('user_session', 'Document')
+    User = apps.get_model('user_session', 'User')
+
+    documents = Document.objects.filter(file='').exclude(blob_key='').only('id', 'blob_key', 'content_type')
+    for document in documents.iterator(chunk_size=100):
+        Document.objects.filter(pk=document.pk).update(file=_data_url(document.blob_key, document.content_type))
+
+    users = User.objects.filter(profile_pic='').exclude(profile_pic_key='').only('id', 'profile_pic_key', 'profile_pic_type')
+    for user in users.iterator(chunk_size=100):
+        User.objects.filter(pk=user.pk).update(profile_pic=_data_url(user.profile_pic_key, user.profile_pic_type))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_session', '0012_blob_references'),
+    ]
+
+    operations = [
+        # Reversing copies the bytes back inline; the blobs themselves stay in the store
+        migrations.RunPython(move_inline_blobs, restore_inline_blobs),
+    ]
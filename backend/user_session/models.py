@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
@@ -15,17 +17,41 @@ class User(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='patient')
     # You might want to remove or repurpose this field if you're using relational models for records.
     medical_records = models.JSONField(default=list, null=True, blank=True)
+    # Inline data URLs sent by clients are moved to the blob store on save
     profile_pic = models.TextField(null=True, blank=True)
+    profile_pic_key = models.CharField(max_length=64, blank=True, default='')
+    profile_pic_type = models.CharField(max_length=100, blank=True, default='')
     verified = models.BooleanField(default=False)
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.profile_pic and self.profile_pic.startswith('data:'):
+            from .blobstore import store_inline
+            self.profile_pic_key, self.profile_pic_type, _ = store_inline(self.profile_pic)
+            self.profile_pic = ''
+            _extend_update_fields(kwargs, 'profile_pic', ['profile_pic_key', 'profile_pic_type'])
+        super().save(*args, **kwargs)
+
+
+def _extend_update_fields(kwargs, trigger, extra):
+    """Make sure blob reference fields are written when save(update_fields=...) touches the inline field."""
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and trigger in update_fields:
+        kwargs['update_fields'] = list(update_fields) + extra
+
 class Session(models.Model):
     user_email = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
     session_chats = models.JSONField(default=list, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A user's chat sessions, newest first
+            models.Index(fields=['user_email', '-created_at'], name='session_user_created_idx'),
+        ]
+
     def __str__(self):
         return f'Session {self.id} for {self.user_email.name}'
 
@@ -64,11 +90,41 @@ class Document(models.Model):
     title = models.CharField(max_length=255)
     type = models.CharField(max_length=50)
     date = models.DateField()
-    file = models.TextField()
+    # Legacy inline payload; moved to the blob store on save, leaving only the reference below
+    file = models.TextField(blank=True, default='')
+    blob_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    size = models.PositiveBigIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.file:
+            from .blobstore import store_inline
+            self.blob_key, self.content_type, self.size = store_inline(self.file)
+            self.file = ''
+            _extend_update_fields(kwargs, 'file', ['blob_key', 'content_type', 'size'])
+        super().save(*args, **kwargs)
+
+class DocumentUpload(models.Model):
+    """An in-progress chunked upload; becomes a Document once every byte has arrived."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_uploads')
+    title = models.CharField(max_length=255)
+    type = models.CharField(max_length=50)
+    date = models.DateField()
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    # Optional client-side SHA-256, checked when the upload is completed
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.received}/{self.size})"
+
 class Medication(models.Model):
     # Optional: associate a medication with a user
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='medications', null=True, blank=True)
@@ -79,6 +135,12 @@ class Medication(models.Model):
     end_date = models.DateField(null=True, blank=True)
     instructions = models.TextField()
 
+    class Meta:
+        indexes = [
+            # Active medications for the daily reminder run
+            models.Index(fields=['start_date', 'end_date'], name='medication_dates_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -123,6 +185,12 @@ class Appointment(models.Model):
     ]
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
+    class Meta:
+        indexes = [
+            # Doctor schedule for a day and the accepted-slot conflict check
+            models.Index(fields=['doctor', 'appointment_date', 'status'], name='appt_doctor_date_status_idx'),
+        ]
+
     def __str__(self):
         return f"Appointment on {self.appointment_date} between {self.patient.email} and {self.doctor.email}"
 
@@ -196,6 +264,52 @@ class Notification(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True)
     medical_record = models.ForeignKey(MedicalRecord, on_delete=models.SET_NULL, null=True, blank=True)
     medication = models.ForeignKey(Medication, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Unread badge, unread list and mark_all_read
+            models.Index(fields=['user', 'read', '-created_at'], name='notif_user_read_created_idx'),
+            # Per-user notification list ordered by newest first
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Retention scan for old read notifications. created_at leads because
+            # boolean filters compile to a bare column test that can't seek an index
+            models.Index(fields=['created_at', 'read'], name='notif_created_read_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.title} - {self.user.name}"
\ No newline at end of file
+        return f"{self.title} - {self.user.name}"
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized unread notification count per user, so badge refreshes are a
+    single indexed lookup instead of counting (or serializing) every unread row.
+    Kept up to date by user_session.notifications and repaired by the
+    reconcile_unread_counters management command.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+
+class NotificationArchive(models.Model):
+    """
+    Compact copy of a read notification removed by the retention job.
+    Only the fields needed for history are kept; related object links are dropped.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    type = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_archive_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} (archived)"
@@ -0,0 +1,201 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from rest_framework.renderers import BaseRenderer
+
+from .models import User, Notification, NotificationCounter
+from .pubsub import get_pubsub, user_channel
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _seed_counter(user_id):
+    """Create the counter for a user from the current unread rows."""
+    count = Notification.objects.filter(user_id=user_id, read=False).count()
+    counter, _ = NotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread': count})
+    return counter.unread
+
+
+def unread_count(user_id):
+    """Return the unread notification count for a user from the denormalized counter."""
+    count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    if count is None:
+        count = _seed_counter(user_id)
+    return count
+
+
+def unread_count_for_email(email):
+    """Unread count looked up by email in one query; None if the user doesn't exist."""
+    count = NotificationCounter.objects.filter(user__email=email).values_list('unread', flat=True).first()
+    if count is None:
+        user_id = User.objects.filter(email=email).values_list('id', flat=True).first()
+        if user_id is None:
+            return None
+        count = _seed_counter(user_id)
+    return count
+
+
+# Counter writes run in the same transaction as the notification change, so
+# they roll back together. A missing counter is seeded from the table, which
+# already includes the row being counted.
+
+def incr_unread(user_id, delta=1):
+    if not NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta):
+        _seed_counter(user_id)
+
+
+def decr_unread(user_id, delta=1):
+    NotificationCounter.objects.filter(user_id=user_id).update(unread=Greatest(F('unread') - delta, 0))
+
+
+def reset_unread(user_id):
+    NotificationCounter.objects.update_or_create(user_id=user_id, defaults={'unread': 0})
+
+
+def mark_read(notification_id, user_id):
+    """
+    Mark one notification read. The conditional update lets only one of several
+    concurrent requests flip the row, so the counter is decremented once.
+    Returns whether this call marked it.
+    """
+    with transaction.atomic():
+        marked = Notification.objects.filter(pk=notification_id, read=False).update(read=True)
+        if marked:
+            decr_unread(user_id)
+    return bool(marked)
+
+
+def mark_all_read(user_id):
+    """
+    Mark every notification of a user read and zero the counter. The counter row
+    is locked first, so a notification created meanwhile waits to bump it until
+    the reset is committed instead of having its increment wiped out.
+    """
+    with transaction.atomic():
+        list(NotificationCounter.objects.select_for_update().filter(user_id=user_id))
+        Notification.objects.filter(user_id=user_id, read=False).update(read=True)
+        reset_unread(user_id)
+
+
+def _recount_unread(user_id):
+    """
+    Set one user's counter from the notification table. The counter row is
+    locked first, so increments committed meanwhile queue behind the write
+    instead of being overwritten. Returns whether the counter changed.
+    """
+    with transaction.atomic():
+        counter = NotificationCounter.objects.select_for_update().filter(user_id=user_id).first()
+        count = Notification.objects.filter(user_id=user_id, read=False).count()
+        if counter is None:
+            _, created = NotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread': count})
+            return created
+        if counter.unread == count:
+            return False
+        NotificationCounter.objects.filter(user_id=user_id).update(unread=count)
+        return True
+
+
+def reconcile_unread_counters(batch_size=1000):
+    """
+    Repair counters that drifted from the notification table (bulk updates,
+    deletes, crashed transactions). Returns the number of counters fixed.
+    A lock-free scan finds the suspects; each is then recounted under its
+    row lock, since counts read earlier may be stale by the time they're written.
+    """
+    actual = dict(
+        Notification.objects.filter(read=False)
+        .values_list('user_id')
+        .annotate(n=Count('id'))
+        .values_list('user_id', 'n')
+    )
+    suspects = set()
+    stored = set()
+    for user_id, unread in NotificationCounter.objects.values_list('user_id', 'unread').iterator(chunk_size=batch_size):
+        stored.add(user_id)
+        if unread != actual.get(user_id, 0):
+            suspects.add(user_id)
+    suspects.update(user_id for user_id in actual if user_id not in stored)
+
+    fixed = sum(_recount_unread(user_id) for user_id in suspects)
+    if fixed:
+        logger.info(f"Reconciled unread counters: {fixed} corrected")
+    return fixed
+
+
+def publish_event(user_id, event, data):
+    """Push an event to every stream the user has open."""
+    try:
+        get_pubsub().publish(user_channel(user_id), {'event': event, 'data': data})
+    except Exception as e:
+        # Push is best effort; clients still see the change on their next fetch
+        logger.error(f"Error publishing {event} for user {user_id}: {e}")
+
+
+def publish_unread_count(user_id):
+    publish_event(user_id, 'unread_count', {'unread_count': unread_count(user_id)})
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def event_stream(user_id, heartbeat=None, max_duration=None):
+    """
+    Generator of SSE frames for a user's notification stream.
+    Starts with the current unread count, then relays published events and
+    emits keep-alive comments while idle. The stream ends after max_duration
+    seconds and the browser's EventSource reconnects on its own.
+    """
+    heartbeat = heartbeat or getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_duration = max_duration or getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+    subscription = get_pubsub().subscribe(user_channel(user_id))
+    try:
+        yield f"retry: {heartbeat * 1000}\n"
+        yield format_sse('unread_count', {'unread_count': unread_count(user_id)})
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=heartbeat)
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield format_sse(message['event'], message['data'])
+    finally:
+        subscription.close()
+
+
+async def async_event_stream(user_id, heartbeat=None, max_duration=None):
+    """Async variant of event_stream for ASGI servers, so an open stream does not pin a worker thread."""
+    from asgiref.sync import sync_to_async
+
+    frames = event_stream(user_id, heartbeat, max_duration)
+    next_frame = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            frame = await next_frame(frames, None)
+            if frame is None:
+                break
+            yield frame
+    finally:
+        try:
+            frames.close()
+        except ValueError:
+            # Still running in the worker thread; it exits at the next heartbeat
+            pass
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate text/event-stream; non-streaming payloads (errors) go out as a single frame."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        event = 'error' if isinstance(data, dict) and 'error' in data else 'message'
+        return format_sse(event, data).encode(self.charset)
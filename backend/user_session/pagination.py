@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecordCursorPagination(CursorPagination):
+    """
+    Cursor pagination for record listings. Cursors stay stable while new rows
+    are added, and each page is an indexed range scan rather than an OFFSET.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+    def __init__(self, cursor_query_param='cursor'):
+        self.cursor_query_param = cursor_query_param
@@ -0,0 +1,129 @@
+import json
+import logging
+import queue
+import threading
+
+from django.conf import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A single subscriber's view of a channel on the in-process broker."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=getattr(settings, 'NOTIFICATION_SUBSCRIBER_BUFFER', 100))
+
+    def get(self, timeout=None):
+        """Return the next message, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+
+class InProcessPubSub:
+    """
+    Publish/subscribe broker that lives inside the worker process.
+    Good enough for a single worker and for tests; use RedisPubSub when
+    notifications must reach clients connected to other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        """Deliver a message to every current subscriber of channel. Returns the receiver count."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # A stalled client must not block the publisher
+                logger.warning(f"Dropping message for slow subscriber on {channel}")
+        return len(subscribers)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+
+class RedisSubscription:
+    """Subscription backed by a Redis PUBSUB connection."""
+
+    def __init__(self, client, channel):
+        self.channel = channel
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(channel)
+
+    def get(self, timeout=None):
+        message = self._pubsub.get_message(timeout=timeout or 0)
+        if not message or message.get('type') != 'message':
+            return None
+        data = message['data']
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def close(self):
+        try:
+            self._pubsub.unsubscribe(self.channel)
+            self._pubsub.close()
+        except Exception as e:
+            logger.error(f"Error closing Redis subscription: {e}")
+
+
+class RedisPubSub:
+    """Redis-compatible broker with the same interface as InProcessPubSub."""
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for the redis backend
+
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        return self.client.publish(channel, json.dumps(message))
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.client, channel)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_pubsub():
+    """Return the process-wide broker selected by NOTIFICATION_PUBSUB_BACKEND."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'NOTIFICATION_PUBSUB_BACKEND', 'inprocess')
+                if backend == 'redis':
+                    _broker = RedisPubSub(getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0'))
+                else:
+                    _broker = InProcessPubSub()
+                logger.info(f"Using {type(_broker).__name__} for notification push")
+    return _broker
+
+
+def user_channel(user_id):
+    return f"notifications:user:{user_id}"
@@ -0,0 +1,129 @@
+import gzip
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = 'table'
+ARCHIVE_FILE = 'file'
+ARCHIVE_NONE = 'none'
+
+
+class RetentionPolicy:
+    """
+    Retention rule for read notifications: rows older than `days` are archived
+    and then deleted in batches. `types` limits the rule to some notification
+    types; None applies it to every type not covered by a more specific rule.
+    """
+
+    def __init__(self, days, types=None):
+        self.days = days
+        self.types = list(types) if types else None
+
+    def __repr__(self):
+        return f"RetentionPolicy(days={self.days}, types={self.types})"
+
+    def queryset(self, now, exclude_types=()):
+        cutoff = now - timedelta(days=self.days)
+        qs = Notification.objects.filter(read=True, created_at__lt=cutoff)
+        if self.types:
+            qs = qs.filter(type__in=self.types)
+        elif exclude_types:
+            qs = qs.exclude(type__in=exclude_types)
+        return qs
+
+
+def policies_from_settings():
+    """
+    Build policies from NOTIFICATION_RETENTION_DAYS, e.g.
+    {'default': 90, 'reminder': 30} keeps reminders for 30 days and everything else for 90.
+    """
+    config = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {'default': 90})
+    if isinstance(config, int):
+        config = {'default': config}
+    policies = [RetentionPolicy(days, types=[notification_type])
+                for notification_type, days in config.items() if notification_type != 'default']
+    if 'default' in config:
+        policies.append(RetentionPolicy(config['default']))
+    return policies
+
+
+def _archive_row(notification):
+    return {
+        'user_id': notification['user_id'],
+        'title': notification['title'],
+        'message': notification['message'],
+        'type': notification['type'],
+        'created_at': notification['created_at'].isoformat(),
+    }
+
+
+def apply_retention(policies=None, archive=ARCHIVE_TABLE, archive_path=None,
+                    batch_size=1000, dry_run=False, now=None):
+    """
+    Archive and delete read notifications that fall outside the retention policies.
+
+    With the table archive each batch is copied and deleted in one transaction,
+    so a crash neither loses rows nor duplicates them. The file archive is written
+    before the delete, so a failure can at worst repeat a batch in the file.
+    Returns {'archived': n, 'deleted': n}.
+    """
+    policies = policies or policies_from_settings()
+    now = now or timezone.now()
+    typed = [t for policy in policies if policy.types for t in policy.types]
+    stats = {'archived': 0, 'deleted': 0}
+
+    if archive == ARCHIVE_FILE and not archive_path:
+        raise ValueError("archive_path is required when archiving to a file")
+
+    for policy in policies:
+        qs = policy.queryset(now, exclude_types=typed)
+        if dry_run:
+            count = qs.count()
+            logger.info(f"{policy}: {count} notifications would be removed")
+            stats['deleted'] += count
+            continue
+
+        while True:
+            rows = list(
+                qs.order_by('pk')
+                .values('pk', 'user_id', 'title', 'message', 'type', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+
+            with transaction.atomic():
+                if archive == ARCHIVE_TABLE:
+                    NotificationArchive.objects.bulk_create([
+                        NotificationArchive(
+                            user_id=row['user_id'],
+                            title=row['title'],
+                            message=row['message'],
+                            type=row['type'],
+                            created_at=row['created_at'],
+                        )
+                        for row in rows
+                    ])
+                elif archive == ARCHIVE_FILE:
+                    with gzip.open(archive_path, 'at', encoding='utf-8') as f:
+                        for row in rows:
+                            f.write(json.dumps(_archive_row(row)) + '\n')
+                if archive != ARCHIVE_NONE:
+                    stats['archived'] += len(rows)
+
+                deleted, _ = Notification.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+                stats['deleted'] += deleted
+
+            if len(rows) < batch_size:
+                break
+
+    logger.info(f"Notification retention finished: {stats}")
+    return stats
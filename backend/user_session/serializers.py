@@ -1,27 +1,90 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import User, Session
-from .models import MedicalRecord, Document, Medication, Appointment, Notification
+from .models import MedicalRecord, Document, DocumentUpload, Medication, Appointment, Notification
+def _absolute_url(serializer, path):
+    request = serializer.context.get('request')
+    return request.build_absolute_uri(path) if request else path
+
 class UserSerializer(serializers.ModelSerializer):
+    # Accepts a data URL on write; reads back as a link to the stored picture
+    profile_pic = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
     class Meta:
         model = User
         fields = ['name', 'email', 'role', 'medical_records', 'profile_pic'] 
 
+    def validate_profile_pic(self, value):
+        if value and not value.startswith('data:'):
+            # The client echoed back the URL we served; keep the stored picture
+            raise serializers.SkipField()
+        return value
+
+    def update(self, instance, validated_data):
+        if 'profile_pic' in validated_data and not validated_data['profile_pic']:
+            instance.profile_pic_key = ''
+            instance.profile_pic_type = ''
+        return super().update(instance, validated_data)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.profile_pic_key:
+            data['profile_pic'] = _absolute_url(self, reverse('user-profile-pic', kwargs={'email': instance.email}))
+        return data
+
 class SessionSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(write_only=True)  # Accept email instead of ID
     class Meta:
         model = Session
         fields = ['id', 'user_email', 'session_chats', 'created_at', 'updated_at']
-class MedicalRecordSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Serializer mixin for sparse fieldsets: pass fields=[...] to limit the output
+    to those fields (unknown names are ignored). field_columns maps computed
+    fields to the model columns they read, for querysets that load only those.
+    """
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class MedicalRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = MedicalRecord
         fields = '__all__'
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Uploads still send the file inline; it is stored as a blob and served from file_url
+    file = serializers.CharField(write_only=True, required=False, allow_blank=True)
+    file_url = serializers.SerializerMethodField()
+    field_columns = {'file_url': ['blob_key']}
+
     class Meta:
         model = Document
         fields = '__all__'
+        read_only_fields = ['blob_key', 'content_type', 'size']
+
+    def get_file_url(self, obj):
+        if not obj.blob_key:
+            return None
+        return _absolute_url(self, reverse('document-download', kwargs={'pk': obj.pk}))
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentUpload
+        fields = ['id', 'title', 'type', 'date', 'size', 'sha256', 'received', 'content_type', 'created_at']
+        read_only_fields = ['id', 'received', 'content_type', 'created_at']
+
+    def validate_sha256(self, value):
+        if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value.lower())):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest")
+        return value.lower()
 
-class MedicationSerializer(serializers.ModelSerializer):
+class MedicationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Medication
         fields = '__all__'
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, MedicalRecord, Document, Medication, Session, Appointment, Notification
+from . import caching, identity, notifications
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    """Bump the unread counter and push new notifications to connected clients once committed."""
+    if not created:
+        return
+    if not instance.read:
+        notifications.incr_unread(instance.user_id)
+
+    def _publish():
+        from .serializers import NotificationSerializer
+        notifications.publish_event(instance.user_id, 'notification', NotificationSerializer(instance).data)
+        notifications.publish_unread_count(instance.user_id)
+
+    transaction.on_commit(_publish)
+
+
+@receiver(post_delete, sender=Notification)
+def drop_deleted_from_unread(sender, instance, **kwargs):
+    """Keep the unread counter in step when an unread notification is deleted."""
+    if not instance.read:
+        notifications.decr_unread(instance.user_id)
+
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_identity(sender, instance, **kwargs):
+    """Email lookups must never return a stale or deleted user."""
+    identity.forget(instance.email)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_responses(sender, instance, **kwargs):
+    scopes = [caching.user_scope(instance.id)]
+    if kwargs.get('created') or 'created' not in kwargs:
+        # A new or deleted user id must not inherit anything cached under it
+        scopes += caching.user_data_scopes(instance.id)
+    if instance.role == 'doctor' or not kwargs.get('created', True):
+        # Doctors appear in the doctor list; an update may also have changed the role
+        scopes.append(caching.DOCTORS_SCOPE)
+    caching.invalidate(*scopes)
+
+
+# Scope each model's rows are cached under (responses and dashboard sections alike),
+# and the fields naming the users whose scope it is
+_USER_DATA_SCOPES = {
+    MedicalRecord: (caching.records_scope, ['user_id']),
+    Document: (caching.records_scope, ['user_id']),
+    Medication: (caching.records_scope, ['user_id']),
+    Session: (caching.sessions_scope, ['user_email_id']),
+    Appointment: (caching.appointments_scope, ['patient_id', 'doctor_id']),
+    Notification: (caching.notifications_scope, ['user_id']),
+}
+
+
+def invalidate_user_data(sender, instance, **kwargs):
+    """Retire everything cached from the scope a changed row belongs to."""
+    scope, user_fields = _USER_DATA_SCOPES[sender]
+    scopes = [scope(user_id) for user_id in (getattr(instance, field) for field in user_fields) if user_id]
+    if scopes:
+        caching.invalidate(*scopes)
+
+
+for _model in _USER_DATA_SCOPES:
+    post_save.connect(invalidate_user_data, sender=_model, dispatch_uid=f'user-data-save-{_model.__name__}')
+    post_delete.connect(invalidate_user_data, sender=_model, dispatch_uid=f'user-data-delete-{_model.__name__}')
@@ -51,7 +51,8 @@ class TestSessionEndpoints:
         response = api_client.post(url, data, format='json')
         
         assert response.status_code == status.HTTP_201_CREATED
-        assert response.data['user_email'] == patient.email
+        # user_email is write-only; the new session belongs to the patient
+        assert patient.sessions.filter(id=response.data['id']).exists()
     
     def test_add_chat_to_session(self, api_client, session):
         """Test adding a chat message to a session"""
@@ -191,8 +192,8 @@ class TestAppointmentEndpoints:
         response = api_client.post(url + f"?email={patient.email}", data, format='json')
         
         assert response.status_code == status.HTTP_201_CREATED
-        assert response.data['patient'] == patient.id
-        assert response.data['doctor'] == doctor.id
+        assert response.data['patient']['id'] == patient.id
+        assert response.data['doctor']['id'] == doctor.id
 
 
 class TestNotificationEndpoints:
@@ -220,7 +221,7 @@ class TestNotificationEndpoints:
         url = reverse('notification-detail', kwargs={'pk': notification.id})
         data = {'read': True}
         
-        response = api_client.patch(url, data, format='json')
+        response = api_client.patch(url + f"?user_email={patient.email}", data, format='json')
         
         assert response.status_code == status.HTTP_200_OK
         assert response.data['read'] is True
\ No newline at end of file
@@ -3,7 +3,8 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from datetime import datetime, timedelta, date
-from .models import User, Session, MedicalRecord, Document, Medication, Appointment, Notification
+from django.utils import timezone
+from .models import User, Session, MedicalRecord, Document, DocumentUpload, Medication, Appointment, Notification, NotificationCounter, NotificationArchive
 import json
 
 class UserViewSetTests(APITestCase):
@@ -221,15 +222,86 @@ class RecordsViewTests(APITestCase):
         self.client = APIClient()
         
     def test_get_records(self):
-        """Test getting all records"""
+        """Test getting all records for a user"""
         url = reverse('get_records')
         
-        response = self.client.get(url)
+        response = self.client.get(url, {'email': self.user.email})
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['records']), 1)
         self.assertEqual(len(response.data['documents']), 1)
         self.assertEqual(len(response.data['medications']), 1)
+        # Document bodies are left out unless requested
+        self.assertNotIn('file', response.data['documents'][0])
+
+    def test_get_records_requires_email(self):
+        """Test records are never listed across all users"""
+        response = self.client.get(reverse('get_records'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_records_scoped_to_user(self):
+        """Test another user's records are not returned"""
+        MedicalRecord.objects.create(
+            user=self.doctor, date=date.today(), type="Other", doctor="Dr. Who",
+            findings="-", recommendations="-"
+        )
+        response = self.client.get(reverse('get_records'), {'email': self.user.email})
+        self.assertEqual(len(response.data['records']), 1)
+
+    def test_get_records_sparse_fields(self):
+        """Test sparse fieldsets, including asking for document bodies"""
+        url = reverse('get_records')
+        response = self.client.get(url, {'email': self.user.email, 'type': 'documents', 'fields': 'id,title,file_url'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'file_url'})
+
+        response = self.client.get(url, {'email': self.user.email, 'fields[medications]': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {'email': self.user.email, 'fields': 'id,nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('nope', response.data['error'])
+
+        # A shared name only has to exist in one of the requested types
+        response = self.client.get(url, {'email': self.user.email, 'fields': 'id,title,name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sparse_computed_field_loads_its_columns(self):
+        """Test fields=file_url loads blob_key with the page instead of once per row"""
+        from django.core.cache import cache
+        for i in range(3):
+            Document.objects.create(user=self.user, title=f"Scan {i}", type="Imaging", date=date.today(),
+                                    blob_key=f"{i:064x}")
+        cache.clear()
+        url = reverse('get_records')
+        with self.assertNumQueries(2):  # user + page
+            response = self.client.get(url, {'email': self.user.email, 'type': 'documents', 'fields': 'file_url'})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertTrue(response.data['results'][0]['file_url'])
+
+    def test_get_records_cursor_pagination(self):
+        """Test walking a record type page by page"""
+        for i in range(4):
+            Medication.objects.create(
+                user=self.user, name=f"Med {i}", dosage="1mg", frequency="Daily",
+                start_date=date.today(), instructions="-"
+            )
+        url = reverse('get_records')
+        response = self.client.get(url, {'email': self.user.email, 'type': 'medications', 'page_size': 3})
+        names = [m['name'] for m in response.data['results']]
+        self.assertEqual(len(names), 3)
+
+        response = self.client.get(response.data['next'])
+        names += [m['name'] for m in response.data['results']]
+        self.assertEqual(len(set(names)), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_get_records_stream(self):
+        """Test the streaming variant returns every type as JSON"""
+        response = self.client.get(reverse('get_records'), {'email': self.user.email, 'stream': '1'})
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(payload['records']), 1)
+        self.assertEqual(payload['documents'][0]['title'], 'Blood Test')
+        self.assertNotIn('file', payload['documents'][0])
         
     def test_get_user_records(self):
         """Test getting records for a specific user"""
@@ -319,6 +391,21 @@ class AppointmentViewSetTests(APITestCase):
         
         self.client = APIClient()
         
+    def test_list_appointments_query_count(self):
+        """Test listing appointments does not query doctor and patient per row"""
+        for hour in range(10, 20):
+            Appointment.objects.create(
+                patient=self.patient,
+                doctor=User.objects.create(name=f"Dr. {hour}", email=f"dr{hour}@example.com", role="doctor"),
+                appointment_date=date.today() + timedelta(days=5),
+                start_time=f"{hour}:00:00",
+                end_time=f"{hour}:30:00",
+            )
+        # One query for the user, one for the appointments with both users joined
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('appointment-list'), {'email': self.patient.email})
+        self.assertEqual(len(response.data), 11)
+
     def test_create_appointment(self):
         """Test creating a new appointment"""
         url = reverse('appointments-list')
@@ -694,4 +781,654 @@ class NotificationViewSetTests(APITestCase):
             type="reminder",
             medication=medication
         ).exists()
-        self.assertTrue(reminder_exists)
\ No newline at end of file
+        self.assertTrue(reminder_exists)
+
+class NotificationPushTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            name="Push User",
+            email="push@example.com",
+            role="patient"
+        )
+        self.client = APIClient()
+
+    def test_unread_count(self):
+        """Test the unread count endpoint follows creation and mark-all-read"""
+        url = reverse('unread-notification-count')
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, title="One", message="First", type="reminder")
+
+        response = self.client.get(url, {'user_email': self.user.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, title="Two", message="Second", type="reminder")
+        response = self.client.get(url, {'user_email': self.user.email})
+        self.assertEqual(response.data['unread_count'], 2)
+
+        self.client.patch(f"/api/user/notifications/mark_all_read/?user_email={self.user.email}")
+        response = self.client.get(url, {'user_email': self.user.email})
+        self.assertEqual(response.data['unread_count'], 0)
+
+    def test_unread_count_unknown_user(self):
+        """Test the unread count endpoint for a user that doesn't exist"""
+        response = self.client.get(reverse('unread-notification-count'), {'user_email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_new_notification_is_published(self):
+        """Test creating a notification pushes it to subscribers"""
+        from .pubsub import get_pubsub, user_channel
+
+        subscription = get_pubsub().subscribe(user_channel(self.user.id))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, title="Pushed", message="Hello", type="reminder")
+            message = subscription.get(timeout=1)
+            self.assertEqual(message['event'], 'notification')
+            self.assertEqual(message['data']['title'], 'Pushed')
+            self.assertEqual(subscription.get(timeout=1)['data']['unread_count'], 1)
+        finally:
+            subscription.close()
+
+    def test_stream_starts_with_unread_count(self):
+        """Test the SSE stream opens with the current unread count"""
+        Notification.objects.create(user=self.user, title="Waiting", message="Unread", type="reminder")
+
+        response = self.client.get(reverse('notification-stream'), {'user_email': self.user.email},
+                                   HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = iter(response.streaming_content)
+        next(frames)  # retry hint
+        first_event = next(frames).decode()
+        response.close()
+        self.assertIn('event: unread_count', first_event)
+        self.assertIn('"unread_count": 1', first_event)
+
+
+class NotificationCounterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            name="Counter User",
+            email="counter@example.com",
+            role="patient"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = Notification.objects.create(user=self.user, title="One", message="First", type="reminder")
+            self.second = Notification.objects.create(user=self.user, title="Two", message="Second", type="reminder")
+        self.client = APIClient()
+
+    def test_counter_tracks_creation(self):
+        """Test the denormalized counter is bumped for each new notification"""
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+
+    def test_mark_read_decrements(self):
+        """Test marking one notification read decrements the counter once"""
+        url = f"/api/user/notifications/{self.first.id}/mark_read/?user_email={self.user.email}"
+        self.client.patch(url)
+        self.client.patch(url)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+
+    def test_concurrent_mark_read_decrements_once(self):
+        """Test a second request that loaded the row before the first marked it doesn't decrement again"""
+        from user_session import notifications
+        stale = Notification.objects.get(pk=self.first.pk)
+        self.assertTrue(notifications.mark_read(self.first.pk, self.user.id))
+        self.assertFalse(stale.read)
+        self.assertFalse(notifications.mark_read(stale.pk, stale.user_id))
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+
+    def test_generic_update_of_read_adjusts_counter(self):
+        """Test a plain PATCH of read keeps the counter in step"""
+        url = reverse('notification-detail', kwargs={'pk': self.first.id}) + f"?user_email={self.user.email}"
+        self.client.patch(url, {'read': True}, format='json')
+        self.client.patch(url, {'read': True}, format='json')
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+        self.client.patch(url, {'read': False}, format='json')
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+
+    def test_delete_unread_decrements(self):
+        """Test deleting an unread notification decrements the counter"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.delete()
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+
+    def test_reconcile_repairs_drift(self):
+        """Test the reconciliation job repairs a counter that drifted"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        # Bulk updates bypass the counter
+        Notification.objects.filter(pk=self.first.pk).update(read=True)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+
+        out = StringIO()
+        call_command('reconcile_unread_counters', stdout=out)
+        self.assertIn('1 corrected', out.getvalue())
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+
+    def test_unread_count_is_single_query(self):
+        """Test the badge endpoint costs one query once the counter exists"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('unread-notification-count'), {'user_email': self.user.email})
+        self.assertEqual(response.data['unread_count'], 2)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            name="Retention User",
+            email="retention@example.com",
+            role="patient"
+        )
+        old = timezone.now() - timedelta(days=120)
+        self.old_read = Notification.objects.create(user=self.user, title="Old read", message="m", type="appointment", read=True)
+        self.old_unread = Notification.objects.create(user=self.user, title="Old unread", message="m", type="appointment")
+        self.old_reminder = Notification.objects.create(user=self.user, title="Old reminder", message="m", type="reminder", read=True)
+        self.recent_read = Notification.objects.create(user=self.user, title="Recent read", message="m", type="appointment", read=True)
+        Notification.objects.filter(pk__in=[self.old_read.pk, self.old_unread.pk]).update(created_at=old)
+        Notification.objects.filter(pk=self.old_reminder.pk).update(created_at=timezone.now() - timedelta(days=45))
+
+    def test_compact_archives_old_read_notifications(self):
+        """Test the retention job archives old read notifications and keeps the rest"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        out = StringIO()
+        call_command('compact_notifications', batch_size=1, stdout=out)
+
+        remaining = set(Notification.objects.values_list('title', flat=True))
+        self.assertEqual(remaining, {'Old unread', 'Recent read'})
+        archived = set(NotificationArchive.objects.values_list('title', flat=True))
+        self.assertEqual(archived, {'Old read', 'Old reminder'})
+        self.assertIn('Archived 2', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        """Test a dry run only reports"""
+        from user_session.retention import apply_retention
+
+        stats = apply_retention(dry_run=True)
+        self.assertEqual(stats['deleted'], 2)
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(NotificationArchive.objects.count(), 0)
+
+    def test_file_archive(self):
+        """Test archiving to a gzip JSON-lines file"""
+        import gzip
+        import os
+        import tempfile
+        from user_session.retention import RetentionPolicy, apply_retention
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'archive.jsonl.gz')
+            stats = apply_retention([RetentionPolicy(60)], archive='file', archive_path=path)
+            with gzip.open(path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(stats, {'archived': 1, 'deleted': 1})
+        self.assertEqual(rows[0]['title'], 'Old read')
+
+
+class BlobStoreTests(APITestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(BLOB_STORE_BACKEND='local', BLOB_STORE_ROOT=self.tmpdir.name)
+        self.settings_override.enable()
+        self.user = User.objects.create(name="Test User", email="test@example.com", role="patient")
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def _upload(self, payload, title='Scan'):
+        import base64
+        data = {
+            'title': title,
+            'type': 'Imaging',
+            'date': date.today().isoformat(),
+            'file': 'data:application/pdf;base64,' + base64.b64encode(payload).decode(),
+        }
+        return self.client.post(reverse('patient-upload-document') + f"?email={self.user.email}", data, format='json')
+
+    def test_upload_then_download(self):
+        """Test uploaded bytes are kept out of the row and served back unchanged"""
+        payload = b'%PDF-1.4 ' + bytes(range(256)) * 10
+        response = self._upload(payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('file', response.data)
+
+        document = Document.objects.get()
+        self.assertEqual(document.file, '')
+        self.assertEqual(document.size, len(payload))
+        self.assertEqual(document.content_type, 'application/pdf')
+
+        response = self.client.get(reverse('document-download', kwargs={'pk': document.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), payload)
+        self.assertEqual(response['ETag'], f'"{document.blob_key}"')
+
+    def test_identical_uploads_share_a_blob(self):
+        """Test the same content is stored once"""
+        self._upload(b'%PDF-same', title='First')
+        self._upload(b'%PDF-same', title='Second')
+        keys = set(Document.objects.values_list('blob_key', flat=True))
+        self.assertEqual(len(keys), 1)
+
+    def test_range_and_revalidation(self):
+        """Test partial content and 304 responses"""
+        payload = b'%PDF' + b'x' * 1000
+        self._upload(payload)
+        document = Document.objects.get()
+        url = reverse('document-download', kwargs={'pk': document.pk})
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), payload[:10])
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(payload)}')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{document.blob_key}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(payload) + 10}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_profile_pic_offloaded(self):
+        """Test a data URL profile picture is replaced by a link"""
+        import base64
+        image = b'\x89PNG\r\n\x1a\n' + b'0' * 64
+        url = reverse('user-detail', kwargs={'email': self.user.email})
+        response = self.client.patch(url, {'profile_pic': 'data:image/png;base64,' + base64.b64encode(image).decode()},
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['profile_pic'].endswith(
+            reverse('user-profile-pic', kwargs={'email': self.user.email})))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_pic, '')
+        self.assertEqual(self.user.profile_pic_type, 'image/png')
+
+        response = self.client.get(reverse('user-profile-pic', kwargs={'email': self.user.email}))
+        self.assertEqual(b''.join(response.streaming_content), image)
+
+    def test_malformed_data_url_is_kept(self):
+        """Test a data URL with broken base64 is stored as text instead of failing"""
+        from .blobstore import decode_inline
+        data, content_type = decode_inline('data:application/pdf;base64,abc')
+        self.assertEqual(data, b'data:application/pdf;base64,abc')
+        self.assertEqual(content_type, 'application/octet-stream')
+
+    def test_inline_row_is_served_read_only(self):
+        """Test downloading a row that still holds its file inline doesn't write, and the command moves it"""
+        import base64
+        from django.core.management import call_command
+        from io import StringIO
+        payload = b'%PDF-legacy'
+        document = Document.objects.create(user=self.user, title='Old', type='Imaging', date=date.today())
+        Document.objects.filter(pk=document.pk).update(file=base64.b64encode(payload).decode())
+
+        response = self.client.get(reverse('document-download', kwargs={'pk': document.pk}))
+        self.assertEqual(response.content, payload)
+        document.refresh_from_db()
+        self.assertNotEqual(document.file, '')
+
+        call_command('move_inline_blobs', stdout=StringIO())
+        document.refresh_from_db()
+        self.assertEqual((document.file, document.size), ('', len(payload)))
+
+    def test_missing_blob_is_404(self):
+        """Test a document whose blob has gone missing answers 404"""
+        from .blobstore import get_blob_store
+        self._upload(b'%PDF-gone')
+        document = Document.objects.get()
+        get_blob_store().delete(document.blob_key)
+        response = self.client.get(reverse('document-download', kwargs={'pk': document.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChunkedUploadTests(APITestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(BLOB_STORE_BACKEND='local', BLOB_STORE_ROOT=self.tmpdir.name,
+                                                   DOCUMENT_UPLOAD_CHUNK_BYTES=1024)
+        self.settings_override.enable()
+        self.patient = User.objects.create(name="John Doe", email="patient@example.com", role="patient")
+        self.payload = b'%PDF-1.7\n' + bytes(range(256)) * 8
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmpdir.cleanup()
+
+    def _start(self, **extra):
+        data = {'title': 'CT Scan', 'type': 'Imaging', 'date': date.today().isoformat(), 'size': len(self.payload)}
+        data.update(extra)
+        return self.client.post(reverse('document-upload-list') + f"?email={self.patient.email}", data, format='json')
+
+    def _put(self, upload_id, offset, body):
+        return self.client.generic('PUT', reverse('document-upload-detail', kwargs={'pk': upload_id}), body,
+                                   content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunked_upload(self):
+        """Test a file sent in chunks becomes a Document with the same bytes"""
+        import hashlib
+        response = self._start(sha256=hashlib.sha256(self.payload).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data['id']
+
+        for offset in range(0, len(self.payload), 1000):
+            response = self._put(upload_id, offset, self.payload[offset:offset + 1000])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], len(self.payload))
+
+        response = self.client.post(reverse('document-upload-complete', kwargs={'pk': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        document = Document.objects.get()
+        self.assertEqual(document.user, self.patient)
+        self.assertEqual(document.content_type, 'application/pdf')
+        self.assertEqual(document.blob_key, hashlib.sha256(self.payload).hexdigest())
+
+        response = self.client.get(reverse('document-download', kwargs={'pk': document.pk}))
+        self.assertEqual(b''.join(response.streaming_content), self.payload)
+
+    def test_resume_after_offset_mismatch(self):
+        """Test a chunk at the wrong offset is refused with the offset to resume from"""
+        upload_id = self._start().data['id']
+        self._put(upload_id, 0, self.payload[:500])
+
+        response = self._put(upload_id, 900, self.payload[900:1400])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '500')
+
+        # A fresh process has no running hash; it is rebuilt from the part file
+        from user_session import uploads
+        uploads._hashers.clear()
+        response = self.client.get(reverse('document-upload-detail', kwargs={'pk': upload_id}))
+        offset = response.data['received']
+        self._put(upload_id, offset, self.payload[offset:offset + 1000])
+        self._put(upload_id, offset + 1000, self.payload[offset + 1000:])
+        response = self.client.post(reverse('document-upload-complete', kwargs={'pk': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_validation(self):
+        """Test size, chunk and type limits are enforced while streaming"""
+        response = self._start(size=10 ** 12)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        upload_id = self._start().data['id']
+        response = self._put(upload_id, 0, b'MZ\x90\x00 not a document')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        response = self._put(upload_id, 0, self.payload[:2000])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        response = self.client.post(reverse('document-upload-complete', kwargs={'pk': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Document.objects.count(), 0)
+
+    def test_checksum_mismatch(self):
+        """Test a corrupted upload is discarded"""
+        upload_id = self._start(sha256='0' * 64).data['id']
+        for offset in range(0, len(self.payload), 1000):
+            self._put(upload_id, offset, self.payload[offset:offset + 1000])
+        response = self.client.post(reverse('document-upload-complete', kwargs={'pk': upload_id}))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertFalse(DocumentUpload.objects.exists())
+
+
+class DashboardTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.patient = User.objects.create(name="John Doe", email="patient@example.com", role="patient")
+        self.doctors = [
+            User.objects.create(name=f"Dr. {i}", email=f"doctor{i}@example.com", role="doctor") for i in range(5)
+        ]
+        for doctor in self.doctors:
+            Appointment.objects.create(
+                patient=self.patient, doctor=doctor, appointment_date=date.today(),
+                start_time="09:00", end_time="09:30",
+            )
+        MedicalRecord.objects.create(user=self.patient, date=date.today(), type="Physical", doctor="Dr. 0",
+                                     findings="Good health", recommendations="Rest")
+        Session.objects.create(user_email=self.patient, session_chats=[])
+        Notification.objects.create(user=self.patient, title="Hello", message="Welcome", type="reminder")
+        self.client = APIClient()
+        self.url = reverse('dashboard')
+
+    def test_dashboard_payload(self):
+        """Test all sections come back in one response"""
+        response = self.client.get(self.url, {'email': self.patient.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['appointments']), 5)
+        self.assertEqual(response.data['appointments'][0]['patient']['email'], self.patient.email)
+        self.assertEqual(len(response.data['records']['records']), 1)
+        self.assertEqual(len(response.data['sessions']), 1)
+        notifications = response.data['notifications']
+        self.assertEqual(notifications['unread_count'], len(notifications['unread']))
+        self.assertEqual(response.data['user']['email'], self.patient.email)
+
+    def test_query_count_independent_of_rows(self):
+        """Test appointments are loaded with their doctor and patient in one query"""
+        # user + records(3) + sessions + appointments + unread count + unread list
+        with self.assertNumQueries(8):
+            self.client.get(self.url, {'email': self.patient.email})
+
+    def test_sections_are_cached_and_invalidated(self):
+        """Test cached sections are reused until a related row changes"""
+        self.client.get(self.url, {'email': self.patient.email})
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'email': self.patient.email})
+
+        Medication.objects.create(user=self.patient, name="Aspirin", dosage="100mg", frequency="Daily",
+                                  start_date=date.today(), instructions="With food")
+        response = self.client.get(self.url, {'email': self.patient.email, 'sections': 'records'})
+        self.assertEqual(len(response.data['records']['medications']), 1)
+        self.assertNotIn('appointments', response.data)
+
+    def test_sections_share_response_scopes(self):
+        """Test invalidating a caching scope retires the dashboard section built from it"""
+        from user_session import caching
+        self.client.get(self.url, {'email': self.patient.email})
+        Notification.objects.filter(user=self.patient).update(read=True)
+        caching.invalidate(caching.notifications_scope(self.patient.id))
+        response = self.client.get(self.url, {'email': self.patient.email, 'sections': 'notifications'})
+        self.assertEqual(response.data['notifications']['unread'], [])
+
+    def test_dashboard_requires_email(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserIdentityCacheTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create(name="John Doe", email="patient@example.com", role="patient")
+
+    def tearDown(self):
+        # Entries written by _warm outlive the test transaction
+        from django.core.cache import cache
+        cache.clear()
+
+    def _warm(self, email):
+        from user_session import identity
+        with self.captureOnCommitCallbacks(execute=True):
+            return identity.get_user(email)
+
+    def test_lookup_is_cached(self):
+        """Test a second lookup is served without a query"""
+        from user_session import identity
+        self._warm(' patient@example.com ')
+        with self.assertNumQueries(0):
+            user = identity.get_user('patient@example.com')
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.role, 'patient')
+
+    def test_request_scope(self):
+        """Test repeated lookups within one request hit the database once"""
+        from django.test import RequestFactory
+        from user_session import identity
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            first = identity.get_user('patient@example.com', request)
+            second = identity.get_user_or_404('patient@example.com', request)
+        self.assertIs(first, second)
+
+    def test_invalidated_on_update_and_delete(self):
+        """Test email changes and deletes are never served from the cache"""
+        from django.http import Http404
+        from user_session import identity
+        self._warm('patient@example.com')
+        response = self.client.patch(reverse('user-detail', kwargs={'email': 'patient@example.com'}),
+                                     {'email': 'renamed@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertRaises(User.DoesNotExist):
+            identity.get_user('patient@example.com')
+
+        self._warm('renamed@example.com')
+        User.objects.get(pk=self.user.pk).delete()
+        with self.assertRaises(Http404):
+            identity.get_user_or_404('renamed@example.com')
+
+    def test_stale_write_after_forget_is_ignored(self):
+        """Test a lookup that read the row before a change can't cache the old values"""
+        from user_session import identity
+        with self.captureOnCommitCallbacks() as callbacks:
+            identity.get_user('patient@example.com')
+        User.objects.filter(pk=self.user.pk).update(role='doctor')
+        identity.forget('patient@example.com')
+        for callback in callbacks:
+            callback()  # the slow reader's commit lands after the invalidation
+        self.assertEqual(identity.get_user('patient@example.com').role, 'doctor')
+
+    def test_role_is_checked(self):
+        from django.http import Http404
+        from user_session import identity
+        with self.assertRaises(Http404):
+            identity.get_user_or_404('patient@example.com', role='doctor')
+
+
+class DatabaseProfileTests(TestCase):
+    def test_profiles_from_environment(self):
+        """Test DB_ENGINE selects the backend and its connection settings"""
+        from unittest import mock
+        from LLMediCare.database import database_config
+
+        with mock.patch.dict('os.environ', {'DB_ENGINE': 'postgres', 'DB_NAME': 'medicare', 'DB_CONN_MAX_AGE': '120'}):
+            config = database_config('/srv')['default']
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['NAME'], 'medicare')
+        self.assertEqual(config['CONN_MAX_AGE'], 120)
+
+        with mock.patch.dict('os.environ', {'DB_ENGINE': 'mysql'}):
+            self.assertEqual(database_config('/srv')['default']['OPTIONS']['charset'], 'utf8mb4')
+
+        with mock.patch.dict('os.environ', {'DB_ENGINE': 'sqlite'}):
+            self.assertEqual(database_config('/srv')['default']['NAME'], '/srv/db.sqlite3')
+
+    def test_sqlite_pragmas_applied(self):
+        """Test new SQLite connections get the busy timeout"""
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+
+class HotQueryIndexTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        """Test every hot query path is served by an index"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('explain_hot_queries', '--fail-on-scan', stdout=out)
+        self.assertIn('0 of', out.getvalue())
+
+
+class CachedResponseTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.patient = User.objects.create(name="John Doe", email="patient@example.com", role="patient")
+        self.doctor = User.objects.create(name="Dr. Smith", email="doctor@example.com", role="doctor")
+        self.client = APIClient()
+
+    def test_user_records_conditional_get(self):
+        """Test unchanged records revalidate with a 304 and changes produce a new ETag"""
+        url = reverse('get_user_records')
+        response = self.client.get(url, {'email': self.patient.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        # Served from the cache: only the user lookup reaches the database
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'email': self.patient.email}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Medication.objects.create(user=self.patient, name="Aspirin", dosage="100mg", frequency="Daily",
+                                  start_date=date.today(), instructions="With food")
+        response = self.client.get(url, {'email': self.patient.email}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['medications']), 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_doctor_list_invalidated(self):
+        """Test the cached doctor list picks up new doctors"""
+        url = reverse('doctors-list')
+        self.assertEqual(len(self.client.get(url).data), 1)
+        User.objects.create(name="Dr. Who", email="who@example.com", role="doctor")
+        self.assertEqual(len(self.client.get(url).data), 2)
+
+    def test_fetch_by_email_if_modified_since(self):
+        """Test Last-Modified revalidation and invalidation on profile updates"""
+        url = reverse('user-fetch-by-email')
+        response = self.client.get(url, {'email': self.patient.email})
+        last_modified = response['Last-Modified']
+        response = self.client.get(url, {'email': self.patient.email}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(reverse('user-detail', kwargs={'email': self.patient.email}), {'name': 'Jane Doe'},
+                          format='json')
+        response = self.client.get(url, {'email': self.patient.email})
+        self.assertEqual(response.data['name'], 'Jane Doe')
+
+
+class CORSMiddlewareTests(APITestCase):
+    def test_preflight_answered_by_middleware(self):
+        """Test OPTIONS requests get the preflight headers without reaching the view"""
+        response = self.client.options(reverse('get_user_records'), HTTP_ORIGIN='http://localhost:3000',
+                                       HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'http://localhost:3000')
+        self.assertEqual(response['Access-Control-Allow-Credentials'], 'true')
+        self.assertIn('POST', response['Access-Control-Allow-Methods'])
+        self.assertEqual(response['Access-Control-Max-Age'], '86400')
+        self.assertIn('Origin', response['Vary'])
+
+    def test_netlify_origins(self):
+        """Test deploy previews of the frontend site are echoed but other netlify.app sites aren't"""
+        from django.test import override_settings
+        preview = 'https://deploy-preview-7--splendorous-melba-fc5384.netlify.app'
+        with override_settings(CORS_ALLOW_ALL_ORIGINS=False):
+            response = self.client.get(reverse('doctors-list'), HTTP_ORIGIN=preview)
+            self.assertEqual(response['Access-Control-Allow-Origin'], preview)
+            self.assertNotIn('Access-Control-Allow-Methods', response)
+
+            response = self.client.get(reverse('doctors-list'), HTTP_ORIGIN='https://evil-netlify.app.example.com')
+            self.assertNotIn('Access-Control-Allow-Origin', response)
+
+    def test_unlisted_origin_with_allow_all(self):
+        """Test unlisted origins get the wildcard without credentials when all origins are allowed"""
+        response = self.client.get(reverse('doctors-list'), HTTP_ORIGIN='https://unknown.example.com')
+        self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+        self.assertNotIn('Access-Control-Allow-Credentials', response)
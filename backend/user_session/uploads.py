@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .blobstore import CHUNK_SIZE, get_blob_store, sniff_content_type
+from .models import Document, DocumentUpload
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    """A chunk or completion request the upload cannot accept; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def max_upload_bytes():
+    return getattr(settings, 'DOCUMENT_UPLOAD_MAX_BYTES', 100 * 1024 * 1024)
+
+
+def max_chunk_bytes():
+    return getattr(settings, 'DOCUMENT_UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024)
+
+
+def allowed_types():
+    return getattr(settings, 'DOCUMENT_UPLOAD_ALLOWED_TYPES',
+                   ['application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/tiff'])
+
+
+def upload_dir():
+    path = getattr(settings, 'DOCUMENT_UPLOAD_DIR', None) or os.path.join(settings.BLOB_STORE_ROOT, 'uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f"{upload.pk}.part")
+
+
+# Running SHA-256 per upload, so each chunk is hashed once as it streams in.
+# After a restart, or when the next chunk lands on another worker, the state
+# is rebuilt from the part file on disk.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _hasher_at(upload, offset):
+    with _hashers_lock:
+        entry = _hashers.pop(upload.pk, None)
+    if entry and entry[0] == offset:
+        return entry[1]
+    digest = hashlib.sha256()
+    if offset:
+        with open(part_path(upload), 'rb') as f:
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+    return digest
+
+
+def _remember_hasher(upload, offset, digest):
+    with _hashers_lock:
+        _hashers[upload.pk] = (offset, digest)
+
+
+def _forget(upload):
+    with _hashers_lock:
+        _hashers.pop(upload.pk, None)
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def start_upload(user, title, type, date, size, sha256=''):
+    if size > max_upload_bytes():
+        raise UploadError(f"File is larger than the {max_upload_bytes()} byte limit", 413)
+    upload = DocumentUpload.objects.create(
+        user=user, title=title, type=type, date=date, size=size, sha256=sha256.lower(),
+    )
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload_id, offset, stream):
+    """
+    Append the bytes read from stream at offset. The request body is copied to
+    disk in CHUNK_SIZE pieces and never held in memory whole. Returns the new offset.
+    """
+    with transaction.atomic():
+        upload = DocumentUpload.objects.select_for_update().get(pk=upload_id)
+        if offset != upload.received:
+            raise UploadError("Offset does not match the bytes received so far", 409, upload.received)
+
+        limit = min(upload.size - offset, max_chunk_bytes())
+        digest = _hasher_at(upload, offset)
+        written = 0
+        with open(part_path(upload), 'r+b') as out:
+            out.seek(offset)
+            while True:
+                piece = stream.read(CHUNK_SIZE) if stream is not None else b''
+                if not piece:
+                    break
+                if offset == 0 and written == 0:
+                    content_type = sniff_content_type(piece)
+                    if content_type not in allowed_types():
+                        raise UploadError(f"Unsupported file type {content_type}", 415, 0)
+                    upload.content_type = content_type
+                if written + len(piece) > limit:
+                    out.truncate(offset)
+                    raise UploadError("Chunk exceeds the declared file size or the chunk size limit", 413, offset)
+                out.write(piece)
+                digest.update(piece)
+                written += len(piece)
+            out.truncate(offset + written)
+
+        upload.received = offset + written
+        upload.save(update_fields=['received', 'content_type', 'updated_at'])
+        _remember_hasher(upload, upload.received, digest)
+        return upload.received
+
+
+def complete_upload(upload_id):
+    """Verify the assembled file, move it into the blob store and create the Document."""
+    document = _complete(upload_id)
+    if document is None:
+        raise UploadError("Checksum mismatch; upload discarded", 422)
+    return document
+
+
+def _complete(upload_id):
+    with transaction.atomic():
+        upload = DocumentUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.received != upload.size:
+            raise UploadError("Upload is incomplete", 409, upload.received)
+
+        key = _hasher_at(upload, upload.received).hexdigest()
+        if upload.sha256 and upload.sha256 != key:
+            abort_upload(upload)
+            return None
+
+        get_blob_store().put_path(part_path(upload), key)
+        document = Document.objects.create(
+            user=upload.user,
+            title=upload.title,
+            type=upload.type,
+            date=upload.date,
+            blob_key=key,
+            content_type=upload.content_type or 'application/octet-stream',
+            size=upload.size,
+        )
+        _forget(upload)
+        upload.delete()
+    return document
+
+
+def abort_upload(upload):
+    _forget(upload)
+    upload.delete()
+
+
+def purge_stale_uploads(max_age=timedelta(days=1)):
+    """Remove uploads that have not received a chunk within max_age. Returns the number removed."""
+    stale = DocumentUpload.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for upload in stale.iterator():
+        abort_upload(upload)
+        count += 1
+    if count:
+        logger.info(f"Purged {count} stale document uploads")
+    return count
@@ -1,10 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    UserViewSet, SessionViewSet, get_records, get_user_records,
+    UserViewSet, SessionViewSet, get_records, get_user_records, get_dashboard,
     add_medication, add_medical_record, add_document,
     patient_upload_document, doctor_upload_document,
-    AppointmentViewSet, MedicalRecordViewSet, DocumentViewSet, MedicationViewSet, NotificationViewSet
+    AppointmentViewSet, MedicalRecordViewSet, DocumentViewSet, DocumentUploadViewSet, MedicationViewSet, NotificationViewSet
 )
 
 router = DefaultRouter()
@@ -13,6 +13,7 @@ router.register(r'sessions', SessionViewSet, basename='session')
 router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'medical-records', MedicalRecordViewSet, basename='medical-record')
 router.register(r'documents', DocumentViewSet, basename='document')
+router.register(r'document-uploads', DocumentUploadViewSet, basename='document-upload')
 router.register(r'medications', MedicationViewSet, basename='medication')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
@@ -30,6 +31,7 @@ urlpatterns = [
     # Records paths
     path('records/', get_records, name='get_records'),
     path('records/user/', get_user_records, name='get_user_records'),
+    path('dashboard/', get_dashboard, name='dashboard'),
     path('records/add_medication/', add_medication, name='add_medication'),
     path('records/add_medical_record/', add_medical_record, name='add_medical_record'),
     path('records/add_document/<str:user_email>/', add_document, name='add_document'),
@@ -46,6 +48,8 @@ urlpatterns = [
 
     path('notifications/', NotificationViewSet.as_view({'post': 'create_notification'}), name='create-notification'),
     path('notifications/unread/', NotificationViewSet.as_view({'get': 'unread'}), name='unread-notifications'),
+    path('notifications/unread-count/', NotificationViewSet.as_view({'get': 'unread_count'}), name='unread-notification-count'),
+    path('notifications/stream/', NotificationViewSet.as_view({'get': 'stream'}), name='notification-stream'),
     # path('notifications/mark-all-read/', NotificationViewSet.as_view({'patch': 'mark_all_read'}), name='mark-all-notifications-read'),
     # path('notifications/<int:pk>/mark-read/', NotificationViewSet.as_view({'patch': 'mark_read'}), name='mark-notification-read'),
     path('generate-medication-reminders/', NotificationViewSet.as_view({'get': 'generate_medication_reminders'}), name='generate-medication-reminders'),
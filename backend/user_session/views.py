@@ -2,9 +2,21 @@ from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
+from rest_framework.renderers import JSONRenderer
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.db.models import Q  # Add this import for Q objects
-from .models import User, Session, MedicalRecord, Document, Medication, Appointment, Notification
-from .serializers import UserSerializer, SessionSerializer, MedicalRecordSerializer, DocumentSerializer, MedicationSerializer, NotificationSerializer, AppointmentSerializer
+from .models import User, Session, MedicalRecord, Document, DocumentUpload, Medication, Appointment, Notification
+from .serializers import UserSerializer, SessionSerializer, MedicalRecordSerializer, DocumentSerializer, DocumentUploadSerializer, MedicationSerializer, NotificationSerializer, AppointmentSerializer
+from . import notifications as notification_push
+from .pagination import RecordCursorPagination
+from .blobstore import blob_response, decode_inline
+from . import uploads
+from . import dashboard
+from . import identity
+from . import caching
+from rest_framework.utils.encoders import JSONEncoder
 from django.utils import timezone
 from datetime import timedelta
 import sys
@@ -26,15 +38,18 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+            return Response(UserSerializer(user, context={'request': request}).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def update(self, request, *args, **kwargs):
         """Update an existing User (PATCH for partial updates)"""
         user = self.get_object()
+        previous_email = user.email
         serializer = self.get_serializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            # The save signal clears the new address; a changed email also leaves the old one cached
+            identity.forget(previous_email, user.email, request=request)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -42,6 +57,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """Delete a User by email"""
         user = self.get_object()
         user.delete()
+        identity.forget(user.email, request=request)
         return Response({"message": "User deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'], url_path='fetch-by-email')
@@ -51,15 +67,31 @@ class UserViewSet(viewsets.ModelViewSet):
         if not user_email:
             return Response({"error": "Email is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        user = get_object_or_404(User, email=user_email)
-        return Response(UserSerializer(user).data)
+        user = identity.get_user_or_404(user_email, request)
+        data, etag, modified = caching.cached_payload(
+            'user', [caching.user_scope(user.id)],
+            lambda: UserSerializer(user, context={'request': request}).data,
+            vary=request.get_host(),
+        )
+        return caching.conditional_response(request, data, etag, modified)
     
+    @action(detail=True, methods=['get'], url_path='profile-pic')
+    def profile_pic(self, request, email=None):
+        """Stream the user's profile picture from the blob store"""
+        user = self.get_object()
+        if not user.profile_pic_key:
+            return Response({"error": "No profile picture"}, status=status.HTTP_404_NOT_FOUND)
+        return blob_response(request, user.profile_pic_key, user.profile_pic_type or 'application/octet-stream')
+
     @action(detail=False, methods=['get'])
     def doctors(self, request):
         """Get all doctors with their details"""
-        doctors = User.objects.filter(role='doctor')
-        serializer = UserSerializer(doctors, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data, etag, modified = caching.cached_payload(
+            'doctors', [caching.DOCTORS_SCOPE],
+            lambda: UserSerializer(User.objects.filter(role='doctor'), many=True, context={'request': request}).data,
+            vary=request.get_host(),
+        )
+        return caching.conditional_response(request, data, etag, modified)
 
 
 class SessionViewSet(viewsets.ModelViewSet):
@@ -83,7 +115,7 @@ class SessionViewSet(viewsets.ModelViewSet):
                 
             # Ensure user exists or create a new one
             try:
-                user = User.objects.get(email=user_email)
+                user = identity.get_user(user_email, request)
                 print(f"Found existing user: {user.id} - {user.email}")
             except User.DoesNotExist:
                 # Create a basic user if not exists
@@ -202,7 +234,7 @@ class SessionViewSet(viewsets.ModelViewSet):
                 
             # Find the user
             try:
-                user = User.objects.get(email=user_email)
+                user = identity.get_user(user_email, request)
                 print(f"Found user: {user.id} - {user.email}")
             except User.DoesNotExist:
                 print(f"No user found with email: {user_email}")
@@ -228,21 +260,126 @@ class SessionViewSet(viewsets.ModelViewSet):
             )
 
 
+# Record types served by get_records: model, serializer and fields left out unless requested
+RECORD_TYPES = {
+    'records': (MedicalRecord, MedicalRecordSerializer, ()),
+    'documents': (Document, DocumentSerializer, ('file',)),
+    'medications': (Medication, MedicationSerializer, ()),
+}
+
+
+def _check_shared_fields(request, types):
+    """
+    ?fields= applies to every requested type, so a name only has to exist in
+    one of them; raises ValueError for names none of them have.
+    """
+    raw = request.query_params.get('fields')
+    if not raw:
+        return
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    available = set().union(*(RECORD_TYPES[name][1]().fields for name in types))
+    unknown = requested - available
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+
+def _requested_fields(request, record_type, serializer_class):
+    """
+    Resolve the sparse fieldset for one record type from ?fields[<type>]= or ?fields=.
+    Returns None when nothing was requested, or raises ValueError for unknown names
+    in fields[<type>] (the shared list is checked by _check_shared_fields).
+    """
+    raw = request.query_params.get(f'fields[{record_type}]', request.query_params.get('fields'))
+    if not raw:
+        return None
+    requested = [name.strip() for name in raw.split(',') if name.strip()]
+    available = set(serializer_class().fields)
+    if f'fields[{record_type}]' in request.query_params:
+        unknown = set(requested) - available
+        if unknown:
+            raise ValueError(f"Unknown fields for {record_type}: {', '.join(sorted(unknown))}")
+    return [name for name in requested if name in available]
+
+
+def _records_queryset(model, serializer_class, user, fields):
+    """User-scoped queryset that only loads the columns the response needs."""
+    qs = model.objects.filter(user=user)
+    concrete = {f.name for f in model._meta.concrete_fields}
+    columns = {'id'} | (set(fields) & concrete)
+    for name in fields:
+        columns.update(serializer_class.field_columns.get(name, ()))
+    return qs.only(*columns)
+
+
+def _stream_records(request, user, types, fieldsets):
+    """Yield a JSON object one record at a time, one type after another."""
+    encoder = JSONEncoder()
+    yield '{'
+    for position, record_type in enumerate(types):
+        model, serializer_class, _ = RECORD_TYPES[record_type]
+        fields = fieldsets[record_type]
+        yield f'{"," if position else ""}"{record_type}":['
+        rows = _records_queryset(model, serializer_class, user, fields).order_by('-id').iterator(chunk_size=500)
+        for index, instance in enumerate(rows):
+            yield (',' if index else '') + encoder.encode(serializer_class(instance, fields=fields, context={'request': request}).data)
+        yield ']'
+    yield '}'
+
+
 @api_view(['GET'])
 def get_records(request):
-    records = MedicalRecord.objects.all()
-    documents = Document.objects.all()
-    medications = Medication.objects.all()
-
-    record_serializer = MedicalRecordSerializer(records, many=True)
-    document_serializer = DocumentSerializer(documents, many=True)
-    medication_serializer = MedicationSerializer(medications, many=True)
+    """
+    Paginated records for one user (GET /api/user/records/?email=...).
+
+    Query parameters:
+      - type: records, documents or medications (default: all three)
+      - fields / fields[<type>]: comma-separated sparse fieldset; document file
+        bodies are only returned when asked for explicitly
+      - page_size, <type>_cursor (or cursor with type=): cursor pagination
+      - stream=1: stream every matching row instead of paginating
+    """
+    user_email = request.query_params.get("email")
+    if not user_email:
+        return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
+    user = identity.get_user_or_404(user_email, request)
+
+    record_type = request.query_params.get("type")
+    if record_type and record_type not in RECORD_TYPES:
+        return Response({"error": f"Unknown record type: {record_type}"}, status=status.HTTP_400_BAD_REQUEST)
+    types = [record_type] if record_type else list(RECORD_TYPES)
+
+    fieldsets = {}
+    try:
+        _check_shared_fields(request, types)
+        for name in types:
+            _, serializer_class, excluded = RECORD_TYPES[name]
+            fields = _requested_fields(request, name, serializer_class)
+            if fields is None:
+                fields = [f for f in serializer_class().fields if f not in excluded]
+            fieldsets[name] = fields
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.query_params.get("stream") in ('1', 'true'):
+        return StreamingHttpResponse(_stream_records(request, user, types, fieldsets), content_type='application/json')
+
+    if record_type:
+        model, serializer_class, _ = RECORD_TYPES[record_type]
+        paginator = RecordCursorPagination()
+        queryset = _records_queryset(model, serializer_class, user, fieldsets[record_type])
+        page = paginator.paginate_queryset(queryset, request)
+        return paginator.get_paginated_response(
+            serializer_class(page, many=True, fields=fieldsets[record_type], context={'request': request}).data
+        )
 
-    return Response({
-        'records': record_serializer.data,
-        'documents': document_serializer.data,
-        'medications': medication_serializer.data,
-    })
+    data = {'next': {}}
+    for name in types:
+        model, serializer_class, _ = RECORD_TYPES[name]
+        paginator = RecordCursorPagination(cursor_query_param=f'{name}_cursor')
+        page = paginator.paginate_queryset(_records_queryset(model, serializer_class, user, fieldsets[name]), request)
+        data[name] = serializer_class(page, many=True, fields=fieldsets[name], context={'request': request}).data
+        data['next'][name] = paginator.get_next_link()
+    return Response(data)
 
 
 @api_view(['POST'])
@@ -285,17 +422,12 @@ def add_document(request, user_email):
       - file_url: URL of the uploaded document file
     """
     
-    user = get_object_or_404(User, email=user_email)
+    user = identity.get_user_or_404(user_email, request)
     
     # Create document associated with the user
-    data = request.data.copy()
-    data['user'] = user.id
-
-    print(data)
-    
-    serializer = DocumentSerializer(data=data)
+    serializer = DocumentSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        serializer.save()
+        serializer.save(user=user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -310,14 +442,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Filter appointments based on provided email query param.
+        # The serializer embeds doctor and patient, so load them in the same query
+        queryset = super().get_queryset().select_related('doctor', 'patient')
         user_email = self.request.query_params.get("email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             if user.role == "doctor":
-                return Appointment.objects.filter(doctor=user)
+                return queryset.filter(doctor=user)
             else:
-                return Appointment.objects.filter(patient=user)
-        return super().get_queryset()
+                return queryset.filter(patient=user)
+        return queryset
 
     def create(self, request, *args, **kwargs):
         """
@@ -329,7 +463,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             # Expect the patient's email to be provided as a query parameter
             patient_email = request.query_params.get("email")
             if patient_email:
-                patient = get_object_or_404(User, email=patient_email)
+                patient = identity.get_user_or_404(patient_email, request)
                 appointment = serializer.save(patient=patient)
             else:
                 appointment = serializer.save()
@@ -347,7 +481,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if not doctor_email:
             return Response({"error": "Doctor email is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        doctor = get_object_or_404(User, email=doctor_email, role='doctor')
+        doctor = identity.get_user_or_404(doctor_email, request, role='doctor')
         
         # Verify that this doctor is associated with this appointment
         if appointment.doctor != doctor:
@@ -375,7 +509,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if not doctor_email:
             return Response({"error": "Doctor email is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        doctor = get_object_or_404(User, email=doctor_email, role='doctor')
+        doctor = identity.get_user_or_404(doctor_email, request, role='doctor')
         
         # Verify that this doctor is associated with this appointment
         if appointment.doctor != doctor:
@@ -442,7 +576,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         # Filter by user_email query parameter if provided
         user_email = self.request.query_params.get("email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             return MedicalRecord.objects.filter(user=user)
         return MedicalRecord.objects.all()
     
@@ -450,7 +584,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         """Associate medical record with a specific user"""
         user_email = self.request.query_params.get("patient_email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             serializer.save(user=user)
         else:
             serializer.save()
@@ -467,15 +601,28 @@ class DocumentViewSet(viewsets.ModelViewSet):
         # Filter by user_email query parameter if provided
         user_email = self.request.query_params.get("email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             return Document.objects.filter(user=user)
         return Document.objects.all()
     
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Stream the document body from the blob store (supports Range requests)"""
+        document = get_object_or_404(Document, pk=pk)
+        if document.file:
+            # Row written before blob storage existed: serve it as is (manage.py move_inline_blobs moves it out)
+            data, content_type = decode_inline(document.file)
+            return HttpResponse(data, content_type=document.content_type or content_type)
+        if not document.blob_key:
+            return Response({"error": "Document has no file"}, status=status.HTTP_404_NOT_FOUND)
+        return blob_response(request, document.blob_key, document.content_type or 'application/octet-stream',
+                             filename=document.title)
+
     def perform_create(self, serializer):
         """Associate document with a specific user"""
         user_email = self.request.query_params.get("email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             serializer.save(user=user)
         else:
             serializer.save()
@@ -493,7 +640,7 @@ class MedicationViewSet(viewsets.ModelViewSet):
         # Filter by user_email query parameter if provided
         user_email = self.request.query_params.get("email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             return Medication.objects.filter(user=user)
         return Medication.objects.all()
     
@@ -501,7 +648,7 @@ class MedicationViewSet(viewsets.ModelViewSet):
         """Associate medication with a specific user"""
         user_email = self.request.query_params.get("patient_email")
         if user_email:
-            user = get_object_or_404(User, email=user_email)
+            user = identity.get_user_or_404(user_email, self.request)
             serializer.save(user=user)
         else:
             serializer.save()
@@ -515,21 +662,40 @@ def get_user_records(request):
     if not user_email:
         return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    user = get_object_or_404(User, email=user_email)
-    
-    records = MedicalRecord.objects.filter(user=user)
-    documents = Document.objects.filter(user=user)
-    medications = Medication.objects.filter(user=user)
+    user = identity.get_user_or_404(user_email, request)
+
+    def build():
+        records = MedicalRecord.objects.filter(user=user)
+        documents = Document.objects.filter(user=user)
+        medications = Medication.objects.filter(user=user)
+        return {
+            'records': MedicalRecordSerializer(records, many=True).data,
+            'documents': DocumentSerializer(documents, many=True, context={'request': request}).data,
+            'medications': MedicationSerializer(medications, many=True).data,
+        }
+
+    data, etag, modified = caching.cached_payload(
+        'user-records', [caching.records_scope(user.id)], build, vary=request.get_host(),
+    )
+    return caching.conditional_response(request, data, etag, modified)
 
-    record_serializer = MedicalRecordSerializer(records, many=True)
-    document_serializer = DocumentSerializer(documents, many=True)
-    medication_serializer = MedicationSerializer(medications, many=True)
+@api_view(['GET'])
+def get_dashboard(request):
+    """
+    Everything the patient home screen needs in one round trip: records,
+    chat sessions, appointments and unread notifications.
+    Optional ?sections=records,appointments limits the payload.
+    """
+    user_email = request.query_params.get("email")
+    if not user_email:
+        return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response({
-        'records': record_serializer.data,
-        'documents': document_serializer.data,
-        'medications': medication_serializer.data,
-    })
+    user = identity.get_user_or_404(user_email, request)
+    sections = request.query_params.get("sections")
+    sections = [name.strip() for name in sections.split(',')] if sections else None
+    payload = dashboard.build_dashboard(user, sections, context={'request': request})
+    payload['user'] = UserSerializer(user, context={'request': request}).data
+    return Response(payload)
 
 @api_view(['POST'])
 def patient_upload_document(request):
@@ -540,17 +706,12 @@ def patient_upload_document(request):
     if not user_email:
         return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    user = get_object_or_404(User, email=user_email)
+    user = identity.get_user_or_404(user_email, request)
     
     # Create document associated with the user
-    data = request.data.copy()
-    data['user'] = user.id
-
-    print(data)
-    
-    serializer = DocumentSerializer(data=data)
+    serializer = DocumentSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        serializer.save()
+        serializer.save(user=user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -568,19 +729,95 @@ def doctor_upload_document(request):
     if not patient_email:
         return Response({"error": "Patient email is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    doctor = get_object_or_404(User, email=doctor_email, role='doctor')
-    patient = get_object_or_404(User, email=patient_email, role='patient')
+    doctor = identity.get_user_or_404(doctor_email, request, role='doctor')
+    patient = identity.get_user_or_404(patient_email, request, role='patient')
     
     # Create document associated with the patient
-    data = request.data.copy()
-    data['user'] = patient.id
-    
-    serializer = DocumentSerializer(data=data)
+    serializer = DocumentSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
-        serializer.save()
+        serializer.save(user=patient)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _upload_owner(request):
+    """Resolve the patient an upload belongs to, using the same query parameters as the upload endpoints."""
+    user_email = request.query_params.get("email")
+    if user_email:
+        return identity.get_user_or_404(user_email, request)
+    doctor_email = request.query_params.get("doctor_email")
+    patient_email = request.query_params.get("patient_email")
+    if not doctor_email or not patient_email:
+        return None
+    identity.get_user_or_404(doctor_email, request, role='doctor')
+    return identity.get_user_or_404(patient_email, request, role='patient')
+
+def _upload_error(error):
+    response = Response({"error": str(error), "offset": error.offset}, status=error.status_code)
+    if error.offset is not None:
+        response['Upload-Offset'] = str(error.offset)
+    return response
+
+class DocumentUploadViewSet(viewsets.ViewSet):
+    """
+    Resumable chunked document upload:
+      POST   /document-uploads/?email=...           declare title, type, date and size
+      PUT    /document-uploads/<id>/                raw bytes, Upload-Offset header gives the start offset
+      GET    /document-uploads/<id>/                bytes received so far (to resume)
+      POST   /document-uploads/<id>/complete/       verify and create the Document
+      DELETE /document-uploads/<id>/                abandon the upload
+    """
+    lookup_value_regex = '[0-9a-f-]{36}'
+
+    def create(self, request):
+        user = _upload_owner(request)
+        if user is None:
+            return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = DocumentUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = uploads.start_upload(user, **serializer.validated_data)
+        except uploads.UploadError as e:
+            return _upload_error(e)
+        data = DocumentUploadSerializer(upload).data
+        data['chunk_size'] = uploads.max_chunk_bytes()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        upload = get_object_or_404(DocumentUpload, pk=pk)
+        response = Response(DocumentUploadSerializer(upload).data)
+        response['Upload-Offset'] = str(upload.received)
+        return response
+
+    def update(self, request, pk=None):
+        get_object_or_404(DocumentUpload, pk=pk)
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.query_params.get('offset', '')))
+        except ValueError:
+            return Response({"error": "Upload-Offset header is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Read the raw body as a stream; request.data would buffer the whole chunk
+            received = uploads.write_chunk(pk, offset, request.stream)
+        except uploads.UploadError as e:
+            return _upload_error(e)
+        response = Response({"offset": received})
+        response['Upload-Offset'] = str(received)
+        return response
+
+    def destroy(self, request, pk=None):
+        upload = get_object_or_404(DocumentUpload, pk=pk)
+        uploads.abort_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        get_object_or_404(DocumentUpload, pk=pk)
+        try:
+            document = uploads.complete_upload(pk)
+        except uploads.UploadError as e:
+            return _upload_error(e)
+        return Response(DocumentSerializer(document, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     queryset = Notification.objects.all()
@@ -588,12 +825,26 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user_email = self.request.query_params.get('user_email', None)
         if user_email:
-            try:
-                user = User.objects.get(email=user_email)
-                return Notification.objects.filter(user=user).order_by('-created_at')
-            except User.DoesNotExist:
-                return Notification.objects.none()
+            # Filter through the join; an unknown email simply matches nothing
+            return Notification.objects.filter(user__email=user_email).order_by('-created_at')
         return Notification.objects.none()
+
+    def perform_update(self, serializer):
+        """A PUT/PATCH that changes read (or the owner) adjusts the unread counters like mark_read"""
+        with transaction.atomic():
+            # Re-read under a row lock so concurrent updates see each other's read flag
+            serializer.instance = Notification.objects.select_for_update().get(pk=serializer.instance.pk)
+            before = (serializer.instance.user_id, serializer.instance.read)
+            notification = serializer.save()
+            after = (notification.user_id, notification.read)
+            if after == before:
+                return
+            if not before[1]:
+                notification_push.decr_unread(before[0])
+            if not after[1]:
+                notification_push.incr_unread(after[0])
+        for user_id in {before[0], after[0]}:
+            notification_push.publish_unread_count(user_id)
     
     @action(detail=False, methods=['post'])
     def create_notification(self, request):
@@ -612,7 +863,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            user = User.objects.get(email=user_email)
+            user = identity.get_user(user_email, request)
             notification_data = {
                 'user': user,
                 'title': title,
@@ -659,7 +910,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         user_email = request.query_params.get('user_email', None)
         if user_email:
             try:
-                user = User.objects.get(email=user_email)
+                user = identity.get_user(user_email, request)
                 notifications = Notification.objects.filter(user=user, read=False).order_by('-created_at')
                 serializer = self.get_serializer(notifications, many=True)
                 return Response(serializer.data)
@@ -667,12 +918,46 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
         return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Unread badge count read from the denormalized counter (a single indexed lookup)"""
+        user_email = request.query_params.get('user_email', None)
+        if not user_email:
+            return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
+        count = notification_push.unread_count_for_email(user_email)
+        if count is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"unread_count": count})
+
+    @action(detail=False, methods=['get'], renderer_classes=[notification_push.EventStreamRenderer, JSONRenderer])
+    def stream(self, request):
+        """
+        Server-Sent Events stream of new notifications and unread count changes
+        (GET /api/user/notifications/stream/?user_email=...). Replaces polling unread.
+        """
+        user_email = request.query_params.get('user_email', None)
+        if not user_email:
+            return Response({"error": "User email is required"}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = User.objects.filter(email=user_email).values_list('id', flat=True).first()
+        if user_id is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if isinstance(request._request, ASGIRequest):
+            frames = notification_push.async_event_stream(user_id)
+        else:
+            frames = notification_push.event_stream(user_id)
+        response = StreamingHttpResponse(frames, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+        return response
+
     @action(detail=True, methods=['patch'])
     def mark_read(self, request, pk=None):
         """Mark a specific notification as read"""
         notification = self.get_object()
-        notification.read = True
-        notification.save(update_fields=['read'])
+        if notification_push.mark_read(notification.pk, notification.user_id):
+            dashboard.invalidate(notification.user_id, 'notifications')
+            notification_push.publish_unread_count(notification.user_id)
         return Response({"status": "notification marked as read"})
     
     @action(detail=False, methods=['patch'])
@@ -680,8 +965,10 @@ class NotificationViewSet(viewsets.ModelViewSet):
         user_email = request.query_params.get('user_email', None)
         if user_email:
             try:
-                user = User.objects.get(email=user_email)
-                Notification.objects.filter(user=user, read=False).update(read=True)
+                user = identity.get_user(user_email, request)
+                notification_push.mark_all_read(user.id)
+                dashboard.invalidate(user.id, 'notifications')
+                notification_push.publish_unread_count(user.id)
                 return Response({"status": "all notifications marked as read"})
             except User.DoesNotExist:
                 return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -332,7 +332,7 @@ export default function ProfilePage() {
                   <p className="text-sm text-gray-500">Date: {license.date}</p>
                 </div>
                 <a 
-                  href={`data:application/octet-stream;base64,${license.file}`}
+                  href={license.file_url}
                   className="text-blue-600 hover:text-blue-800"
                   target="_blank"
                   rel="noopener noreferrer"
@@ -316,7 +316,7 @@ export default function Records() {
                               <p className="text-sm text-gray-500">Date: {document.date}</p>
                             </div>
                             <a 
-                              href={`data:application/octet-stream;base64,${document.file}`}
+                              href={document.file_url}
                               className="text-blue-600 hover:text-blue-800"
                               target="_blank"
                               rel="noopener noreferrer"